@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from config import SERVICE_RATES
+from deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Process-wide rate limit for one downstream service: `rate` calls per
+    second with bursts of up to `burst`.
+
+    Each caller reserves the next free slot under the lock and then sleeps
+    until it, so waiters are served strictly in arrival order and a burst
+    of callers cannot starve an early one. A caller whose slot would come
+    after its deadline gives up without taking the slot.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate     = rate
+        self.burst    = max(1, burst)
+        self._next    = 0.0                      # monotonic time the next slot opens
+        self._lock    = threading.Lock()
+
+    def acquire(self, deadline: Optional[Deadline] = None) -> bool:
+        """Wait for a slot; False if it would only open after `deadline`."""
+        if self.rate <= 0:
+            return True
+        interval = 1.0 / self.rate
+        with self._lock:
+            now   = time.monotonic()
+            # Idle time refills up to `burst` slots
+            start = max(self._next, now - (self.burst - 1) * interval)
+            wait  = start - now
+            if deadline is not None and wait > deadline.remaining():
+                return False
+            self._next = start + interval
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_limiter(service: str) -> TokenBucket:
+    """Shared bucket for a service in config.SERVICE_RATES (unlimited if absent)."""
+    with _buckets_lock:
+        if service not in _buckets:
+            rate, burst = SERVICE_RATES.get(service, (0, 1))
+            _buckets[service] = TokenBucket(rate, burst)
+        return _buckets[service]
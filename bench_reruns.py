@@ -0,0 +1,124 @@
+"""
+Time what one click on the instructions page costs the server.
+
+    python bench_reruns.py --runs 30 --language English
+
+Before fragments, every practice toggle and quiz answer reran the whole
+script (page config, CSS, sidebar, header, instructions, examples, quiz).
+Now only the enclosing fragment reruns. This drives the app headlessly
+with streamlit.testing's AppTest and times the same interaction two ways:
+as a rerun of the full page ("before"), and as a run of a script that
+holds nothing but the fragment the widget lives in ("after"), which is
+the work a fragment-scoped rerun does.
+
+AppTest has no public way to request a fragment-scoped rerun, so the
+"after" script calls the fragment function directly. Both cases go
+through the same AppTest harness (a fresh script runner per run), so the
+difference is the script work a click no longer does.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from config import LANGUAGES
+
+
+def _quiz_fragment(code: str) -> None:
+    # Runs as its own AppTest script, so it imports what it needs
+    import streamlit as st
+
+    from setups import load_setup
+    from views.instructions import _comprehension_check
+
+    st.session_state.setdefault("check_error", None)
+    questions = load_setup(code)["example_annotations"]["comprehension_check"]["questions"]
+    _comprehension_check(questions, code)
+
+
+def _practice_fragment(code: str) -> None:
+    from setups import load_setup
+    from views.instructions import _practice_questions
+
+    _practice_questions(load_setup(code)["example_annotations"]["practice_questions"])
+
+
+def _stub_username_sync() -> None:
+    # The page never allocates a name; without this the app's allocator
+    # would sync against INCEpTION (localhost:8080) throughout the run
+    import usernames
+
+    usernames._allocator = usernames.UsernameAllocator(set, set)
+
+
+def _timed(at, interact, runs: int) -> list[float]:
+    samples = []
+    for i in range(runs):
+        interact(at, i)
+        start = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return samples
+
+
+def _answer(key: str, options: list[str]):
+    def interact(at, i):
+        at.radio(key=key).set_value(options[i % len(options)])
+    return interact
+
+
+def _toggle(key: str):
+    def interact(at, i):
+        at.toggle(key=key).set_value(i % 2 == 0)
+    return interact
+
+
+def _report(label: str, samples: list[float], baseline: float | None = None) -> float:
+    median = statistics.median(samples)
+    p95    = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else median
+    ratio  = f"  ({baseline / median:.1f}x faster)" if baseline else ""
+    print(f"{label:<40} median {median:7.1f} ms   p95 {p95:7.1f} ms{ratio}")
+    return median
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--language", choices=list(LANGUAGES), default="English")
+    args = parser.parse_args(argv)
+
+    from streamlit.testing.v1 import AppTest
+
+    from setups import load_setup
+
+    _stub_username_sync()
+    code, _  = LANGUAGES[args.language]
+    setup    = load_setup(code)
+    question = setup["example_annotations"]["comprehension_check"]["questions"][0]
+    practice = setup["example_annotations"]["practice_questions"][0]
+    answer   = _answer(f"check_{code}_{question['id']}", question["options"])
+    toggle   = _toggle(f"hint_{practice['id']}")
+
+    page = AppTest.from_file("streamlit_app.py", default_timeout=60)
+    page.session_state["page"]         = 2
+    page.session_state["demographics"] = {"languages": [args.language]}
+    page.run()                                   # warm-up: imports and caches
+
+    quiz_only     = AppTest.from_function(_quiz_fragment, args=(code,), default_timeout=60)
+    practice_only = AppTest.from_function(_practice_fragment, args=(code,), default_timeout=60)
+    quiz_only.run()
+    practice_only.run()
+
+    print(f"{args.runs} reruns each, {args.language} instructions\n")
+    quiz = _report("quiz answer, full rerun (before)", _timed(page, answer, args.runs))
+    hint = _report("practice toggle, full rerun (before)", _timed(page, toggle, args.runs))
+    _report("quiz answer, fragment rerun (after)", _timed(quiz_only, answer, args.runs), quiz)
+    _report("practice toggle, fragment rerun (after)", _timed(practice_only, toggle, args.runs), hint)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Startup and first-registration latency budget check.
+
+    python bench_startup.py --runs 5 --startup-budget 2.5 --registration-budget 1.5
+    python bench_startup.py --importtime            # also list the slowest imports
+
+Every sample is a fresh interpreter. "cold start" is the time to import
+streamlit_app. "first registration" is one provisioning.provision() call
+against a local INCEpTION stub, i.e. what the first user of a new process
+waits for. It is measured twice: straight after start-up ("no warm-up"),
+and after warmup.py has finished, as it will have in the app by the time
+anyone reaches the credentials page. Exits 1 if the cold start or the
+warmed first registration goes over its budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from inception_stub import StubServer
+
+ROOT = Path(__file__).resolve().parent
+
+_CHILD = r"""
+import json, secrets, sys, time
+t0 = time.perf_counter()
+import streamlit_app
+cold = time.perf_counter() - t0
+
+if "--warm" in sys.argv:
+    import warmup
+    warmup.start().join()
+
+t1 = time.perf_counter()
+from provisioning import provision
+result = provision({
+    "username":     "bench_" + secrets.token_hex(4),    # the stub is shared by every sample
+    "password":     "bench-password",
+    "started_at":   time.time(),
+    "demographics": {"languages": ["English", "German"], "email": "", "registered_at": ""},
+}, final_attempt=True)
+first = time.perf_counter() - t1
+print(json.dumps({"cold_start": cold, "first_registration": first, "user_ok": result["user_ok"]}))
+"""
+
+
+def _sample(base_url: str, warm: bool) -> dict:
+    # Each run gets its own working directory, so the queue/store files start empty
+    with tempfile.TemporaryDirectory() as cwd:
+        env = {**os.environ, "PYTHONPATH": str(ROOT), "INCEPTION_URL": base_url}
+        cmd = [sys.executable, "-c", _CHILD] + (["--warm"] if warm else [])
+        proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _slowest_imports(limit: int) -> list[tuple[float, str]]:
+    """Self import time of streamlit_app's dependencies, summed per top-level package."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import streamlit_app"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    totals: dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(own) / 1e6
+    return sorted(((t, p) for p, t in totals.items()), reverse=True)[:limit]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--startup-budget", type=float, default=2.5,
+                        help="max median seconds to import streamlit_app")
+    parser.add_argument("--registration-budget", type=float, default=1.5,
+                        help="max median seconds for the first registration after warm-up")
+    parser.add_argument("--importtime", action="store_true",
+                        help="list the packages streamlit_app spends most import time on")
+    args = parser.parse_args(argv)
+
+    with StubServer() as base_url:
+        cold = [_sample(base_url, warm=False) for _ in range(args.runs)]
+        warm = [_sample(base_url, warm=True) for _ in range(args.runs)]
+
+    startup   = statistics.median(s["cold_start"] for s in cold + warm)
+    first     = statistics.median(s["first_registration"] for s in cold)
+    first_hot = statistics.median(s["first_registration"] for s in warm)
+    print(f"cold start (import streamlit_app)      {startup:6.2f} s   budget {args.startup_budget:.2f} s")
+    print(f"first registration, no warm-up         {first:6.2f} s")
+    print(f"first registration, after warm-up      {first_hot:6.2f} s   "
+          f"budget {args.registration_budget:.2f} s")
+    if not all(s["user_ok"] for s in cold + warm):
+        print("warning: some registrations did not create the stub user")
+
+    if args.importtime:
+        print("\nslowest imports (per package):")
+        for seconds, name in _slowest_imports(15):
+            print(f"  {seconds:6.3f} s  {name}")
+
+    over = []
+    if startup > args.startup_budget:
+        over.append("cold start")
+    if first_hot > args.registration_budget:
+        over.append("first registration")
+    if over:
+        print(f"\nFAIL: over budget: {', '.join(over)}")
+        return 1
+    print("\nOK: within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
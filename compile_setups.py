@@ -0,0 +1,90 @@
+"""
+Validate every annotation setup in config.LANGUAGE_JSON_FILES and write
+them, with their instruction sections precompiled to markdown, into one
+compact bundle that the app loads in a single read.
+
+    python compile_setups.py                  # writes config.SETUP_BUNDLE_PATH
+    python compile_setups.py --check          # validate only
+
+Run it after editing any data/annotation_setup_*.json file. The running
+app notices the new bundle by its mtime and switches to it on the next
+rerun. Exits with status 1, and writes nothing, if any setup is invalid.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from config import LANGUAGE_JSON_FILES, SETUP_BUNDLE_PATH
+from setups import validate_setup
+
+logger = logging.getLogger("compile_setups")
+
+BUNDLE_FORMAT = 1
+
+
+def compile_all() -> tuple[dict, dict[str, list[str]]]:
+    """(bundle, errors by file); the bundle only holds the valid setups."""
+    from views.shared import compile_sections
+
+    bundle: dict = {"format": BUNDLE_FORMAT, "compiled_at": time.time(), "setups": {}}
+    errors: dict[str, list[str]] = {}
+    for code, path in LANGUAGE_JSON_FILES.items():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                setup = json.load(f)
+        except (OSError, ValueError) as exc:
+            errors[path] = [str(exc)]
+            continue
+        problems = validate_setup(setup)
+        if problems:
+            errors[path] = problems
+            continue
+        bundle["setups"][code] = {
+            "source":   path,
+            "setup":    setup,
+            "sections": list(compile_sections(setup)),
+        }
+    return bundle, errors
+
+
+def write_bundle(bundle: dict, out: Path) -> None:
+    # Write-then-rename, so the app never loads a half-written bundle
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(bundle, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, out)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--out", default=SETUP_BUNDLE_PATH)
+    parser.add_argument("--check", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    bundle, errors = compile_all()
+    for path, problems in errors.items():
+        for problem in problems:
+            logger.error("%s: %s", path, problem)
+    if errors:
+        logger.error("%d of %d setup(s) invalid; bundle not written.",
+                     len(errors), len(LANGUAGE_JSON_FILES))
+        return 1
+
+    if args.check:
+        logger.info("All %d setup(s) valid.", len(bundle["setups"]))
+        return 0
+    out = Path(args.out)
+    write_bundle(bundle, out)
+    logger.info("Wrote %d setup(s) to %s (%d bytes).",
+                len(bundle["setups"]), out, out.stat().st_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,128 @@ LANGUAGE_JSON_FILES: dict[str, str] = {
     "cs": "data/annotation_setup_cs.json",
 }
 
+# Per-request timeouts (seconds) for InceptionClient and Sheets; each is further
+# shortened to whatever is left of REGISTRATION_BUDGET
+PING_TIMEOUT    = 5
+REQUEST_TIMEOUT = 10
+SHEETS_TIMEOUT  = 30
+
+# End-to-end budget for one registration (INCEpTION calls + saving the row).
+# Steps that have not run when it runs out are recorded as pending_steps.
+REGISTRATION_BUDGET = 20
+
+# Upper bound on simultaneous requests to INCEpTION from one registration
+INCEPTION_MAX_CONCURRENCY = 4
+
+# Connection pool of the process-wide INCEpTION client. Connections beyond
+# POOL_SIZE are opened for one request and then closed, rather than waited for.
+INCEPTION_POOL_SIZE  = 16
+INCEPTION_KEEP_ALIVE = True
+
+# Seconds a downloaded INCEpTION project list is reused before refetching, and
+# seconds a name missing from a fresh list is answered as "not found" without
+# downloading the list again
+PROJECT_CACHE_TTL      = 300
+PROJECT_CACHE_MISS_TTL = 30
+
+# Circuit breaker in front of INCEpTION: consecutive failures before it opens,
+# seconds before a trial request is allowed, and background probe interval
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT     = 30
+HEALTH_PROBE_INTERVAL     = 15
+
+# Admission control (admission.py): process-wide token bucket per downstream
+# service as (calls per second, burst); 0 disables the limit. Google Sheets
+# allows 60 write requests per minute per user.
+SERVICE_RATES: dict[str, tuple[float, int]] = {
+    "inception": (20, 10),
+    "sheets":    (1, 5),
+}
+
+# Background provisioning queue (SQLite). Failed jobs are retried with
+# exponential backoff starting at RETRY_BACKOFF seconds, then dead-lettered.
+QUEUE_DB_PATH       = "provisioning_queue.db"
+QUEUE_WORKERS       = 4
+QUEUE_MAX_ATTEMPTS  = 3
+QUEUE_RETRY_BACKOFF = 5
+QUEUE_POLL_INTERVAL = 2      # seconds between job status checks on the page
+
+# Local registration store: "sqlite" (indexed, default) or "journal"
+# (append-only JSONL, full-scan queries). Sheets is a mirror of it.
+REGISTRATION_STORE   = "sqlite"
+REGISTRATION_DB_PATH = "registrations.db"
+SHEETS_MIRROR        = True
+
+# Journal backend: file, and the delay a writer waits so concurrent
+# appends can share one fsync
+JOURNAL_PATH         = "registrations.jsonl"
+JOURNAL_FSYNC_WINDOW = 0.005
+
+# Store → Sheets mirror: rows per append_rows call, max seconds a row waits,
+# and cap on the quota backoff
+SHEETS_BATCH_SIZE     = 20
+SHEETS_FLUSH_INTERVAL = 5
+SHEETS_MAX_BACKOFF    = 120
+
+# Upper bound in seconds on keeping a registration's password in the
+# idempotency index (idempotency.py). It is cleared as soon as the job
+# finishes; this only covers a job whose end was never recorded. A
+# registration reserved but never completed (its process died while
+# allocating and enqueueing) can be taken over after the second value.
+IDEMPOTENCY_TTL                 = 3600
+IDEMPOTENCY_RESERVATION_TIMEOUT = 30
+
+# Generated usernames (usernames.py): prefix and random suffix length, how
+# many pre-checked names are kept ready, and seconds between bulk syncs of
+# the index of taken names with INCEpTION and the local stores
+USERNAME_PREFIX        = "anno_"
+USERNAME_SUFFIX_LENGTH = 6
+USERNAME_POOL_SIZE     = 100
+USERNAME_SYNC_INTERVAL = 600
+
+# Admin dashboard (open with ?admin=1; password in the ADMIN_PASSWORD secret)
+ADMIN_PAGE      = 4
+ADMIN_PAGE_SIZE = 50
+
+# Parse every file in LANGUAGE_JSON_FILES on the first script run of the
+# process, so no user pays for it on the instructions page
+PRELOAD_SETUPS = True
+
+# Output of compile_setups.py: every setup validated and its instruction
+# sections precompiled, in one file. When present the app reads only this
+# and reloads it whenever its mtime changes; otherwise it parses the
+# individual JSON files above.
+SETUP_BUNDLE_PATH = "data/setups.bundle.json"
+
+# Correct comprehension-check answers needed to reach the credentials page;
+# compile_setups.py rejects setups with fewer questions than this
+PASS_THRESHOLD = 3
+
+# Prometheus-format metrics (metrics.py): served on 127.0.0.1:METRICS_PORT
+# (None to disable) and/or rewritten every METRICS_FILE_INTERVAL seconds to
+# METRICS_FILE, e.g. for node_exporter's textfile collector
+METRICS_PORT          = 9464
+METRICS_FILE          = None
+METRICS_FILE_INTERVAL = 15
+
+# On-demand profiling (profiling.py): reruns captured per armed session, and
+# where the .pstats files go (oldest removed once the directory exceeds the cap)
+PROFILE_RUNS          = 5
+PROFILE_DIR           = "profiles"
+PROFILE_DIR_MAX_BYTES = 50_000_000
+
+# Modules imported in a background thread on the first script run (warmup.py),
+# so the first registration does not pay for requests, gspread and google-auth
+WARM_IMPORTS = (
+    "requests",
+    "inception_client",
+    "google.oauth2.service_account",
+    "gspread",
+    "sheets",
+    "views.instructions",
+    "views.credentials",
+)
+
 TU_LOGO_URL = "https://upload.wikimedia.org/wikipedia/commons/thumb/3/30/TU-Berlin-Logo.svg/1280px-TU-Berlin-Logo.svg.png"
 
 NATIONALITIES = sorted([
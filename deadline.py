@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """The registration's latency budget ran out before this step."""
+
+
+class Deadline:
+    """
+    Wall-clock end point shared by every step of one registration.
+
+    Stored as an epoch timestamp so it survives being handed from the
+    script thread to a queue worker.
+    """
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, budget: float) -> "Deadline":
+        return cls(time.time() + budget)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """Per-request timeout: `cap`, shortened to the time that is left."""
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded
+        return min(cap, left)
+
+
+def request_timeout(deadline: Optional[Deadline], cap: float) -> float:
+    return deadline.timeout(cap) if deadline else cap
@@ -0,0 +1,260 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional
+
+from config import IDEMPOTENCY_RESERVATION_TIMEOUT, IDEMPOTENCY_TTL, REGISTRATION_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+_RESERVATION_POLL = 0.05      # seconds between looks at another call's reservation
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS registration_tokens (
+    token       TEXT PRIMARY KEY,
+    email       TEXT,
+    username    TEXT    NOT NULL,
+    password    TEXT,
+    job_id      INTEGER NOT NULL,
+    created_at  REAL    NOT NULL,
+    reserved_at REAL                -- set until create() has returned
+);
+CREATE UNIQUE INDEX IF NOT EXISTS registration_tokens_email
+    ON registration_tokens (email) WHERE email IS NOT NULL;
+"""
+
+
+class RegistrationIndex:
+    """
+    Which registration token (kept in the page URL) and which email
+    already started provisioning, and with what credentials and job.
+
+    `get_or_create` looks both up and runs `create()` at most once per
+    token and per email, behind a reservation taken in a write
+    transaction, so a refresh, a reconnect or a double submit never makes
+    a second INCEpTION account.
+    An entry whose job failed for good can be replaced by a new attempt.
+
+    A password is kept only so a page refreshed while its job runs can
+    show it again: `forget_password` clears it when the job finishes, and
+    IDEMPOTENCY_TTL bounds it if that never happens.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path = REGISTRATION_DB_PATH,
+        ttl: float = IDEMPOTENCY_TTL,
+        reservation_timeout: float = IDEMPOTENCY_RESERVATION_TIMEOUT,
+    ):
+        self.db_path             = str(db_path)
+        self.ttl                 = ttl
+        self.reservation_timeout = reservation_timeout
+        with closing(self._connect()) as db:
+            db.executescript(_SCHEMA)
+            columns = {r["name"] for r in db.execute("PRAGMA table_info(registration_tokens)")}
+            if "reserved_at" not in columns:         # index files from before reservations
+                db.execute("ALTER TABLE registration_tokens ADD COLUMN reserved_at REAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _forget_passwords(self, db: sqlite3.Connection) -> None:
+        db.execute(
+            "UPDATE registration_tokens SET password = NULL "
+            "WHERE password IS NOT NULL AND created_at < ?",
+            (time.time() - self.ttl,),
+        )
+
+    def find(self, token: str) -> Optional[dict]:
+        with closing(self._connect()) as db:
+            self._forget_passwords(db)
+            row = db.execute(
+                "SELECT * FROM registration_tokens WHERE token = ? AND reserved_at IS NULL",
+                (token,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def usernames(self) -> set[str]:
+        with closing(self._connect()) as db:
+            return {r[0] for r in db.execute(
+                "SELECT username FROM registration_tokens WHERE username != ''"
+            )}
+
+    def forget_password(self, username: str) -> None:
+        """Called when the registration's job has finished, one way or the other."""
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE registration_tokens SET password = NULL WHERE username = ?", (username,)
+            )
+
+    def get_or_create(
+        self,
+        token: str,
+        email: str,
+        create: Callable[[Optional[dict]], dict],
+        failed: Callable[[dict], bool] = lambda entry: False,
+        cancel: Callable[[dict], None] = lambda entry: None,
+    ) -> tuple[dict, str]:
+        """
+        The entry for this registration and how it was found: "new" (just
+        created with `create(None)`, which returns username, password and
+        job_id), "token" (same browser tab/URL), "email" (same address,
+        another token) or "retry" (a match for which `failed(entry)` was
+        true, replaced with `create(entry)`).
+
+        Only the lookup and a reservation of the token run in the write
+        transaction; `create` runs outside it, so sign-ups do not queue
+        behind each other's allocation and enqueue. A concurrent call for
+        the same token or email waits for the reservation. If the job id
+        cannot be recorded, `cancel(entry)` withdraws the job `create` made.
+        """
+        email = email.strip().lower() or None
+        while True:
+            found, entry, stale = self._reserve(token, email, failed)
+            if found == "busy":
+                time.sleep(_RESERVATION_POLL)
+                continue
+            if entry is not None:
+                return entry, found
+
+            reserved = stale[-1]
+            previous = next((m for m in stale[:-1] if m["username"]), None)
+            try:
+                entry = {"token": token, "email": email, **create(previous), "created_at": time.time()}
+            except BaseException:
+                self._release(reserved, stale[:-1])
+                raise
+            try:
+                recorded = self._record(entry, reserved)
+            except BaseException:
+                self._cancel(cancel, entry)
+                self._release(reserved, stale[:-1])
+                raise
+            if recorded:
+                return entry, "retry" if previous else "new"
+            # Reservation expired and was taken over; that call owns the registration now
+            self._cancel(cancel, entry)
+
+    def _reserve(
+        self, token: str, email: Optional[str], failed: Callable[[dict], bool]
+    ) -> tuple[str, Optional[dict], list[dict]]:
+        """
+        In one write transaction: ("token" | "email", entry, []) for a live
+        match, ("busy", None, []) while another call holds a reservation,
+        or ("reserved", None, replaced + [reservation]) once the failed or
+        expired matches have been swapped for a reservation of this token.
+        """
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            self._forget_passwords(db)
+            matches = [db.execute(
+                "SELECT * FROM registration_tokens WHERE token = ?", (token,)
+            ).fetchone()]
+            if email:
+                matches.append(db.execute(
+                    "SELECT * FROM registration_tokens WHERE email = ?", (email,)
+                ).fetchone())
+            matches = [dict(r) if r else None for r in matches]
+            now     = time.time()
+            for entry, found in zip(matches, ("token", "email")):
+                if entry is None:
+                    continue
+                if entry["reserved_at"] is not None:
+                    if now - entry["reserved_at"] < self.reservation_timeout:
+                        db.execute("COMMIT")
+                        return "busy", None, []
+                elif not failed(entry):
+                    db.execute("COMMIT")
+                    return found, entry, []
+
+            stale = list({m["token"]: m for m in matches if m}.values())
+            # A retry keeps the failed entry's username and job id while it
+            # is reserved, so the name stays taken and an expired
+            # reservation can itself be retried
+            carried  = next((m for m in stale if m["username"]), None)
+            reserved = {
+                "token":       token,
+                "email":       email,
+                "username":    carried["username"] if carried else "",
+                "password":    None,
+                "job_id":      carried["job_id"] if carried else 0,
+                "created_at":  now,
+                "reserved_at": now,
+            }
+            db.executemany(
+                "DELETE FROM registration_tokens WHERE token = ?", [(m["token"],) for m in stale]
+            )
+            self._insert(db, reserved)
+            db.execute("COMMIT")
+            return "reserved", None, stale + [reserved]
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, entry: dict) -> None:
+        db.execute(
+            "INSERT INTO registration_tokens "
+            "(token, email, username, password, job_id, created_at, reserved_at) "
+            "VALUES (:token, :email, :username, :password, :job_id, :created_at, :reserved_at)",
+            {"reserved_at": None, **entry},
+        )
+
+    def _record(self, entry: dict, reserved: dict) -> bool:
+        """Fill in the reservation; False if it is no longer this call's."""
+        with closing(self._connect()) as db:
+            cur = db.execute(
+                "UPDATE registration_tokens SET username = :username, password = :password, "
+                "job_id = :job_id, created_at = :created_at, reserved_at = NULL "
+                "WHERE token = :token AND reserved_at = :reserved_at",
+                {**entry, "reserved_at": reserved["reserved_at"]},
+            )
+            return cur.rowcount == 1
+
+    def _release(self, reserved: dict, replaced: list[dict]) -> None:
+        """Drop a reservation whose create failed and put back what it replaced."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            cur = db.execute(
+                "DELETE FROM registration_tokens WHERE token = ? AND reserved_at = ?",
+                (reserved["token"], reserved["reserved_at"]),
+            )
+            if cur.rowcount:
+                for entry in replaced:
+                    self._insert(db, entry)
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _cancel(cancel: Callable[[dict], None], entry: dict) -> None:
+        try:
+            cancel(entry)
+        except Exception:
+            logger.exception("Could not cancel job %s for %s", entry["job_id"], entry["username"])
+
+
+_index: Optional[RegistrationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> RegistrationIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RegistrationIndex()
+        return _index
@@ -1,10 +1,129 @@
+import asyncio
 import logging
+import threading
+import time
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from typing import Callable, Optional
+
+from admission import TokenBucket, get_limiter
+from config import (
+    INCEPTION_KEEP_ALIVE,
+    INCEPTION_POOL_SIZE,
+    PING_TIMEOUT,
+    PROJECT_CACHE_MISS_TTL,
+    PROJECT_CACHE_TTL,
+    REQUEST_TIMEOUT,
+)
+from deadline import Deadline, DeadlineExceeded, request_timeout
+from inception_health import (
+    CircuitBreaker,
+    ensure_prober,
+    get_breaker,
+    get_prober,
+    stop_prober,
+)
+from metrics import INCEPTION_SECONDS, timed_call
 
 logger = logging.getLogger(__name__)
 
 
+class UserExists(Exception):
+    """INCEpTION answered 409: an account with this username already exists."""
+
+
+class ProjectCache:
+    """
+    Process-wide project name → id map with a TTL.
+
+    Misses are single-flight: while one thread downloads the project list,
+    every other thread that misses waits for that download instead of
+    starting its own. A name that is absent from a freshly downloaded list
+    is remembered as missing for `miss_ttl` seconds, so lookups of a
+    project that does not exist do not download the list every time.
+    """
+
+    def __init__(self, ttl: float = PROJECT_CACHE_TTL, miss_ttl: float = PROJECT_CACHE_MISS_TTL):
+        self.ttl        = ttl
+        self.miss_ttl   = miss_ttl
+        self.hits       = 0
+        self.misses     = 0
+        self._ids:      dict[str, int]   = {}
+        self._missing:  dict[str, float] = {}    # name → monotonic time it was found absent
+        self._loaded_at = 0.0
+        self._lock      = threading.Lock()
+        self._refresh:  Optional[threading.Event] = None
+
+    def _fresh(self) -> bool:
+        return bool(self._loaded_at) and time.monotonic() - self._loaded_at < self.ttl
+
+    def get(self, name: str, fetch: Callable[[], list[dict]]) -> Optional[int]:
+        with self._lock:
+            if self._fresh() and name in self._ids:
+                self.hits += 1
+                return self._ids[name]
+            missing_at = self._missing.get(name)
+            if missing_at is not None and time.monotonic() - missing_at < self.miss_ttl:
+                self.hits += 1
+                return None
+            self.misses += 1
+            self._ids.pop(name, None)
+        self.refresh(fetch)
+        with self._lock:
+            project_id = self._ids.get(name)
+            # Only a list downloaded just now proves the name is absent; after a
+            # failed download the next lookup should try again
+            if project_id is None and self._fresh():
+                self._missing[name] = time.monotonic()
+            return project_id
+
+    def refresh(self, fetch: Callable[[], list[dict]]) -> None:
+        with self._lock:
+            pending = self._refresh
+            leader  = pending is None
+            if leader:
+                pending = self._refresh = threading.Event()
+        if not leader:
+            pending.wait()
+            return
+
+        try:
+            projects = fetch()
+            with self._lock:
+                if projects:
+                    self._ids       = {p["name"]: p["id"] for p in projects}
+                    self._loaded_at = time.monotonic()
+                    self._missing   = {}
+        finally:
+            with self._lock:
+                self._refresh = None
+            pending.set()
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._ids.clear()
+                self._missing.clear()
+                self._loaded_at = 0.0
+            else:
+                self._ids.pop(name, None)
+                self._missing.pop(name, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._ids)}
+
+
+_project_caches: dict[str, ProjectCache] = {}
+_project_caches_lock = threading.Lock()
+
+
+def get_project_cache(base_url: str) -> ProjectCache:
+    """Return the cache shared by every client pointing at `base_url`."""
+    with _project_caches_lock:
+        return _project_caches.setdefault(base_url.rstrip("/"), ProjectCache())
+
+
 class InceptionClient:
     """
     HTTP client for the INCEpTION Remote API (AERO v1).
@@ -18,64 +137,195 @@ class InceptionClient:
     endpoint for this in all versions. If create_user() returns False,
     the registration is still saved to Google Sheets and the user is
     shown the admin contact for manual account setup.
+
+    One instance is meant to be shared by every script thread: the session
+    is configured once here and never mutated afterwards, and urllib3's
+    connection pool hands each concurrent request its own connection.
+
+    Requests go through the process-wide "inception" bucket from
+    config.SERVICE_RATES unless `limiter` is given; a separate tool such as
+    provision_backlog.py passes its own bucket so its --rate is not capped
+    by the app's setting.
     """
 
-    def __init__(self, base_url: str, username: str, password: str):
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        pool_size: int = INCEPTION_POOL_SIZE,
+        keep_alive: bool = INCEPTION_KEEP_ALIVE,
+        limiter: Optional[TokenBucket] = None,
+    ):
         self.base_url  = base_url.rstrip("/")
+        self.projects  = get_project_cache(self.base_url)
+        self.breaker   = get_breaker(self.base_url)
+        self.limiter   = limiter or get_limiter("inception")
         self._session  = requests.Session()
         self._session.auth = (username, password)
         self._session.headers.update({
             "Accept":       "application/json",
             "Content-Type": "application/json",
         })
+        if not keep_alive:
+            self._session.headers["Connection"] = "close"
+        # pool_block=False: a request that finds every pooled connection busy
+        # opens a throwaway one instead of waiting for a free one, a wait
+        # neither the deadline nor the request timeout would cover
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """Stop this client's health prober and close its connections."""
+        stop_prober(self.base_url, self._probe)
+        self._session.close()
+
+    def _record(self, response: requests.Response) -> None:
+        # 4xx means INCEpTION answered; only server errors count against it
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _send(
+        self, method: str, path: str, deadline: Optional[Deadline], cap: float, **kwargs
+    ) -> Optional[requests.Response]:
+        # Breaker first: while it is open, calls fail fast without using up rate slots
+        if not self.breaker.allow_request():
+            logger.debug("%s %s skipped — circuit open.", method, path)
+            return None
+        if not self.limiter.acquire(deadline):
+            self.breaker.record_inconclusive()          # pass a half-open trial on
+            logger.warning("%s %s skipped — rate limit wait exceeds the deadline.", method, path)
+            return None
+        try:
+            timeout = request_timeout(deadline, cap)
+        except DeadlineExceeded:
+            self.breaker.record_inconclusive()
+            logger.warning("%s %s skipped — registration deadline passed.", method, path)
+            return None
+        try:
+            r = self._session.request(
+                method, f"{self.base_url}{path}", timeout=timeout, **kwargs
+            )
+        except requests.Timeout as exc:
+            if timeout < cap:
+                # Only the caller's deadline made this timeout short
+                self.breaker.record_inconclusive()
+                logger.warning("%s %s → timed out at the registration deadline.", method, path)
+            else:
+                self.breaker.record_failure()
+                logger.error("%s %s → %s", method, path, exc)
+            return None
+        except Exception as exc:
+            self.breaker.record_failure()
+            logger.error("%s %s → %s", method, path, exc)
+            return None
+        self._record(r)
+        return r
 
-    def _get(self, path: str) -> Optional[dict]:
+    def _get(self, path: str, deadline: Optional[Deadline] = None) -> Optional[dict]:
+        r = self._send("GET", path, deadline, REQUEST_TIMEOUT)
+        if r is None:
+            return None
         try:
-            r = self._session.get(f"{self.base_url}{path}", timeout=10)
             r.raise_for_status()
             return r.json()
         except Exception as exc:
             logger.error("GET %s → %s", path, exc)
             return None
 
-    def _post(self, path: str, payload: dict) -> Optional[requests.Response]:
+    def _post(
+        self, path: str, payload: dict, deadline: Optional[Deadline] = None
+    ) -> Optional[requests.Response]:
+        r = self._send("POST", path, deadline, REQUEST_TIMEOUT, json=payload)
+        if r is None:
+            return None
         try:
-            r = self._session.post(
-                f"{self.base_url}{path}", json=payload, timeout=10
-            )
             r.raise_for_status()
             return r
         except requests.HTTPError as exc:
             logger.error("POST %s → HTTP %s: %s",
                          path, exc.response.status_code, exc.response.text)
             return None
-        except Exception as exc:
-            logger.error("POST %s → %s", path, exc)
-            return None
 
-    def ping(self) -> bool:
+    def _probe(self, deadline: Optional[Deadline] = None) -> bool:
+        """One real round-trip, bypassing the breaker."""
         try:
             r = self._session.get(
-                f"{self.base_url}/api/aero/v1/projects", timeout=5
+                f"{self.base_url}/api/aero/v1/projects",
+                timeout=request_timeout(deadline, PING_TIMEOUT),
             )
             return r.status_code < 500
         except Exception:
             return False
 
-    def get_projects(self) -> list[dict]:
-        data = self._get("/api/aero/v1/projects")
+    def start_health_probe(self) -> None:
+        """Probe this base URL in the background with this client (idempotent)."""
+        ensure_prober(self.base_url, self._probe)
+
+    @timed_call(INCEPTION_SECONDS, method="ping")
+    def ping(self, deadline: Optional[Deadline] = None) -> bool:
+        """
+        Answer from shared health state where possible: an open breaker
+        returns False at once, a recent background probe result is reused,
+        and only a cold start pays for a real round-trip.
+        """
+        if self.breaker.state == CircuitBreaker.OPEN:
+            return False
+        prober = get_prober(self.base_url)
+        cached = prober.cached_health() if prober else None
+        if cached is not None:
+            return cached
+        if deadline is not None and deadline.expired:
+            return False
+        ok = self._probe(deadline)
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return ok
+
+    @timed_call(INCEPTION_SECONDS, method="get_projects")
+    def get_projects(self, deadline: Optional[Deadline] = None) -> list[dict]:
+        data = self._get("/api/aero/v1/projects", deadline)
         if data and "body" in data:
             return data["body"]
         return []
 
-    def get_project_id(self, project_name: str) -> Optional[int]:
-        for p in self.get_projects():
-            if p.get("name") == project_name:
-                return p["id"]
-        logger.warning("Project '%s' not found.", project_name)
-        return None
+    @timed_call(INCEPTION_SECONDS, method="get_project_members")
+    def get_project_members(
+        self, project_id: int, deadline: Optional[Deadline] = None
+    ) -> Optional[list[str]]:
+        """Usernames with any role in the project; None if the request failed."""
+        data = self._get(f"/api/aero/v1/projects/{project_id}/members", deadline)
+        if data is None or "body" not in data:
+            return None
+        return [m["user"] for m in data["body"] if m.get("user")]
+
+    @timed_call(INCEPTION_SECONDS, method="get_project_id")
+    def get_project_id(
+        self, project_name: str, deadline: Optional[Deadline] = None
+    ) -> Optional[int]:
+        project_id = self.projects.get(project_name, lambda: self.get_projects(deadline))
+        if project_id is None:
+            logger.warning("Project '%s' not found.", project_name)
+        return project_id
 
-    def create_user(self, username: str, password: str, email: str = "") -> bool:
+    @timed_call(INCEPTION_SECONDS, method="create_user")
+    def create_user(
+        self,
+        username: str,
+        password: str,
+        email: str = "",
+        deadline: Optional[Deadline] = None,
+    ) -> bool:
+        """
+        True once the account exists. Raises UserExists on HTTP 409, which the
+        caller has to interpret: a name taken by someone else, or an account
+        made by an earlier attempt of the same registration.
+        """
         payload = {
             "uiName":  username,
             "password": password,
@@ -83,27 +333,133 @@ class InceptionClient:
             "roles":    ["ROLE_USER"],
             "enabled":  True,
         }
-        response = self._post("/api/aero/v1/users", payload)
-        if response is not None:
+        path = "/api/aero/v1/users"
+        r    = self._send("POST", path, deadline, REQUEST_TIMEOUT, json=payload)
+        if r is not None and r.status_code == 409:
+            raise UserExists(username)
+        if r is not None and r.ok:
             logger.info("User '%s' created.", username)
             return True
+        if r is not None:
+            logger.error("POST %s → HTTP %s: %s", path, r.status_code, r.text)
         logger.warning("User '%s' API creation failed — manual setup needed.", username)
         return False
 
+    @timed_call(INCEPTION_SECONDS, method="add_user_to_project")
     def add_user_to_project(
         self,
         username: str,
         project_name: str,
         role: str = "ANNOTATOR",
+        deadline: Optional[Deadline] = None,
     ) -> bool:
-        project_id = self.get_project_id(project_name)
+        project_id = self.get_project_id(project_name, deadline)
         if project_id is None:
             return False
         response = self._post(
             f"/api/aero/v1/projects/{project_id}/members",
             {"user": username, "role": role},
+            deadline,
         )
         if response is not None:
             logger.info("Added '%s' to project '%s'.", username, project_name)
             return True
+        if deadline is not None and deadline.expired:
+            return False
+        # The id may belong to a project that was deleted or recreated;
+        # drop it so the next lookup fetches the catalog again.
+        self.projects.invalidate(project_name)
         return False
+
+
+class AsyncInceptionClient:
+    """
+    asyncio façade over InceptionClient with the same method names.
+
+    Every call runs the blocking request in a worker thread, so several
+    calls can be awaited together; `max_concurrency` caps how many are
+    in flight against INCEpTION at any moment.
+    """
+
+    def __init__(self, client: InceptionClient, max_concurrency: int = 4):
+        self._client    = client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _call(self, fn, *args, **kwargs):
+        async with self._semaphore:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def ping(self, deadline: Optional[Deadline] = None) -> bool:
+        return await self._call(self._client.ping, deadline)
+
+    async def get_projects(self, deadline: Optional[Deadline] = None) -> list[dict]:
+        return await self._call(self._client.get_projects, deadline)
+
+    async def get_project_members(
+        self, project_id: int, deadline: Optional[Deadline] = None
+    ) -> Optional[list[str]]:
+        return await self._call(self._client.get_project_members, project_id, deadline)
+
+    async def get_project_id(
+        self, project_name: str, deadline: Optional[Deadline] = None
+    ) -> Optional[int]:
+        return await self._call(self._client.get_project_id, project_name, deadline)
+
+    async def create_user(
+        self,
+        username: str,
+        password: str,
+        email: str = "",
+        deadline: Optional[Deadline] = None,
+    ) -> bool:
+        return await self._call(
+            self._client.create_user, username, password, email, deadline
+        )
+
+    async def add_user_to_project(
+        self,
+        username: str,
+        project_name: str,
+        role: str = "ANNOTATOR",
+        deadline: Optional[Deadline] = None,
+    ) -> bool:
+        return await self._call(
+            self._client.add_user_to_project, username, project_name, role, deadline
+        )
+
+    async def add_user_to_projects(
+        self,
+        username: str,
+        project_names: list[str],
+        role: str = "ANNOTATOR",
+        deadline: Optional[Deadline] = None,
+    ) -> list[bool]:
+        """Send all membership requests at once; results keep the input order."""
+        return list(await asyncio.gather(*(
+            self.add_user_to_project(username, name, role, deadline)
+            for name in project_names
+        )))
+
+
+def add_user_to_projects(
+    client: InceptionClient,
+    username: str,
+    project_names: list[str],
+    max_concurrency: int = 4,
+    deadline: Optional[Deadline] = None,
+) -> list[bool]:
+    """
+    Blocking wrapper for callers without an event loop (the Streamlit script
+    thread). Total time is bounded by the slowest membership call rather than
+    the sum of all of them.
+    """
+    if not project_names:
+        return []
+
+    async def _run() -> list[bool]:
+        aclient = AsyncInceptionClient(client, max_concurrency)
+        return await aclient.add_user_to_projects(
+            username, project_names, deadline=deadline
+        )
+
+    return asyncio.run(_run())
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, HEALTH_PROBE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Shared failure gate in front of INCEpTION.
+
+    closed    — requests flow normally; consecutive failures are counted.
+    open      — requests are refused immediately until `reset_timeout` passes
+                or a health probe succeeds.
+    half_open — one trial request is let through; its outcome closes or
+                re-opens the breaker.
+    """
+
+    CLOSED    = "closed"
+    OPEN      = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout     = reset_timeout
+        self._state            = self.CLOSED
+        self._failures         = 0
+        self._opened_at        = 0.0
+        self._trial_running    = False
+        self._lock             = threading.Lock()
+
+    def _current_state(self) -> str:
+        if (self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout):
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("INCEpTION circuit closed.")
+            self._state         = self.CLOSED
+            self._failures      = 0
+            self._trial_running = False
+
+    def record_inconclusive(self) -> None:
+        """
+        The request ended without saying anything about INCEpTION, e.g. it was
+        cut short by the caller's deadline: count nothing, but free the
+        half-open trial slot for the next request.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures     += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("INCEpTION circuit opened after %d failures.", self._failures)
+                self._state     = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class HealthProber:
+    """
+    Daemon thread that probes INCEpTION every `interval` seconds and feeds
+    the result into the breaker, so recovery is noticed without waiting
+    for a user request.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], bool],
+        breaker: CircuitBreaker,
+        interval: float = HEALTH_PROBE_INTERVAL,
+    ):
+        self.interval     = interval
+        self.last_ok:     Optional[bool] = None
+        self.last_checked = 0.0
+        self.probe        = probe
+        self._breaker     = breaker
+        self._stop        = threading.Event()
+        self._thread      = threading.Thread(
+            target=self._run, name="inception-health", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def cached_health(self) -> Optional[bool]:
+        """Last probe result, or None if it is older than two intervals."""
+        if time.monotonic() - self.last_checked > 2 * self.interval:
+            return None
+        return self.last_ok
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ok = self.probe()
+            except Exception as exc:
+                logger.debug("Health probe raised %s", exc)
+                ok = False
+            self.last_ok, self.last_checked = ok, time.monotonic()
+            if ok:
+                self._breaker.record_success()
+            else:
+                self._breaker.record_failure()
+            self._stop.wait(self.interval)
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_probers:  dict[str, HealthProber]   = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """Return the breaker shared by every client pointing at `base_url`."""
+    with _registry_lock:
+        return _breakers.setdefault(base_url.rstrip("/"), CircuitBreaker())
+
+
+def get_prober(base_url: str) -> Optional[HealthProber]:
+    with _registry_lock:
+        return _probers.get(base_url.rstrip("/"))
+
+
+def ensure_prober(base_url: str, probe: Callable[[], bool]) -> HealthProber:
+    """
+    Keep one background prober running for `base_url` with `probe`. A prober
+    started by an older client (other session, other credentials) is
+    stopped and replaced.
+    """
+    key = base_url.rstrip("/")
+    with _registry_lock:
+        prober = _probers.get(key)
+        if prober is not None and prober.probe != probe:
+            prober.stop()
+            prober = None
+        if prober is None:
+            breaker = _breakers.setdefault(key, CircuitBreaker())
+            prober  = _probers[key] = HealthProber(probe, breaker)
+            prober.start()
+        return prober
+
+
+def stop_prober(base_url: str, probe: Callable[[], bool]) -> None:
+    """Stop the prober for `base_url` if it is the one running `probe`."""
+    key = base_url.rstrip("/")
+    with _registry_lock:
+        prober = _probers.get(key)
+        if prober is not None and prober.probe == probe:
+            prober.stop()
+            del _probers[key]
@@ -0,0 +1,292 @@
+"""
+Local stand-in for the INCEpTION AERO v1 endpoints used by InceptionClient.
+
+    python inception_stub.py --port 8081 --latency 0.05 --error-rate 0.02
+    python inception_stub.py --outage 30:60              # 503s from t=30s to t=60s
+    python inception_stub.py --record https://inception.example.org --cassette run.json
+    python inception_stub.py --replay run.json
+
+Point the app at it with INCEPTION_URL=http://127.0.0.1:8081. From Python:
+
+    with StubServer(latency=0.02) as base_url:
+        client = InceptionClient(base_url, "admin", "admin")
+
+Modes:
+    (default) in-memory fake seeded with the projects in config.LANGUAGES
+    record    forwards every request to a real server and saves the traffic
+    replay    answers from a saved cassette, matching on method + path
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from config import LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+API = "/api/aero/v1"
+MEMBERS_PATH = re.compile(rf"^{API}/projects/(\d+)/members$")
+
+
+@dataclass
+class StubBehaviour:
+    """Fault injection knobs; times are seconds."""
+
+    latency:    float = 0.0
+    jitter:     float = 0.0
+    error_rate: float = 0.0
+    outages:    list[tuple[float, float]] = field(default_factory=list)   # since start
+
+
+class _FakeAero:
+    """In-memory projects, users and memberships."""
+
+    def __init__(self, project_names: list[str]):
+        self.projects = {i + 1: name for i, name in enumerate(project_names)}
+        self.users:   dict[str, dict] = {}
+        self.members: dict[int, dict[str, str]] = {pid: {} for pid in self.projects}
+        self._lock    = threading.Lock()
+
+    def handle(self, method: str, path: str, body: dict) -> tuple[int, object]:
+        with self._lock:
+            if method == "GET" and path == f"{API}/projects":
+                return 200, [{"id": pid, "name": name, "title": name.title()}
+                             for pid, name in self.projects.items()]
+
+            if method == "POST" and path == f"{API}/users":
+                name = body.get("uiName", "")
+                if not name:
+                    return 400, "uiName is required"
+                if name in self.users:
+                    return 409, f"User '{name}' already exists"
+                self.users[name] = {k: v for k, v in body.items() if k != "password"}
+                return 201, self.users[name]
+
+            m = MEMBERS_PATH.match(path)
+            if m:
+                pid = int(m.group(1))
+                if pid not in self.projects:
+                    return 404, f"Project {pid} not found"
+                if method == "GET":
+                    return 200, [{"user": u, "role": r} for u, r in self.members[pid].items()]
+                if method == "POST":
+                    user = body.get("user", "")
+                    if user not in self.users:
+                        return 404, f"User '{user}' not found"
+                    self.members[pid][user] = body.get("role", "ANNOTATOR")
+                    return 201, {"user": user, "role": self.members[pid][user]}
+
+        return 404, f"No stub for {method} {path}"
+
+
+class _Cassette:
+    """Recorded interactions, replayed in order per (method, path)."""
+
+    def __init__(self, path: Path):
+        self.path          = path
+        self.interactions: list[dict] = []
+        self._cursor:      dict[tuple[str, str], int] = {}
+        self._lock         = threading.Lock()
+
+    def load(self) -> "_Cassette":
+        self.interactions = json.loads(self.path.read_text(encoding="utf-8"))
+        return self
+
+    def record(self, method: str, path: str, request: dict, status: int, body: str) -> None:
+        with self._lock:
+            self.interactions.append({
+                "method": method, "path": path, "request": request,
+                "status": status, "body": body,
+            })
+            self.path.write_text(json.dumps(self.interactions, indent=1), encoding="utf-8")
+
+    def replay(self, method: str, path: str) -> Optional[tuple[int, str]]:
+        with self._lock:
+            matches = [i for i in self.interactions
+                       if i["method"] == method and i["path"] == path]
+            if not matches:
+                return None
+            n = self._cursor.get((method, path), 0)
+            self._cursor[(method, path)] = n + 1
+            hit = matches[min(n, len(matches) - 1)]      # repeat the last one
+            return hit["status"], hit["body"]
+
+
+class StubServer:
+    """Threaded localhost AERO stand-in; usable as a context manager."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        outages: Optional[list[tuple[float, float]]] = None,
+        record_upstream: Optional[str] = None,
+        replay: Optional[str] = None,
+        cassette: Optional[str] = None,
+        project_names: Optional[list[str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.behaviour = StubBehaviour(latency, jitter, error_rate, outages or [])
+        self.aero      = _FakeAero(project_names or [p for _, p in LANGUAGES.values()])
+        self.upstream  = record_upstream.rstrip("/") if record_upstream else None
+        self.cassette: Optional[_Cassette] = None
+        if replay:
+            self.cassette = _Cassette(Path(replay)).load()
+        elif record_upstream:
+            self.cassette = _Cassette(Path(cassette or "inception_cassette.json"))
+        self.requests  = 0
+        self._count    = threading.Lock()
+        self._random   = random.Random(seed)
+        self._started  = 0.0
+        self._httpd    = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread:  Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._started = time.monotonic()
+        self._thread  = threading.Thread(
+            target=self._httpd.serve_forever, name="inception-stub", daemon=True
+        )
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def in_outage(self) -> bool:
+        t = time.monotonic() - self._started
+        return any(start <= t < end for start, end in self.behaviour.outages)
+
+    def _respond(self, method: str, path: str, raw: bytes, headers) -> tuple[int, str]:
+        with self._count:
+            self.requests += 1
+        b = self.behaviour
+        if b.latency or b.jitter:
+            time.sleep(max(0.0, b.latency + self._random.uniform(-b.jitter, b.jitter)))
+        if self.in_outage():
+            return 503, "Service unavailable (stub outage)"
+        if b.error_rate and self._random.random() < b.error_rate:
+            return 500, "Internal server error (stub fault)"
+
+        if self.upstream:
+            return self._forward(method, path, raw, headers)
+        if self.cassette:
+            hit = self.cassette.replay(method, path)
+            return hit if hit else (404, f"No recorded {method} {path}")
+
+        try:
+            body = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            return 400, "Malformed JSON"
+        status, payload = self.aero.handle(method, path, body)
+        if status >= 400:
+            return status, json.dumps({"messages": [{"level": "ERROR", "message": payload}]})
+        return status, json.dumps({"messages": [], "body": payload})
+
+    def _forward(self, method: str, path: str, raw: bytes, headers) -> tuple[int, str]:
+        import requests
+
+        forward = {k: v for k, v in headers.items()
+                   if k.lower() in ("authorization", "content-type", "accept")}
+        try:
+            r = requests.request(
+                method, f"{self.upstream}{path}", data=raw or None,
+                headers=forward, timeout=30,
+            )
+            status, text = r.status_code, r.text
+        except requests.RequestException as exc:
+            status, text = 502, f"Upstream error: {exc}"
+        request = json.loads(raw) if raw else {}
+        if isinstance(request, dict):
+            request.pop("password", None)                 # keep secrets out of cassettes
+        self.cassette.record(method, path, request, status, text)
+        return status, text
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw    = self.rfile.read(length) if length else b""
+                status, text = server._respond(self.command, self.path, raw, self.headers)
+                data = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET  = _serve
+            do_POST = _serve
+
+            def log_message(self, fmt, *args) -> None:
+                logger.debug("stub: " + fmt, *args)
+
+        return Handler
+
+
+def _parse_outage(value: str) -> tuple[float, float]:
+    start, end = value.split(":", 1)
+    return float(start), float(end)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local INCEpTION AERO v1 stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 500")
+    parser.add_argument("--outage", type=_parse_outage, action="append", default=[],
+                        metavar="START:END", help="answer 503 in this window (repeatable)")
+    parser.add_argument("--seed", type=int)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="URL", help="proxy to a real server and record")
+    mode.add_argument("--replay", metavar="CASSETTE", help="serve a recorded cassette")
+    parser.add_argument("--cassette", default="inception_cassette.json",
+                        help="output file for --record")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = StubServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.outage,
+        record_upstream=args.record, replay=args.replay, cassette=args.cassette,
+        seed=args.seed,
+    )
+    logger.info("INCEpTION stub listening on %s", server.start())
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED  = "queued"
+RUNNING = "running"
+DONE    = "done"
+DEAD    = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload      TEXT    NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'queued',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_run_at  REAL    NOT NULL,
+    last_error   TEXT,
+    result       TEXT,
+    created_at   REAL    NOT NULL,
+    started_at   REAL,
+    updated_at   REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_run_at);
+"""
+
+
+class RetryableError(Exception):
+    """Raised by a handler to ask for another attempt after a backoff."""
+
+
+class JobQueue:
+    """
+    Durable FIFO job queue in SQLite, drained by a pool of daemon threads.
+
+    `handler(payload, final_attempt)` returns a JSON-serialisable result.
+    Any exception schedules a retry with exponential backoff; after
+    `max_attempts` the job is moved to the dead-letter state and
+    `on_dead(payload, error)` is called. Jobs left `running` by a crashed
+    process are put back in the queue on start-up.
+
+    The first claim stamps the job's `started_at`, which the handler gets
+    as `payload["started_at"]`; time spent waiting in line before that is
+    reported by `wait_estimate()` rather than charged to the job. The
+    handler also gets `payload["attempt"]` (1 for the first run), so it can
+    recognise side effects left by an earlier attempt that crashed.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        handler: Callable[[dict, bool], dict],
+        workers: int = 4,
+        max_attempts: int = 3,
+        backoff: float = 5.0,
+        on_dead: Optional[Callable[[dict, str], None]] = None,
+        scrub_keys: tuple[str, ...] = (),
+    ):
+        self.db_path      = str(db_path)
+        self.handler      = handler
+        self.workers      = workers
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self.on_dead      = on_dead
+        self.scrub_keys   = scrub_keys
+        self._wake        = threading.Condition()
+        self._stop        = threading.Event()
+        self._threads:    list[threading.Thread] = []
+        self._avg_lock    = threading.Lock()
+        self._avg_seconds: Optional[float] = None   # moving average of handler run time
+
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            columns = {r["name"] for r in db.execute("PRAGMA table_info(jobs)")}
+            if "started_at" not in columns:          # queue files from before started_at
+                db.execute("ALTER TABLE jobs ADD COLUMN started_at REAL")
+            db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            yield db
+        finally:
+            db.close()
+
+    # ── Producer side ──────────────────────────────────────────────────────────
+
+    def enqueue(self, payload: dict) -> int:
+        now = time.time()
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO jobs (payload, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (json.dumps(payload), now, now, now),
+            )
+            job_id = cur.lastrowid
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Withdraw a job no worker has picked up yet; False once one has."""
+        with self._connect() as db:
+            cur = db.execute("DELETE FROM jobs WHERE id = ? AND status = ?", (job_id, QUEUED))
+        if cur.rowcount == 0:
+            logger.warning("Job %s could not be cancelled: already started", job_id)
+        return cur.rowcount == 1
+
+    def status(self, job_id: int) -> Optional[dict]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT status, attempts, last_error, result, started_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status":     row["status"],
+            "attempts":   row["attempts"],
+            "last_error": row["last_error"],
+            "result":     json.loads(row["result"]) if row["result"] else None,
+            "started_at": row["started_at"],
+        }
+
+    def wait_estimate(self, job_id: int) -> Optional[tuple[int, Optional[float]]]:
+        """
+        (jobs ahead in line, estimated seconds until this one starts) while
+        the job is queued, else None. The estimate is None until a job
+        has finished in this process.
+        """
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != QUEUED:
+                return None
+            ahead = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ? AND next_run_at <= ?",
+                (QUEUED, job_id, now),
+            ).fetchone()[0]
+        with self._avg_lock:
+            avg = self._avg_seconds
+        if avg is None:
+            return ahead, None
+        rounds = -(-(ahead + 1) // max(1, self.workers))
+        return ahead, rounds * avg
+
+    def dead_letters(self) -> list[dict]:
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, payload, attempts, last_error FROM jobs WHERE status = ?",
+                (DEAD,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    # ── Worker side ────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    def _claim(self) -> Optional[dict]:
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id, payload, attempts, started_at FROM jobs "
+                "WHERE status = ? AND next_run_at <= ? ORDER BY id LIMIT 1",
+                (QUEUED, time.time()),
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (RUNNING, now, now, row["id"]),
+                )
+                row = {**dict(row), "started_at": row["started_at"] or now}
+            db.execute("COMMIT")
+            return row
+
+    def _scrubbed(self, payload: dict) -> str:
+        return json.dumps({k: v for k, v in payload.items() if k not in self.scrub_keys})
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except sqlite3.OperationalError as exc:
+                logger.warning("Job claim failed: %s", exc)
+                row = None
+            if row is None:
+                with self._wake:
+                    self._wake.wait(timeout=1.0)
+                continue
+
+            payload = json.loads(row["payload"])
+            attempt = row["attempts"] + 1
+            payload["started_at"] = row["started_at"]
+            payload["attempt"]    = attempt
+            final   = attempt >= self.max_attempts
+            started = time.monotonic()
+            try:
+                result = self.handler(payload, final)
+            except Exception as exc:
+                self._failed(row["id"], payload, attempt, exc)
+                continue
+            finally:
+                self._observe(time.monotonic() - started)
+
+            with self._connect() as db:
+                db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, payload = ?, last_error = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (DONE, json.dumps(result), self._scrubbed(payload), time.time(), row["id"]),
+                )
+
+    def _observe(self, seconds: float) -> None:
+        with self._avg_lock:
+            if self._avg_seconds is None:
+                self._avg_seconds = seconds
+            else:
+                self._avg_seconds += 0.2 * (seconds - self._avg_seconds)
+
+    def _failed(self, job_id: int, payload: dict, attempt: int, exc: Exception) -> None:
+        error = f"{type(exc).__name__}: {exc}"
+        now   = time.time()
+        with self._connect() as db:
+            if attempt >= self.max_attempts:
+                logger.error("Job %s dead after %d attempts: %s", job_id, attempt, error)
+                db.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, payload = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (DEAD, error, self._scrubbed(payload), now, job_id),
+                )
+            else:
+                delay = self.backoff * 2 ** (attempt - 1)
+                if not isinstance(exc, RetryableError):
+                    logger.exception("Job %s attempt %d failed", job_id, attempt, exc_info=exc)
+                db.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, next_run_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (QUEUED, error, now + delay, now, job_id),
+                )
+        if attempt >= self.max_attempts and self.on_dead:
+            try:
+                self.on_dead(payload, error)
+            except Exception:
+                logger.exception("Dead-letter hook for job %s failed", job_id)
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:                      # Windows: in-process locking only
+    fcntl = None
+
+from config import JOURNAL_FSYNC_WINDOW, JOURNAL_PATH, LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+
+def _languages(record: dict) -> list[str]:
+    return [n.strip() for n in str(record.get("languages") or "").split(",") if n.strip()]
+
+
+def _project_names(record: dict) -> set[str]:
+    return {LANGUAGES[n][1] for n in _languages(record) if n in LANGUAGES}
+
+
+class RegistrationJournal:
+    """
+    Append-only JSONL log of registration records.
+
+    Appends take an exclusive file lock, so several processes can share the
+    file, and fsyncs are group-committed: the first writer to need one
+    waits `fsync_window` seconds, syncs everything written so far, and
+    releases every writer covered by it.
+
+    Updates are appended as `{"_update": username, ...}` lines; queries
+    fold them into the record and `read_from` skips them. `read_updates`
+    returns the records they changed, stopping at the first record line
+    the mirror has not sent yet, so a record is always mirrored before its
+    updates are. Queries
+    scan the whole file, so this backend suits small studies and local
+    development; see registration_store.SQLiteRegistrationStore.
+
+    A reader keeps its position as a byte offset in a side file
+    (`<journal>.cursor`). `begin(end)` records the batch being sent and
+    `commit(end)` advances the cursor, so after a crash the sync task can
+    tell whether the in-flight batch needs to be checked.
+    """
+
+    def __init__(self, path: str | Path = JOURNAL_PATH, fsync_window: float = JOURNAL_FSYNC_WINDOW):
+        self.path         = Path(path)
+        self.cursor_path  = self.path.with_suffix(self.path.suffix + ".cursor")
+        self.fsync_window = fsync_window
+        self.path.touch(exist_ok=True)
+        self._file        = self.path.open("a", encoding="utf-8")
+        self._lock        = threading.Lock()
+        self._sync        = threading.Condition()
+        self._written     = 0
+        self._synced      = 0
+        self._syncing     = False
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    # ── Writing ────────────────────────────────────────────────────────────────
+
+    def append(self, record: dict) -> None:
+        """Return once the record is on disk."""
+        line = json.dumps(record, default=str) + "\n"
+        with self._file_lock():
+            self._file.write(line)
+            self._file.flush()
+        with self._sync:
+            self._written += 1
+            ticket = self._written
+        self._wait_durable(ticket)
+
+    def update(self, username: str, fields: dict) -> None:
+        self.append({"_update": username, **fields})
+
+    def _wait_durable(self, ticket: int) -> None:
+        with self._sync:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._sync.wait()
+                    continue
+                self._syncing = True
+                break
+            else:
+                return
+
+        time.sleep(self.fsync_window)            # let other writers join this fsync
+        with self._sync:
+            covered = self._written
+        try:
+            os.fsync(self._file.fileno())
+        finally:
+            with self._sync:
+                self._synced  = max(self._synced, covered)
+                self._syncing = False
+                self._sync.notify_all()
+
+    # ── Reading ────────────────────────────────────────────────────────────────
+
+    def read_from(
+        self, offset: int, limit: int, end: Optional[int] = None
+    ) -> tuple[list[dict], int]:
+        """
+        Up to `limit` complete records after `offset` (stopping at byte `end`
+        if given), and the offset just past the last one returned.
+        """
+        records: list[dict] = []
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            while len(records) < limit and (end is None or offset < end):
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break                        # nothing more, or a write in progress
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping unreadable journal line at byte %d.", offset)
+                    continue
+                if "_update" not in record:
+                    records.append(record)
+        return records, offset
+
+    def tail(self) -> int:
+        return self.path.stat().st_size
+
+    # ── Queries (full scan) ────────────────────────────────────────────────────
+
+    def _current(self) -> list[dict]:
+        by_name: dict[str, dict] = {}
+        records: list[dict]      = []
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                name = record.pop("_update", None)
+                if name is None:
+                    records.append(record)
+                    by_name[record.get("generated_username")] = record
+                elif name in by_name:
+                    by_name[name].update(record)
+        return records
+
+    def find(self, email: Optional[str] = None, username: Optional[str] = None) -> list[dict]:
+        if username:
+            return [r for r in self._current() if r.get("generated_username") == username]
+        if email:
+            return [r for r in self._current() if r.get("email") == email]
+        return []
+
+    def usernames(self) -> set[str]:
+        return {r["generated_username"] for r in self._current() if r.get("generated_username")}
+
+    def count_by(self, column: str) -> dict:
+        """Counts per language (column='language'), status ('status') or account_created (0/1)."""
+        from registration_store import _created, status
+
+        counts: dict = {}
+        for r in self._current():
+            if column == "language":
+                keys = _languages(r)
+            elif column == "status":
+                keys = [status(r)]
+            else:
+                keys = [int(_created(r.get("account_created")))]
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def search(
+        self, language: Optional[str] = None, status: Optional[str] = None, text: str = "",
+        limit: int = 50, offset: int = 0,
+    ) -> tuple[list[dict], int]:
+        """One page of matching records, newest first, and the number of matches."""
+        from registration_store import status as status_of
+
+        found = [
+            r for r in reversed(self._current())
+            if (not language or language in _languages(r))
+            and (not status or status_of(r) == status)
+            and (not text or any(text in str(r.get(k) or "") for k in ("email", "generated_username")))
+        ]
+        return found[offset:offset + limit], len(found)
+
+    def pending(self, project: Optional[str] = None, limit: Optional[int] = None) -> list[dict]:
+        from registration_store import is_pending
+
+        out = []
+        for r in self._current():
+            if not is_pending(r):
+                continue
+            if project and project not in _project_names(r):
+                continue
+            out.append(r)
+            if limit and len(out) >= limit:
+                break
+        return out
+
+    # ── Cursor ─────────────────────────────────────────────────────────────────
+
+    def _state(self) -> dict:
+        try:
+            state = json.loads(self.cursor_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        return {"offset": 0, "inflight": None, "updates": 0, "pulled": 1, **state}
+
+    def cursor(self) -> tuple[int, Optional[int]]:
+        """(committed offset, end of the in-flight batch or None)."""
+        state = self._state()
+        return state["offset"], state["inflight"]
+
+    def _write_cursor(self, **changes) -> None:
+        state = {**self._state(), **changes}
+        tmp   = self.cursor_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.cursor_path)
+
+    def begin(self, end: int) -> None:
+        self._write_cursor(inflight=end)
+
+    def commit(self, end: int) -> None:
+        self._write_cursor(offset=end, inflight=None)
+
+    def read_updates(self, offset: int, limit: int) -> tuple[list[dict], int]:
+        """
+        Current state of the records changed by up to `limit` update lines
+        after byte `offset`, and the offset just past the last line read.
+        """
+        mirrored  = self.cursor()[0]
+        names     = []
+        read, pos = 0, offset
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            while read < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    name = json.loads(line).get("_update")
+                except json.JSONDecodeError:
+                    name = None
+                if name is None and pos >= mirrored:
+                    break                        # a record the mirror has not sent yet
+                pos += len(line)
+                if name is not None:
+                    names.append(name)
+                    read += 1
+        if not names:
+            return [], pos
+        current = {r.get("generated_username"): r for r in self._current()}
+        return [current[n] for n in dict.fromkeys(names) if n in current], pos
+
+    def updates_cursor(self) -> int:
+        return self._state()["updates"]
+
+    def commit_updates(self, end: int) -> None:
+        self._write_cursor(updates=end)
+
+    def pulled_rows(self) -> int:
+        return self._state()["pulled"]
+
+    def restore(self, records: list[dict], pulled: int) -> bool:
+        """
+        Append records that are already in the mirror and move the cursor past
+        them; refused (False) while records of the journal's own are unsent.
+        """
+        with self._file_lock():
+            offset, inflight = self.cursor()
+            if inflight is not None or offset < self.tail():
+                return False
+            self._file.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._write_cursor(offset=self.tail(), pulled=pulled)
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,386 @@
+"""
+Headless load test of the registration flow (demographics → instructions
+→ credentials) with Streamlit's AppTest, against a local INCEpTION stub
+and an in-memory Sheets worksheet.
+
+    python loadtest.py --users 20 --mix "English=3,German=1,English+German=1"
+    python loadtest.py --users 50 --inception-latency 0.1 --save-baseline
+    python loadtest.py --users 50 --inception-latency 0.1        # compare with baseline
+
+Each simulated user runs in its own thread with its own AppTest session,
+inside one process, like the sessions of one app server: they share its
+provisioning queue, registration store, Sheets mirror, rate limiters,
+project cache and INCEpTION client, which is where they contend. AppTest
+installs a process-wide mock Streamlit runtime for each script run and
+removes it afterwards, so two script runs at once break each other: script
+runs take turns on a lock, as they would on a single core, and the time
+spent waiting for it counts towards the page's latency. Everything a run
+starts (queue jobs, INCEpTION calls, Sheets writes) proceeds concurrently.
+The app is rendered once to warm up before the clock starts.
+
+Reports p50/p95/p99 per page and per registration (quiz submitted →
+account result shown), throughput and error rates. --save-baseline writes
+the report to --baseline; otherwise an existing baseline is compared and
+the run exits 1 if a p95 grew by more than --tolerance or the error rate
+went up. A baseline recorded with another CPU count, user count or mix is
+not compared (exit 2): the numbers are CPU-bound and would not mean much.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config
+
+ROOT = Path(__file__).resolve().parent
+logger = logging.getLogger("loadtest")
+
+# Time to: first render of the app; submit demographics and render the
+# instructions; submit the quiz and render credentials; get the account result
+PHASES = ("demographics", "instructions", "credentials", "registration")
+
+
+# ── Stub Sheets backend ────────────────────────────────────────────────────────
+
+class _StubWorksheet:
+    """The few gspread Worksheet calls the app makes, kept in memory."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rows: list[list] = []
+        self._lock   = threading.Lock()
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def row_values(self, row: int) -> list:
+        self._wait()
+        with self._lock:
+            return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def col_values(self, col: int) -> list:
+        self._wait()
+        with self._lock:
+            return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    col_count = 26
+
+    def add_cols(self, cols: int) -> None:
+        self.col_count += cols
+
+    def update(self, values: list[list], range_name: str) -> None:
+        from gspread.utils import a1_to_rowcol
+
+        self._wait()
+        row, col = a1_to_rowcol(range_name)
+        with self._lock:
+            while len(self.rows) < row + len(values) - 1:
+                self.rows.append([])
+            for r, line in enumerate(values, start=row - 1):
+                cells = self.rows[r] + [""] * max(0, col - 1 + len(line) - len(self.rows[r]))
+                cells[col - 1:col - 1 + len(line)] = [str(v) for v in line]
+                self.rows[r] = cells
+
+    def batch_update(self, data: list[dict]) -> None:
+        for item in data:
+            self.update(item["values"], item["range"])
+
+    def append_row(self, values: list) -> None:
+        self.append_rows([values])
+
+    def append_rows(self, rows: list[list]) -> None:
+        self._wait()
+        with self._lock:
+            self.rows.extend([str(v) for v in r] for r in rows)
+
+    def batch_get(self, ranges: list[str]) -> list[list[list]]:
+        # Only the shapes SheetsConnection.rows_after asks for: "1:1" and "A<start>:ZZ"
+        self._wait()
+        with self._lock:
+            out = []
+            for r in ranges:
+                start = int(r.split(":")[0].lstrip("A") or 1)
+                out.append(self.rows[:1] if r == "1:1" else self.rows[start - 1:])
+            return out
+
+
+def _install_stub_sheets(latency: float) -> _StubWorksheet:
+    import sheets
+
+    worksheet = _StubWorksheet(latency)
+
+    class StubConnection(sheets.SheetsConnection):
+        def _open(self) -> None:
+            self._sheet  = worksheet
+            self._header = None
+
+    sheets._connection = StubConnection()
+    return worksheet
+
+
+# ── One simulated user ─────────────────────────────────────────────────────────
+
+def _parse_mix(value: str) -> list[tuple[list[str], float]]:
+    """"English=3,German+Czech=1" → [(["English"], 3.0), (["German", "Czech"], 1.0)]"""
+    mix = []
+    for part in value.split(","):
+        langs, _, weight = part.partition("=")
+        names = [n.strip() for n in langs.split("+")]
+        unknown = [n for n in names if n not in config.LANGUAGES]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown language(s): {', '.join(unknown)}")
+        mix.append((names, float(weight or 1)))
+    return mix
+
+
+def _button(at, label: str):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"no button {label!r} on page {at.session_state['page']}")
+
+
+# AppTest installs a process-wide mock runtime for each script run and removes
+# it afterwards, so two runs at once break each other; script runs take turns
+_script_lock = threading.Lock()
+
+
+def _run(at) -> None:
+    with _script_lock:
+        at.run()
+
+
+class UserResult:
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+        self.error: str | None = None
+
+
+def _simulate(languages: list[str], timeout: float) -> UserResult:
+    from streamlit.testing.v1 import AppTest
+
+    from setups import load_setup
+
+    result = UserResult()
+    at     = AppTest.from_file(str(ROOT / "streamlit_app.py"), default_timeout=timeout)
+
+    def step(name: str, action) -> None:
+        start = time.perf_counter()
+        action()
+        result.timings[name] = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    try:
+        step("demographics", lambda: _run(at))
+
+        at.multiselect[0].set_value(languages)
+        at.selectbox[0].set_value(config.NATIONALITIES[0])
+        at.selectbox[1].set_value(config.EDUCATION_LEVELS[0])
+        at.selectbox[2].set_value(config.NATIVE_LANGUAGES[0])
+        at.checkbox[0].check()
+        _button(at, "Next: Instructions & Quiz").click()
+        step("instructions", lambda: _run(at))
+        if at.session_state["page"] != 2:
+            raise RuntimeError("demographics form was rejected")
+
+        # The quiz uses the first chosen language that has a setup
+        code = next(c for c in (config.LANGUAGES[n][0] for n in languages) if load_setup(c))
+        cc = load_setup(code)["example_annotations"]["comprehension_check"]
+        for q in cc["questions"]:
+            answer = next(o for o in q["options"] if o[:1] == q["correct_answer"])
+            at.radio(key=f"check_{code}_{q['id']}").set_value(answer)
+        submitted = time.perf_counter()
+        _button(at, "Submit & Continue").click()
+        step("credentials", lambda: _run(at))
+        if at.session_state["page"] != 3:
+            raise RuntimeError("comprehension check was not passed")
+
+        # The page polls with a run_every fragment; AppTest has no timer, so rerun
+        while at.session_state["credentials"]["result"] is None:
+            if time.perf_counter() - submitted > timeout:
+                raise TimeoutError("no provisioning result")
+            time.sleep(0.1)
+            _run(at)
+        result.timings["registration"] = time.perf_counter() - submitted
+
+        outcome = at.session_state["credentials"]["result"]
+        if outcome.get("timed_out"):
+            result.error = "timed_out"
+        elif not outcome["user_ok"]:
+            result.error = "account_failed"
+    except TimeoutError:
+        result.error = "timeout"
+    except Exception as exc:
+        logger.debug("User failed: %s", exc)
+        result.error = type(exc).__name__
+    return result
+
+
+# ── Setup ──────────────────────────────────────────────────────────────────────
+
+def _configure(workdir: str, queue_workers: int) -> None:
+    """Point the app at `workdir`; must run before any app module reads config."""
+    config.QUEUE_DB_PATH        = os.path.join(workdir, "queue.db")
+    config.REGISTRATION_DB_PATH = os.path.join(workdir, "registrations.db")
+    config.JOURNAL_PATH         = os.path.join(workdir, "registrations.jsonl")
+    config.QUEUE_WORKERS        = queue_workers
+    config.METRICS_PORT         = None
+    config.LANGUAGE_JSON_FILES  = {c: str(ROOT / p) for c, p in config.LANGUAGE_JSON_FILES.items()}
+    config.SETUP_BUNDLE_PATH    = str(ROOT / config.SETUP_BUNDLE_PATH)
+
+
+# ── Report ─────────────────────────────────────────────────────────────────────
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    if len(samples) == 1:
+        return {"p50": samples[0], "p95": samples[0], "p99": samples[0]}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": statistics.median(samples), "p95": cuts[94], "p99": cuts[98]}
+
+
+def _report(results: list[UserResult], wall: float, args) -> dict:
+    errors = Counter(r.error for r in results if r.error)
+    done   = sum(1 for r in results if "registration" in r.timings)
+    return {
+        "users":       len(results),
+        "mix":         args.mix,
+        "cpus":        os.cpu_count(),           # baselines only compare on like hardware
+        "wall_s":      round(wall, 3),
+        "throughput":  round(done / wall, 3) if wall else 0.0,
+        "error_rate":  round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        "errors":      dict(errors),
+        "latency_s":   {
+            phase: {k: round(v, 4) for k, v in _percentiles(
+                [r.timings[phase] for r in results if phase in r.timings]
+            ).items()}
+            for phase in PHASES
+        },
+    }
+
+
+def _print(report: dict) -> None:
+    print(f"{report['users']} users, {report['wall_s']:.1f} s wall, "
+          f"{report['throughput']:.2f} registrations/s, "
+          f"error rate {report['error_rate']:.1%} {report['errors'] or ''}")
+    print(f"{'phase':<14}{'p50':>9}{'p95':>9}{'p99':>9}   (seconds)")
+    for phase, p in report["latency_s"].items():
+        if p:
+            print(f"{phase:<14}{p['p50']:>9.3f}{p['p95']:>9.3f}{p['p99']:>9.3f}")
+
+
+# Report fields that have to match for a baseline comparison to mean anything
+COMPARABLE = ("cpus", "users", "mix")
+
+
+def _incomparable(report: dict, baseline: dict) -> list[str]:
+    return [
+        f"{key} {baseline.get(key)!r} → {report[key]!r}"
+        for key in COMPARABLE if baseline.get(key) != report[key]
+    ]
+
+
+def _regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for phase, p in report["latency_s"].items():
+        before = baseline.get("latency_s", {}).get(phase, {}).get("p95")
+        if before and p and p["p95"] > before * (1 + tolerance):
+            found.append(f"{phase} p95 {before:.3f}s → {p['p95']:.3f}s")
+    if report["error_rate"] > baseline.get("error_rate", 0.0) + 0.01:
+        found.append(f"error rate {baseline.get('error_rate', 0.0):.1%} → {report['error_rate']:.1%}")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=20, help="simultaneous simulated users")
+    parser.add_argument("--mix", default="English=1",
+                        help='weighted language choices, e.g. "English=3,German+Czech=1"')
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which users start")
+    parser.add_argument("--inception-latency", type=float, default=0.02)
+    parser.add_argument("--inception-error-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-latency", type=float, default=0.2)
+    parser.add_argument("--queue-workers", type=int, default=config.QUEUE_WORKERS)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per page and per registration")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default="loadtest_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 growth over the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    try:
+        mix = _parse_mix(args.mix)
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    _configure(tempfile.mkdtemp(prefix="loadtest-"), args.queue_workers)
+    worksheet = _install_stub_sheets(args.sheets_latency)
+
+    from streamlit.testing.v1 import AppTest
+
+    from inception_stub import StubServer
+
+    rng     = random.Random(args.seed)
+    choices = rng.choices([m[0] for m in mix], weights=[m[1] for m in mix], k=args.users)
+
+    with StubServer(latency=args.inception_latency, error_rate=args.inception_error_rate,
+                    seed=args.seed) as base_url:
+        os.environ["INCEPTION_URL"] = base_url
+        # One throwaway render warms imports and caches, as on a server that is already up
+        _run(AppTest.from_file(str(ROOT / "streamlit_app.py"), default_timeout=args.timeout))
+
+        def run_user(i: int) -> UserResult:
+            if args.ramp:
+                time.sleep(args.ramp * i / args.users)
+            return _simulate(choices[i], args.timeout)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            results = list(pool.map(run_user, range(args.users)))
+        wall = time.perf_counter() - start
+
+    from sheets import get_writer
+
+    while get_writer().flush():                  # drain the mirror before counting rows
+        pass
+    report = _report(results, wall, args)
+    report["sheets_rows"] = max(0, len(worksheet.rows) - 1)
+    _print(report)
+
+    baseline = Path(args.baseline)
+    if args.save_baseline:
+        baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nBaseline saved to {baseline}.")
+        return 0
+    if baseline.exists():
+        previous = json.loads(baseline.read_text(encoding="utf-8"))
+        mismatch = _incomparable(report, previous)
+        if mismatch:
+            print(f"\nNot compared with {baseline}: " + "; ".join(mismatch)
+                  + ". Record a baseline for this setup with --save-baseline.")
+            return 2
+        regressions = _regressions(report, previous, args.tolerance)
+        if regressions:
+            print("\nREGRESSION: " + "; ".join(regressions))
+            return 1
+        print("\nNo regression against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
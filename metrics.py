@@ -0,0 +1,293 @@
+"""
+In-process latency histograms and counters, exported in the Prometheus
+text format on a local port (METRICS_PORT) and/or to a file (METRICS_FILE).
+
+    with metrics.context(page=2, language="de"):
+        with metrics.timed("sidebar"):
+            render_sidebar()
+
+Labels set with `context()` are attached to everything observed inside
+it, including work handed to threads with asyncio.to_thread (they are
+context variables). Observing costs a perf_counter, a bisect and a dict
+update under a lock; nothing is formatted until the exporter is read.
+"""
+
+import abc
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+
+from config import METRICS_FILE, METRICS_FILE_INTERVAL, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Attached to every series; filled from context() or left empty
+CONTEXT_LABELS = ("page", "language")
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("metrics_context", default={})
+
+
+@contextmanager
+def context(**labels):
+    """Attach CONTEXT_LABELS values (e.g. page, language) to observations inside."""
+    token = _context.set({**_context.get(), **{k: str(v) for k, v in labels.items()}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames) + CONTEXT_LABELS
+        self._lock      = threading.Lock()
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        ctx = _context.get()
+        return tuple(str(labels[n]) if n in labels else ctx.get(n, "") for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in sorted(self._series.items())]
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    @abc.abstractmethod
+    def _render_series(self, key: tuple[str, ...], value: list) -> list[str]:
+        """Exposition lines for one label set."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0])
+            series[0] += amount
+
+    def _render_series(self, key, value) -> list[str]:
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {value[0]:g}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = self._key(labels)
+        i   = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # one slot per bucket plus +Inf, then sum and count
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[i]  += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def _render_series(self, key, value) -> list[str]:
+        lines, running = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), value):
+            running += n
+            le     = "+Inf" if bound == float("inf") else f"{bound:g}"
+            labels = _format_labels(self.labelnames, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {running}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {value[-2]:.6f}")
+        lines.append(f"{self.name}_count{labels} {value[-1]}")
+        return lines
+
+
+_registry: dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: tuple[str, ...] = (),
+              buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+# ── Metrics used by the app ────────────────────────────────────────────────────
+
+RERUNS = counter(
+    "app_reruns", "Script runs, by page.",
+)
+RENDER_SECONDS = histogram(
+    "app_render_seconds", "Time spent in one rerun phase (css, header, sidebar, a view, ...).",
+    ("phase",),
+)
+INCEPTION_SECONDS = histogram(
+    "inception_call_seconds", "InceptionClient calls, by method and outcome.",
+    ("method", "outcome"),
+)
+SAVE_SECONDS = histogram(
+    "registration_save_seconds", "save_registration calls, by outcome.",
+    ("outcome",),
+)
+SHEETS_API_CALLS = counter(
+    "sheets_api_calls", "Google Sheets API round-trips, by kind (open, values.get, ...).",
+    ("kind",),
+)
+
+
+class timed:
+    """Time a block or function into RENDER_SECONDS{phase=...}."""
+
+    def __init__(self, phase: str, metric: Histogram = RENDER_SECONDS):
+        self.phase  = phase
+        self.metric = metric
+
+    def __call__(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(self.phase, self.metric):     # one timer per call, safe across threads
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.metric.observe(time.perf_counter() - self._start, phase=self.phase)
+        return False
+
+
+def timed_call(metric: Histogram, ok: Callable[[object], bool] = bool, **labels) -> Callable:
+    """
+    Decorator recording each call's duration, with outcome "ok" or "fail"
+    depending on `ok(result)`, or "error" if the call raised.
+    """
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start   = time.perf_counter()
+            outcome = "error"
+            try:
+                result  = fn(*args, **kwargs)
+                outcome = "ok" if ok(result) else "fail"
+                return result
+            finally:
+                metric.observe(time.perf_counter() - start, outcome=outcome, **labels)
+        return wrapper
+    return decorate
+
+
+# ── Export ─────────────────────────────────────────────────────────────────────
+
+def render_text() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: list[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path: str | Path) -> None:
+    # Write-then-rename, so a scraper (node_exporter textfile collector) never
+    # reads half a file
+    path = Path(path)
+    tmp  = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(render_text(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args) -> None:
+        logger.debug("metrics: " + fmt, *args)
+
+
+_exporter_started = False
+
+
+def start_exporter(
+    port: Optional[int] = METRICS_PORT,
+    path: Optional[str] = METRICS_FILE,
+    interval: float = METRICS_FILE_INTERVAL,
+) -> None:
+    """Start the HTTP endpoint and/or file writer once per process."""
+    global _exporter_started
+    with _registry_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        except OSError as exc:
+            # e.g. a second app process on the same host
+            logger.warning("Metrics port %d unavailable (%s); HTTP export off.", port, exc)
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http",
+                             daemon=True).start()
+            logger.info("Metrics on http://127.0.0.1:%d/metrics", port)
+
+    if path:
+        def _write_loop() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    write_file(path)
+                except OSError as exc:
+                    logger.warning("Could not write metrics to %s (%s).", path, exc)
+
+        threading.Thread(target=_write_loop, name="metrics-file", daemon=True).start()
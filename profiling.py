@@ -0,0 +1,138 @@
+"""
+On-demand cProfile capture of one browser session's reruns.
+
+Staff arm it by opening the app with `?profile=<code>`, where the code is
+either the PROFILE_TOKEN secret or a one-time code made on the admin page.
+The next PROFILE_RUNS reruns of that session are profiled and saved as
+.pstats files in PROFILE_DIR (oldest deleted beyond PROFILE_DIR_MAX_BYTES);
+open them with `python -m pstats`, snakeviz, or flameprof for a flamegraph.
+
+cProfile only traces the thread it is enabled on, and every session's
+script runs in its own thread, so other sessions are not slowed down.
+When a session is not armed the cost is one session_state lookup.
+"""
+
+import cProfile
+import hmac
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import streamlit as st
+
+from config import PROFILE_DIR, PROFILE_DIR_MAX_BYTES, PROFILE_RUNS
+from utils import get_secret
+
+logger = logging.getLogger(__name__)
+
+_RUNS_LEFT = "_profile_runs_left"
+
+# One-time codes from the admin page → reruns to profile
+_codes: dict[str, int] = {}
+_codes_lock = threading.Lock()
+
+
+def create_code(runs: int = PROFILE_RUNS) -> str:
+    """One-time `?profile=` code that arms `runs` reruns of whoever opens it."""
+    code = secrets.token_urlsafe(12)
+    with _codes_lock:
+        _codes[code] = runs
+    return code
+
+
+def _redeem(value: str) -> Optional[int]:
+    with _codes_lock:
+        runs = _codes.pop(value, None)
+    if runs is not None:
+        return runs
+    token = get_secret("PROFILE_TOKEN")
+    if token and hmac.compare_digest(value, token):
+        return PROFILE_RUNS
+    return None
+
+
+def arm_from_query() -> None:
+    """Arm this session if the URL carries a valid `profile` code, then drop it from the URL."""
+    value = st.query_params.get("profile")
+    if not value:
+        return
+    del st.query_params["profile"]
+    runs = _redeem(value)
+    if runs:
+        st.session_state[_RUNS_LEFT] = runs
+        logger.info("Profiling the next %d rerun(s) of session %s.", runs, _session_id())
+    else:
+        logger.warning("Ignoring invalid profile code.")
+
+
+def _session_id() -> str:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else "nosession"
+    except ImportError:
+        return "nosession"
+
+
+@contextmanager
+def profiled(label: str):
+    """Profile the block if this session is armed, and count the rerun against it."""
+    runs = st.session_state.get(_RUNS_LEFT, 0)
+    if not runs:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as exc:                    # another profiler owns this thread
+        logger.warning("Profiling skipped (%s).", exc)
+        profiler = None
+    try:
+        yield
+    finally:
+        # st.rerun() and st.stop() leave through here as exceptions, too
+        if profiler is not None:
+            profiler.disable()
+            st.session_state[_RUNS_LEFT] = runs - 1
+            _save(profiler, f"{label}_{runs}")
+
+
+def _save(profiler: cProfile.Profile, label: str) -> None:
+    out = Path(PROFILE_DIR)
+    try:
+        out.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{_session_id()[:8]}_{label}.pstats"
+        profiler.dump_stats(str(out / name))
+        _enforce_limit(out)
+    except OSError as exc:
+        logger.warning("Could not save profile (%s).", exc)
+
+
+def _enforce_limit(out: Path) -> None:
+    files = sorted(out.glob("*.pstats"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    while files and total > PROFILE_DIR_MAX_BYTES:
+        oldest = files.pop(0)
+        total -= oldest.stat().st_size
+        oldest.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[Path]:
+    """Saved captures, newest first."""
+    out = Path(PROFILE_DIR)
+    if not out.is_dir():
+        return []
+    return sorted(out.glob("*.pstats"), key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def clear_profiles() -> int:
+    files = list_profiles()
+    for p in files:
+        p.unlink(missing_ok=True)
+    return len(files)
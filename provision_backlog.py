@@ -0,0 +1,326 @@
+"""
+Create INCEpTION accounts for registrations that were saved while the
+platform was unreachable (rows with account_created = False), and finish
+project assignments that ran out of time (rows with pending_steps).
+
+    python provision_backlog.py --workers 8 --rate 10         # local registration store
+    python provision_backlog.py --source sheets
+    python provision_backlog.py --source csv --csv registrations.csv
+
+Each account gets a fresh password; usernames, emails and passwords are
+appended to --credentials-out so the study admin can send them out.
+Finished rows are recorded in --checkpoint as they complete, so a crashed
+run can simply be started again and will skip work that is already done.
+A username INCEpTION already has (HTTP 409) is recorded as a conflict and
+left for an admin instead of being retried on every run.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Protocol, Union
+
+from admission import TokenBucket
+from config import LANGUAGES
+from inception_client import InceptionClient, UserExists
+from sheets import get_connection
+from utils import CSV_FALLBACK, get_secret
+
+logger = logging.getLogger("provision_backlog")
+
+# Columns written back to the source for every processed row
+RESULT_FIELDS = ("account_created", "pending_steps")
+
+
+def _is_pending(value) -> bool:
+    return str(value).strip().lower() in ("false", "0", "")
+
+
+def _needs_work(record: dict) -> bool:
+    return _is_pending(record.get("account_created")) or bool(record.get("pending_steps"))
+
+
+# ── Registration sources ───────────────────────────────────────────────────────
+
+# Where a row lives in its source: sheet row number, CSV row index or username
+RowKey = Union[int, str]
+
+
+class Source(Protocol):
+    def pending(self) -> list[tuple[RowKey, dict]]: ...
+    def write_results(self, results: list[tuple[RowKey, dict]]) -> None: ...
+
+
+class SheetSource:
+    """
+    Pending rows from the Google Sheet; results written with one batch_update.
+
+    The local registration store gets the same results, so the app (which
+    reads the store) does not keep showing rows the Sheet says are done.
+    """
+
+    def __init__(self):
+        from registration_store import get_store
+
+        self._connection = get_connection()
+        self._store      = get_store()
+        # Sheets created before pending_steps existed get the column added here
+        self._header     = self._connection.ensure_header(list(RESULT_FIELDS))
+
+    def pending(self) -> list[tuple[int, dict]]:
+        records = self._connection.call("values.get", lambda s: s.get_all_records())
+        return [
+            (i + 2, r) for i, r in enumerate(records)        # row 1 is the header
+            if _needs_work(r)
+        ]
+
+    def write_results(self, results: list[tuple[int, dict]]) -> None:
+        from gspread.utils import rowcol_to_a1
+
+        updates = []
+        for field in RESULT_FIELDS:
+            col = self._header.index(field) + 1
+            updates += [
+                {"range": rowcol_to_a1(row, col), "values": [[outcome[field]]]}
+                for row, outcome in results
+            ]
+        if updates:
+            self._connection.call("values.batchUpdate", lambda s: s.batch_update(updates))
+        for _, outcome in results:
+            self._store.update(outcome["username"], {f: outcome[f] for f in RESULT_FIELDS})
+
+
+class StoreSource:
+    """Pending rows from the local registration store, found through its indexes."""
+
+    def __init__(self):
+        from registration_store import get_store
+
+        self._store = get_store()
+
+    def pending(self) -> list[tuple[str, dict]]:
+        return [(r["generated_username"], r) for r in self._store.pending()]
+
+    def write_results(self, results: list[tuple[str, dict]]) -> None:
+        for username, outcome in results:
+            self._store.update(username, {f: outcome[f] for f in RESULT_FIELDS})
+
+
+class CsvSource:
+    """Pending rows from the local CSV fallback; results written by atomic rewrite."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        with path.open(newline="", encoding="utf-8") as f:
+            reader      = csv.DictReader(f)
+            self._field = reader.fieldnames or []
+            self._rows  = list(reader)
+
+    def pending(self) -> list[tuple[int, dict]]:
+        return [
+            (i, r) for i, r in enumerate(self._rows)
+            if _needs_work(r)
+        ]
+
+    def write_results(self, results: list[tuple[int, dict]]) -> None:
+        for row, outcome in results:
+            for field in RESULT_FIELDS:
+                if field in self._field:
+                    self._rows[row][field] = outcome[field]
+        tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self._field)
+            writer.writeheader()
+            writer.writerows(self._rows)
+        os.replace(tmp, self._path)
+
+
+# ── Checkpoint ─────────────────────────────────────────────────────────────────
+
+def _load_checkpoint(path: Path) -> dict[str, dict]:
+    """Latest outcome per username from earlier runs."""
+    done: dict[str, dict] = {}
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue                    # torn last line from a crash
+                done[entry["username"]] = entry
+    return done
+
+
+def _finished(entry: dict) -> bool:
+    # A conflict needs an admin; running it again would only hit the same 409
+    return bool(entry.get("conflict")) or (bool(entry.get("account_created")) and not entry.get("pending_steps"))
+
+
+def _append_line(f, line: str) -> None:
+    f.write(line + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# ── Provisioning ───────────────────────────────────────────────────────────────
+
+def _provision(client: InceptionClient, record: dict) -> dict:
+    username = record["generated_username"]
+    password = ""
+    conflict = False
+    steps    = [s for s in str(record.get("pending_steps") or "").split(";") if s]
+
+    if _is_pending(record.get("account_created")):
+        projects = [
+            LANGUAGES[name.strip()][1]
+            for name in str(record.get("languages", "")).split(",")
+            if name.strip() in LANGUAGES
+        ]
+        password = secrets.token_urlsafe(12)
+        try:
+            user_ok = client.create_user(username, password, record.get("email") or "")
+        except UserExists:
+            # Either someone else's account or one the app created without
+            # recording it; the password is unknown either way
+            logger.warning("User '%s' already exists — needs an admin.", username)
+            user_ok  = False
+            conflict = True
+    else:
+        # Account exists; only the memberships cut off by the deadline remain
+        projects = [s.split(":", 1)[1] for s in steps if s.startswith("project:")]
+        user_ok  = True
+
+    assigned: dict[str, bool] = {}
+    if user_ok:
+        for project_name in projects:
+            assigned[project_name] = client.add_user_to_project(username, project_name)
+
+    still_pending = [] if user_ok else ["create_user"]
+    still_pending += [f"project:{p}" for p in projects if not assigned.get(p)]
+    return {
+        "username":        username,
+        "email":           record.get("email") or "",
+        "password":        password if user_ok else "",
+        "account_created": user_ok,
+        "pending_steps":   ";".join(still_pending),
+        "conflict":        conflict,
+        "projects":        assigned,
+    }
+
+
+def run(args: argparse.Namespace) -> int:
+    source: Source
+    if args.source == "sheets":
+        source = SheetSource()
+    elif args.source == "store":
+        source = StoreSource()
+    else:
+        source = CsvSource(Path(args.csv))
+    client = InceptionClient(
+        base_url=get_secret("INCEPTION_URL", "http://localhost:8080"),
+        username=get_secret("INCEPTION_ADMIN_USER", "admin"),
+        password=get_secret("INCEPTION_ADMIN_PASSWORD", "admin"),
+        pool_size=args.workers,
+        # Own bucket: --rate, not the app's SERVICE_RATES["inception"], sets the pace
+        limiter=TokenBucket(args.rate, burst=args.workers),
+    )
+    if not client.ping():
+        logger.error("INCEpTION is not reachable — nothing to do.")
+        return 1
+
+    checkpoint = Path(args.checkpoint)
+    previous   = _load_checkpoint(checkpoint)
+    done       = {u: e for u, e in previous.items() if _finished(e)}
+    pending    = [(row, r) for row, r in source.pending() if r.get("generated_username")]
+
+    # Rows finished by an earlier run whose result never reached the source
+    results: list[tuple[RowKey, dict]] = [
+        (row, done[r["generated_username"]])
+        for row, r in pending if r["generated_username"] in done
+    ]
+    todo = [
+        # An earlier run may have created the account but not every membership
+        (row, {**r, **{f: previous[u][f] for f in RESULT_FIELDS}} if u in previous else r)
+        for row, r in pending
+        if (u := r["generated_username"]) not in done
+    ]
+    logger.info("%d pending rows, %d already in checkpoint.", len(pending), len(results))
+
+    created = failed = conflicts = 0
+    started = time.monotonic()
+
+    creds_path = Path(args.credentials_out)
+    new_file   = not creds_path.exists()
+    with creds_path.open("a", newline="", encoding="utf-8") as creds_f, \
+         checkpoint.open("a", encoding="utf-8") as ckpt_f, \
+         ThreadPoolExecutor(max_workers=args.workers) as pool:
+        creds_writer = csv.writer(creds_f)
+        if new_file:
+            creds_writer.writerow(["username", "email", "password", "projects"])
+
+        futures = {pool.submit(_provision, client, r): row for row, r in todo}
+        for future in as_completed(futures):
+            outcome = future.result()
+            if outcome["account_created"] and not outcome["pending_steps"]:
+                created += 1
+            elif outcome["conflict"]:
+                conflicts += 1
+            else:
+                failed += 1
+            if outcome["password"]:
+                # Credentials first: a crash after this line re-creates nothing.
+                creds_writer.writerow([
+                    outcome["username"], outcome["email"], outcome["password"],
+                    " ".join(p for p, ok in outcome["projects"].items() if ok),
+                ])
+                creds_f.flush()
+            outcome = {k: v for k, v in outcome.items() if k != "password"}
+            _append_line(ckpt_f, json.dumps(outcome))
+            results.append((futures[future], outcome))
+
+            if len(results) >= args.batch_size:
+                source.write_results(results)
+                results.clear()
+                elapsed = time.monotonic() - started
+                logger.info(
+                    "%d/%d done (%.1f rows/s).",
+                    created + failed + conflicts, len(todo),
+                    (created + failed + conflicts) / elapsed,
+                )
+
+    source.write_results(results)
+    logger.info(
+        "Finished: %d completed, %d still pending, %d usernames taken (not retried).",
+        created, failed, conflicts,
+    )
+    return 0 if failed == conflicts == 0 else 2
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--source", choices=["store", "sheets", "csv"], default="store",
+                        help="local registration store, the Google Sheet, or a legacy CSV")
+    parser.add_argument("--csv", default=str(CSV_FALLBACK),
+                        help="CSV file to read when --source=csv")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="max INCEpTION requests per second (0 = unlimited)")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="results written back to the source per batch")
+    parser.add_argument("--checkpoint", default=".provision_checkpoint.jsonl")
+    parser.add_argument("--credentials-out", default="provisioned_credentials.csv")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import logging
+
+import streamlit as st
+
+from config import (
+    INCEPTION_MAX_CONCURRENCY,
+    LANGUAGES,
+    QUEUE_DB_PATH,
+    QUEUE_MAX_ATTEMPTS,
+    QUEUE_RETRY_BACKOFF,
+    QUEUE_WORKERS,
+    REGISTRATION_BUDGET,
+)
+from deadline import Deadline
+from job_queue import JobQueue, RetryableError
+from metrics import context as metrics_context
+from utils import get_inception_client, save_registration
+
+logger = logging.getLogger(__name__)
+
+
+def _registration_record(
+    payload: dict, reachable: bool, user_ok: bool, pending_steps: list[str]
+) -> dict:
+    demo = payload["demographics"]
+    return {
+        "languages":          ", ".join(demo.get("languages", [])),
+        "age":                demo.get("age"),
+        "nationality":        demo.get("nationality"),
+        "native_language":    demo.get("native_language"),
+        "education":          demo.get("education"),
+        "email":              demo.get("email"),
+        "registered_at":      demo.get("registered_at"),
+        "generated_username": payload["username"],
+        "api_reachable":      reachable,
+        "account_created":    user_ok,
+        "pending_steps":      ";".join(pending_steps),
+    }
+
+
+def provision(payload: dict, final_attempt: bool) -> dict:
+    """
+    Create the INCEpTION account and memberships for one registration, then
+    queue the record for Sheets. While attempts and budget remain, an unreachable
+    platform or a failed user creation is retried; otherwise the row is
+    saved for manual setup. Steps cut off by the registration deadline are
+    listed in `pending_steps` so provision_backlog.py can finish them.
+    """
+    demo       = payload["demographics"]
+    lang_names = demo.get("languages", [])
+    language   = LANGUAGES[lang_names[0]][0] if lang_names else ""
+    with metrics_context(page=3, language=language):
+        result = _provision(payload, final_attempt)
+    _forget_password(payload)
+    return result
+
+
+def _forget_password(payload: dict) -> None:
+    # The job is finishing; a refreshed credentials page no longer needs it
+    from idempotency import get_index
+
+    try:
+        get_index().forget_password(payload["username"])
+    except Exception as exc:
+        logger.warning("Could not clear the stored password of '%s': %s", payload["username"], exc)
+
+
+def _save(payload: dict, record: dict) -> None:
+    """Store the record; a retry of a failed registration completes the row saved for it."""
+    from registration_store import get_store
+
+    store = get_store()
+    if payload.get("retry_of") and store.find(username=payload["username"]):
+        store.update(payload["username"], record)
+    else:
+        save_registration(record)
+
+
+def _create_user(client, payload: dict, deadline: Deadline) -> tuple[bool, bool]:
+    """(account exists, username belongs to someone else)."""
+    from inception_client import UserExists
+
+    demo = payload["demographics"]
+    try:
+        return client.create_user(
+            payload["username"], payload["password"], demo.get("email", ""), deadline
+        ), False
+    except UserExists:
+        if payload.get("attempt", 1) > 1:
+            # An earlier attempt created the account, then failed or crashed
+            # before the job could record it
+            logger.info("User '%s' already exists from an earlier attempt.", payload["username"])
+            return True, False
+        # Taken on the first try: the same name would be refused on every retry
+        logger.warning("Username '%s' is taken — manual setup needed.", payload["username"])
+        return False, True
+
+
+def _provision(payload: dict, final_attempt: bool) -> dict:
+    from inception_client import add_user_to_projects
+
+    client   = get_inception_client()
+    demo     = payload["demographics"]
+    username = payload["username"]
+    # The budget starts when a worker first picks the job up, not while it
+    # waits in line (see JobQueue.wait_estimate)
+    deadline = Deadline(payload["started_at"] + REGISTRATION_BUDGET)
+
+    lang_names    = demo.get("languages", [])
+    project_names = [LANGUAGES[name][1] for name in lang_names]
+
+    reachable       = client.ping(deadline)
+    user_ok         = False
+    taken           = False
+    project_results = []
+    pending_steps   = []
+
+    if reachable:
+        user_ok, taken = _create_user(client, payload, deadline)
+    if not user_ok and not taken and not (final_attempt or deadline.expired):
+        raise RetryableError("INCEpTION unreachable" if not reachable else "user creation failed")
+
+    if user_ok:
+        results = add_user_to_projects(
+            client, username, project_names, INCEPTION_MAX_CONCURRENCY, deadline
+        )
+        project_results = list(zip(lang_names, project_names, results))
+        if deadline.expired:
+            pending_steps = [f"project:{p}" for p, ok in zip(project_names, results) if not ok]
+    elif deadline.expired:
+        pending_steps = ["create_user"] + [f"project:{p}" for p in project_names]
+
+    _save(payload, _registration_record(payload, reachable, user_ok, pending_steps))
+    return {
+        "reachable":       reachable,
+        "user_ok":         user_ok,
+        "project_results": project_results,
+        "pending_steps":   pending_steps,
+    }
+
+
+def _save_dead_letter(payload: dict, error: str) -> None:
+    # The handler crashed on its last attempt; make sure the row still lands
+    # somewhere an admin will find it.
+    _save(payload, _registration_record(payload, False, False, ["create_user"]))
+    _forget_password(payload)
+
+
+@st.cache_resource(show_spinner=False)
+def get_provisioning_queue() -> JobQueue:
+    """Process-wide queue with its worker pool already running."""
+    queue = JobQueue(
+        QUEUE_DB_PATH,
+        provision,
+        workers=QUEUE_WORKERS,
+        max_attempts=QUEUE_MAX_ATTEMPTS,
+        backoff=QUEUE_RETRY_BACKOFF,
+        on_dead=_save_dead_letter,
+        scrub_keys=("password",),
+    )
+    queue.start()
+    return queue
@@ -0,0 +1,397 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+from config import LANGUAGES, REGISTRATION_DB_PATH, REGISTRATION_STORE
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationStore(Protocol):
+    """
+    Where registration records live. Positions are opaque integers that
+    only grow: byte offsets for the journal, row ids for SQLite. The
+    Sheets mirror reads new records with `read_from` and tracks progress
+    with the cursor methods; it reads records changed by `update` with
+    `read_updates` and tracks those with `updates_cursor`/`commit_updates`.
+    Records copied back from the Sheet go in with `restore`, which moves the
+    mirror cursor past them; `pulled_rows` is the last Sheet row copied.
+    """
+
+    def append(self, record: dict) -> None: ...
+    def read_from(self, offset: int, limit: int, end: Optional[int] = None) -> tuple[list[dict], int]: ...
+    def tail(self) -> int: ...
+    def cursor(self) -> tuple[int, Optional[int]]: ...
+    def begin(self, end: int) -> None: ...
+    def commit(self, end: int) -> None: ...
+
+    def read_updates(self, offset: int, limit: int) -> tuple[list[dict], int]: ...
+    def updates_cursor(self) -> int: ...
+    def commit_updates(self, end: int) -> None: ...
+
+    def pulled_rows(self) -> int: ...
+    def restore(self, records: list[dict], pulled: int) -> bool: ...
+
+    def find(self, email: Optional[str] = None, username: Optional[str] = None) -> list[dict]: ...
+    def pending(self, project: Optional[str] = None, limit: Optional[int] = None) -> list[dict]: ...
+    def count_by(self, column: str) -> dict: ...
+    def search(
+        self, language: Optional[str] = None, status: Optional[str] = None, text: str = "",
+        limit: int = 50, offset: int = 0,
+    ) -> tuple[list[dict], int]: ...
+    def update(self, username: str, fields: dict) -> None: ...
+    def usernames(self) -> set[str]: ...
+
+
+def _created(value) -> bool:
+    return str(value).strip().lower() not in ("false", "0", "", "none")
+
+
+def is_pending(record: dict) -> bool:
+    """No account yet, or steps left over from a cut-off registration."""
+    return not _created(record.get("account_created")) or bool(record.get("pending_steps"))
+
+
+# Values of count_by("status") and search(status=...)
+STATUSES = ("created", "pending")
+
+
+def status(record: dict) -> str:
+    return "pending" if is_pending(record) else "created"
+
+
+def _projects(record: dict) -> list[tuple[str, str]]:
+    names = [n.strip() for n in str(record.get("languages") or "").split(",")]
+    return [(n, LANGUAGES[n][1]) for n in names if n in LANGUAGES]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrations (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    email              TEXT,
+    generated_username TEXT,
+    account_created    INTEGER NOT NULL DEFAULT 0,
+    pending_steps      TEXT    NOT NULL DEFAULT '',
+    registered_at      TEXT,
+    record             TEXT    NOT NULL,
+    updated_seq        INTEGER
+);
+CREATE INDEX IF NOT EXISTS registrations_email    ON registrations (email);
+CREATE INDEX IF NOT EXISTS registrations_username ON registrations (generated_username);
+CREATE INDEX IF NOT EXISTS registrations_account  ON registrations (account_created);
+CREATE INDEX IF NOT EXISTS registrations_pending  ON registrations (id)
+    WHERE account_created = 0 OR pending_steps != '';
+
+CREATE TABLE IF NOT EXISTS registration_languages (
+    registration_id INTEGER NOT NULL REFERENCES registrations (id),
+    language        TEXT    NOT NULL,
+    project         TEXT    NOT NULL,
+    PRIMARY KEY (project, registration_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS registration_languages_lang
+    ON registration_languages (language, registration_id);
+
+CREATE TABLE IF NOT EXISTS mirror_cursor (
+    name     TEXT PRIMARY KEY,
+    offset   INTEGER NOT NULL,
+    inflight INTEGER,
+    updates  INTEGER NOT NULL DEFAULT 0,
+    pulled   INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+# Added after the first release; ALTERed into existing databases
+_COLUMNS = {
+    "registrations": {"updated_seq": "INTEGER"},
+    "mirror_cursor": {"updates": "INTEGER NOT NULL DEFAULT 0", "pulled": "INTEGER NOT NULL DEFAULT 1"},
+}
+_LATE_INDEXES = """
+CREATE INDEX IF NOT EXISTS registrations_updated  ON registrations (updated_seq)
+    WHERE updated_seq IS NOT NULL;
+"""
+
+
+# SQL form of is_pending() on the indexed columns
+_PENDING = "(account_created = 0 OR pending_steps != '')"
+
+
+class SQLiteRegistrationStore:
+    """
+    Registrations in SQLite (WAL mode), one connection per thread.
+
+    Indexed on email, username, account status and language/project, so
+    lookups like "who is still pending for project X" stay fast at 100k+
+    rows. WAL lets readers run while a writer commits, and each append is
+    a single short transaction.
+
+    Every `update` stamps the row with the next `updated_seq`, so the
+    mirror can resend changed rows in order after its updates cursor.
+    """
+
+    def __init__(self, path: str | Path = REGISTRATION_DB_PATH, mirror: str = "sheets"):
+        self.path   = str(path)
+        self.mirror = mirror
+        self._local = threading.local()
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+            for table, columns in _COLUMNS.items():
+                present = {r["name"] for r in db.execute(f"PRAGMA table_info({table})")}
+                for name, decl in columns.items():
+                    if name not in present:
+                        db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            db.executescript(_LATE_INDEXES)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _records(rows: Iterable[sqlite3.Row]) -> list[dict]:
+        return [json.loads(r["record"]) for r in rows]
+
+    # ── Writing ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, record: dict) -> None:
+        cur = db.execute(
+            "INSERT INTO registrations "
+            "(email, generated_username, account_created, pending_steps, registered_at, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                record.get("email") or None,
+                record.get("generated_username"),
+                int(_created(record.get("account_created"))),
+                record.get("pending_steps") or "",
+                record.get("registered_at"),
+                json.dumps(record, default=str),
+            ),
+        )
+        db.executemany(
+            "INSERT OR IGNORE INTO registration_languages VALUES (?, ?, ?)",
+            [(cur.lastrowid, lang, project) for lang, project in _projects(record)],
+        )
+
+    def append(self, record: dict) -> None:
+        with self._db() as db:
+            self._insert(db, record)
+
+    def update(self, username: str, fields: dict) -> None:
+        with self._db() as db:
+            # Read-modify-write under the write lock, so concurrent updates of
+            # one row merge instead of the last one dropping the other's fields
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id, record FROM registrations WHERE generated_username = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (username,),
+            ).fetchone()
+            if row is None:
+                return
+            record = {**json.loads(row["record"]), **fields}
+            db.execute(
+                "UPDATE registrations SET email = ?, account_created = ?, pending_steps = ?, "
+                "registered_at = ?, record = ?, "
+                "updated_seq = (SELECT COALESCE(MAX(updated_seq), 0) + 1 FROM registrations) "
+                "WHERE id = ?",
+                (
+                    record.get("email") or None,
+                    int(_created(record.get("account_created"))),
+                    record.get("pending_steps") or "",
+                    record.get("registered_at"),
+                    json.dumps(record, default=str),
+                    row["id"],
+                ),
+            )
+            if "languages" in fields:
+                # A retried registration may have picked other languages
+                db.execute("DELETE FROM registration_languages WHERE registration_id = ?", (row["id"],))
+                db.executemany(
+                    "INSERT OR IGNORE INTO registration_languages VALUES (?, ?, ?)",
+                    [(row["id"], lang, project) for lang, project in _projects(record)],
+                )
+
+    # ── Queries ────────────────────────────────────────────────────────────────
+
+    def find(self, email: Optional[str] = None, username: Optional[str] = None) -> list[dict]:
+        if username:
+            sql, arg = "SELECT record FROM registrations WHERE generated_username = ?", username
+        elif email:
+            sql, arg = "SELECT record FROM registrations WHERE email = ?", email
+        else:
+            return []
+        return self._records(self._db().execute(sql + " ORDER BY id", (arg,)))
+
+    def usernames(self) -> set[str]:
+        rows = self._db().execute(
+            "SELECT DISTINCT generated_username FROM registrations "
+            "WHERE generated_username IS NOT NULL"
+        )
+        return {r[0] for r in rows}
+
+    def pending(self, project: Optional[str] = None, limit: Optional[int] = None) -> list[dict]:
+        where = "(r.account_created = 0 OR r.pending_steps != '')"
+        if project:
+            sql  = ("SELECT r.record FROM registration_languages l "
+                    "JOIN registrations r ON r.id = l.registration_id "
+                    f"WHERE l.project = ? AND {where} ORDER BY r.id")
+            args: tuple = (project,)
+        else:
+            sql, args = f"SELECT r.record FROM registrations r WHERE {where} ORDER BY r.id", ()
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._records(self._db().execute(sql, args))
+
+    def count_by(self, column: str) -> dict:
+        """Counts per language (column='language'), status ('status') or account_created (0/1)."""
+        db = self._db()
+        if column == "language":
+            rows = db.execute(
+                "SELECT language AS k, COUNT(*) AS n FROM registration_languages GROUP BY language"
+            )
+        elif column == "status":
+            rows = db.execute(
+                f"SELECT CASE WHEN {_PENDING} THEN 'pending' ELSE 'created' END AS k, "
+                "COUNT(*) AS n FROM registrations GROUP BY k"
+            )
+        else:
+            rows = db.execute(
+                "SELECT account_created AS k, COUNT(*) AS n FROM registrations GROUP BY account_created"
+            )
+        return {r["k"]: r["n"] for r in rows}
+
+    def search(
+        self, language: Optional[str] = None, status: Optional[str] = None, text: str = "",
+        limit: int = 50, offset: int = 0,
+    ) -> tuple[list[dict], int]:
+        """One page of matching records, newest first, and the number of matches."""
+        clauses, args = [], []
+        if language:
+            clauses.append(
+                "id IN (SELECT registration_id FROM registration_languages WHERE language = ?)"
+            )
+            args.append(language)
+        if status:
+            clauses.append(_PENDING if status == "pending" else f"NOT {_PENDING}")
+        if text:
+            clauses.append("(email LIKE ? OR generated_username LIKE ?)")
+            args += [f"%{text}%", f"%{text}%"]
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        db    = self._db()
+        total = db.execute(f"SELECT COUNT(*) FROM registrations{where}", args).fetchone()[0]
+        rows  = db.execute(
+            f"SELECT record FROM registrations{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        )
+        return self._records(rows), total
+
+    # ── Mirror feed ────────────────────────────────────────────────────────────
+
+    def read_from(
+        self, offset: int, limit: int, end: Optional[int] = None
+    ) -> tuple[list[dict], int]:
+        rows = self._db().execute(
+            "SELECT id, record FROM registrations WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (offset, end if end is not None else 2**62, limit),
+        ).fetchall()
+        return self._records(rows), rows[-1]["id"] if rows else offset
+
+    def tail(self) -> int:
+        row = self._db().execute("SELECT MAX(id) FROM registrations").fetchone()
+        return row[0] or 0
+
+    def cursor(self) -> tuple[int, Optional[int]]:
+        row = self._db().execute(
+            "SELECT offset, inflight FROM mirror_cursor WHERE name = ?", (self.mirror,)
+        ).fetchone()
+        return (row["offset"], row["inflight"]) if row else (0, None)
+
+    def _write_cursor(self, offset: int, inflight: Optional[int]) -> None:
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO mirror_cursor (name, offset, inflight) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET offset = excluded.offset, "
+                "inflight = excluded.inflight",
+                (self.mirror, offset, inflight),
+            )
+
+    def begin(self, end: int) -> None:
+        offset, _ = self.cursor()
+        self._write_cursor(offset, end)
+
+    def commit(self, end: int) -> None:
+        self._write_cursor(end, None)
+
+    def read_updates(self, offset: int, limit: int) -> tuple[list[dict], int]:
+        """Current state of records updated after `offset`, oldest update first."""
+        rows = self._db().execute(
+            "SELECT updated_seq, record FROM registrations WHERE updated_seq > ? "
+            "ORDER BY updated_seq LIMIT ?",
+            (offset, limit),
+        ).fetchall()
+        return self._records(rows), rows[-1]["updated_seq"] if rows else offset
+
+    def updates_cursor(self) -> int:
+        row = self._db().execute(
+            "SELECT updates FROM mirror_cursor WHERE name = ?", (self.mirror,)
+        ).fetchone()
+        return row["updates"] if row else 0
+
+    def commit_updates(self, end: int) -> None:
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO mirror_cursor (name, offset, updates) VALUES (?, 0, ?) "
+                "ON CONFLICT (name) DO UPDATE SET updates = excluded.updates",
+                (self.mirror, end),
+            )
+
+    def pulled_rows(self) -> int:
+        row = self._db().execute(
+            "SELECT pulled FROM mirror_cursor WHERE name = ?", (self.mirror,)
+        ).fetchone()
+        return row["pulled"] if row else 1
+
+    def restore(self, records: list[dict], pulled: int) -> bool:
+        """
+        Add records that are already in the mirror and move the mirror cursor
+        past them, in one transaction. Refused (False, nothing written) while
+        records of the store's own are still unsent: the cursor would skip them.
+        """
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            offset, inflight = self.cursor()
+            if inflight is not None or offset < self.tail():
+                return False
+            for record in records:
+                self._insert(db, record)
+            db.execute(
+                "INSERT INTO mirror_cursor (name, offset, pulled) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET offset = excluded.offset, pulled = excluded.pulled",
+                (self.mirror, self.tail(), pulled),
+            )
+        return True
+
+
+_store: Optional[RegistrationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> RegistrationStore:
+    """The process-wide store selected by config.REGISTRATION_STORE."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if REGISTRATION_STORE == "journal":
+                from journal import RegistrationJournal
+                _store = RegistrationJournal()
+            else:
+                _store = SQLiteRegistrationStore()
+        return _store
@@ -0,0 +1,204 @@
+import json
+import logging
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+import streamlit as st
+
+from config import LANGUAGE_JSON_FILES, PASS_THRESHOLD, SETUP_BUNDLE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Keys the views read from a setup; lists hold one spec for every item
+SETUP_SCHEMA: dict = {
+    "language": str,
+    "instructions": {
+        "title":    str,
+        "sections": [{"heading": str, "content": str}],
+    },
+    "example_annotations": {
+        "instructions": str,
+        "worked_examples": [{
+            "text": str,
+            "analysis": {
+                "actors":  [{"mention": str, "role_explanation": str}],
+                "actions": [{"word": str, "category": str, "explanation": str}],
+            },
+        }],
+        "practice_questions": [{
+            "id": str, "text": str, "task": str, "hint": str, "sample_answer": dict,
+        }],
+        "comprehension_check": {
+            "title":        str,
+            "instructions": str,
+            "questions": [{
+                "id": str, "question": str, "options": [str], "correct_answer": str,
+            }],
+        },
+    },
+}
+
+
+def _check(value: Any, spec: Any, path: str, errors: list[str]) -> None:
+    if isinstance(spec, dict):
+        if not isinstance(value, Mapping):
+            errors.append(f"{path or '<root>'}: expected an object")
+            return
+        for key, sub in spec.items():
+            if key not in value:
+                errors.append(f"{path}.{key}: missing" if path else f"{key}: missing")
+            else:
+                _check(value[key], sub, f"{path}.{key}" if path else key, errors)
+    elif isinstance(spec, list):
+        if not isinstance(value, (list, tuple)):
+            errors.append(f"{path}: expected a list")
+            return
+        for i, item in enumerate(value):
+            _check(item, spec[0], f"{path}[{i}]", errors)
+    elif not isinstance(value, spec):
+        errors.append(f"{path}: expected {spec.__name__}, got {type(value).__name__}")
+
+
+def validate_setup(setup: Any) -> list[str]:
+    """Problems that would break the instructions page; empty if the setup is usable."""
+    errors: list[str] = []
+    _check(setup, SETUP_SCHEMA, "", errors)
+    if errors:
+        return errors
+
+    if not setup["instructions"]["sections"]:
+        errors.append("instructions.sections: empty")
+
+    questions = setup["example_annotations"]["comprehension_check"]["questions"]
+    if len(questions) < PASS_THRESHOLD:
+        errors.append(
+            f"example_annotations.comprehension_check.questions: {len(questions)} "
+            f"question(s), PASS_THRESHOLD needs at least {PASS_THRESHOLD}"
+        )
+    seen: set[str] = set()
+    for i, q in enumerate(questions):
+        path = f"example_annotations.comprehension_check.questions[{i}]"
+        if q["id"] in seen:
+            errors.append(f"{path}.id: duplicate id {q['id']!r}")
+        seen.add(q["id"])
+        # Answers are checked as chosen_option[0] == correct_answer
+        if not any(opt[:1] == q["correct_answer"] for opt in q["options"]):
+            errors.append(f"{path}.correct_answer: {q['correct_answer']!r} matches no option")
+    return errors
+
+
+def _freeze(value: Any) -> Any:
+    """Read-only view of parsed JSON, safe to share between sessions."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# ── Compiled bundle ────────────────────────────────────────────────────────────
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_bundle(path: str, mtime_ns: int) -> Optional[Mapping]:
+    # One read for every language; a rewritten bundle has a new mtime and
+    # therefore a new entry, which is how edits are picked up without a restart
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            bundle = json.load(f)
+        setups = {
+            code: (_freeze(entry["setup"]), tuple(entry["sections"]))
+            for code, entry in bundle["setups"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        logger.error("Ignoring unreadable setup bundle %s (%s).", path, exc)
+        return None
+    logger.info("Loaded setup bundle with %d language(s).", len(setups))
+    return MappingProxyType(setups)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _warn_stale(path: str, mtime_ns: int) -> None:
+    # Cached so each edit is reported once, not on every rerun
+    logger.warning(
+        "%s is newer than the setup bundle; using the file. Run compile_setups.py.", path
+    )
+
+
+def _bundled(lang_code: str) -> Optional[tuple[Mapping, tuple[str, ...]]]:
+    """The bundle's entry for a language, unless its file was edited after the bundle was built."""
+    try:
+        bundle_mtime = Path(SETUP_BUNDLE_PATH).stat().st_mtime_ns
+    except OSError:
+        return None
+    bundle = _load_bundle(SETUP_BUNDLE_PATH, bundle_mtime)
+    if not bundle or lang_code not in bundle:
+        return None
+    key = _cache_key(lang_code)
+    if key and key[1] > bundle_mtime:
+        _warn_stale(*key)
+        return None
+    return bundle[lang_code]
+
+
+# ── Individual files (no bundle) ───────────────────────────────────────────────
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _parse(path: str, mtime_ns: int) -> Optional[Mapping]:
+    # mtime_ns is only part of the cache key: an edited file gets a new entry
+    with open(path, "r", encoding="utf-8") as f:
+        setup = json.load(f)
+    errors = validate_setup(setup)
+    if errors:
+        logger.error("Skipping invalid setup %s: %s", path, "; ".join(errors))
+        return None
+    return _freeze(setup)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _compile(path: str, mtime_ns: int) -> tuple[str, ...]:
+    from views.shared import compile_sections
+
+    setup = _parse(path, mtime_ns)
+    return compile_sections(setup) if setup else ()
+
+
+def _cache_key(lang_code: str) -> Optional[tuple[str, int]]:
+    if lang_code not in LANGUAGE_JSON_FILES:
+        return None
+    path = Path(LANGUAGE_JSON_FILES[lang_code])
+    try:
+        return str(path), path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_setup(lang_code: str) -> Optional[Mapping]:
+    """
+    Validated annotation setup for a language, shared by all sessions.
+    Costs two stat() calls per call; nothing is re-read until the bundle or
+    the language's file changes. A file edited after the bundle was built
+    wins over the bundle's copy of it.
+    """
+    bundled = _bundled(lang_code)
+    if bundled:
+        return bundled[0]
+    key = _cache_key(lang_code)
+    return _parse(*key) if key else None
+
+
+def load_sections(lang_code: str) -> tuple[str, ...]:
+    """Instruction sections of a setup, compiled to one markdown string each."""
+    bundled = _bundled(lang_code)
+    if bundled:
+        return bundled[1]
+    key = _cache_key(lang_code)
+    return _compile(*key) if key else ()
+
+
+@st.cache_resource(show_spinner=False)
+def preload_setups() -> int:
+    """Parse and compile every configured setup once per process; returns how many loaded."""
+    loaded = sum(bool(load_sections(code)) for code in LANGUAGE_JSON_FILES)
+    logger.info("Preloaded %d annotation setup(s).", loaded)
+    return loaded
@@ -0,0 +1,484 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+import streamlit as st
+
+from admission import get_limiter
+from config import (
+    SHEETS_BATCH_SIZE,
+    SHEETS_FLUSH_INTERVAL,
+    SHEETS_MAX_BACKOFF,
+    SHEETS_TIMEOUT,
+)
+from deadline import Deadline, DeadlineExceeded, request_timeout
+from metrics import SHEETS_API_CALLS
+from registration_store import RegistrationStore, get_store
+from utils import get_secret
+
+logger = logging.getLogger(__name__)
+
+SHEETS_SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+# Timeout for the Sheets request being made by the current thread; set per
+# call by SheetsConnection.call, so threads sharing the client never see
+# each other's value
+_request_timeout: ContextVar[Optional[float]] = ContextVar(
+    "sheets_request_timeout", default=SHEETS_TIMEOUT
+)
+
+
+def _http_client_class():
+    from gspread.http_client import HTTPClient
+
+    class PerCallTimeoutHTTPClient(HTTPClient):
+        """gspread HTTP client that reads its timeout from `_request_timeout`."""
+
+        @property
+        def timeout(self) -> Optional[float]:
+            return _request_timeout.get()
+
+        @timeout.setter
+        def timeout(self, value) -> None:
+            pass                                 # set per call, never on the shared client
+
+    return PerCallTimeoutHTTPClient
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Quota (429), server-side (5xx) and network errors are worth retrying."""
+    import requests
+    from gspread.exceptions import APIError
+
+    if isinstance(exc, APIError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def _is_auth_error(exc: Exception) -> bool:
+    from google.auth.exceptions import RefreshError
+    from gspread.exceptions import APIError
+
+    if isinstance(exc, RefreshError):
+        return True
+    return isinstance(exc, APIError) and exc.response.status_code in (401, 403)
+
+
+def _extend_header(sheet, header: list[str], missing: list[str]) -> None:
+    from gspread.utils import rowcol_to_a1
+
+    if sheet.col_count < len(header) + len(missing):
+        sheet.add_cols(len(header) + len(missing) - sheet.col_count)
+    sheet.update(values=[missing], range_name=rowcol_to_a1(1, len(header) + 1))
+
+
+class SheetsConnection:
+    """
+    Authorized gspread client and registrations worksheet, opened once per
+    process and shared by every thread.
+
+    `api_calls` counts Google API round-trips by kind (open, values.get,
+    values.append, ...) so quota use can be checked; the same counts are
+    exported as metrics.SHEETS_API_CALLS. Each call's timeout is passed
+    through a context variable, never set on the shared client. Opening the
+    worksheet takes a rate-limit slot and runs under the caller's timeout
+    like any other call. On an auth error the handle is rebuilt and the
+    call retried once.
+    """
+
+    def __init__(self):
+        self.api_calls: Counter[str] = Counter()
+        self._sheet  = None
+        self._header: Optional[list[str]] = None
+        self._lock   = threading.RLock()
+
+    def _count(self, kind: str) -> None:
+        self.api_calls[kind] += 1
+        SHEETS_API_CALLS.inc(kind=kind)
+
+    def _open(self):
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        creds = Credentials.from_service_account_info(
+            st.secrets["gcp_service_account"], scopes=SHEETS_SCOPES
+        )
+        gc = gspread.authorize(creds, http_client=_http_client_class())
+        self._sheet  = gc.open(get_secret("SHEETS_DOCUMENT_NAME")).sheet1
+        self._header = None
+        logger.info("Opened registrations worksheet.")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._sheet  = None
+            self._header = None
+
+    def worksheet(
+        self, timeout: Optional[float] = SHEETS_TIMEOUT, deadline: Optional[Deadline] = None
+    ):
+        """The worksheet handle, opened within `timeout`/`deadline` if there is none yet."""
+        import requests
+
+        with self._lock:
+            if self._sheet is not None:
+                return self._sheet
+            if deadline is None and timeout is not None:
+                deadline = Deadline.after(timeout)
+            if not get_limiter("sheets").acquire(deadline):
+                raise requests.Timeout("Sheets open: rate limit wait exceeds the deadline")
+            try:
+                token = _request_timeout.set(request_timeout(deadline, timeout) if timeout else None)
+            except DeadlineExceeded:
+                raise requests.Timeout("Sheets open: deadline passed") from None
+            try:
+                self._count("open")                   # Drive lookup + spreadsheet metadata
+                self._open()
+            finally:
+                _request_timeout.reset(token)
+            return self._sheet
+
+    def _header_row(self, timeout: Optional[float]) -> list[str]:
+        # Row 1 is read once per handle; invalidate() and a reopen drop it
+        with self._lock:
+            if self._header is None:
+                self._header = self.call("values.get", lambda s: s.row_values(1), timeout)
+            return self._header
+
+    def call(
+        self,
+        kind: str,
+        fn: Callable,
+        timeout: Optional[float] = SHEETS_TIMEOUT,
+        deadline: Optional[Deadline] = None,
+    ):
+        """
+        Run `fn(worksheet)` with `timeout` applying to its requests only,
+        reopening once if the credentials were rejected. The rate limit wait
+        and the request together stay within `deadline` (by default `timeout`
+        from now); a slot that would open too late raises requests.Timeout,
+        like a request that took too long, so the writer backs off as usual.
+        """
+        import requests
+
+        if deadline is None and timeout is not None:
+            deadline = Deadline.after(timeout)
+        for attempt in (1, 2):
+            sheet = self.worksheet(timeout, deadline)
+            if not get_limiter("sheets").acquire(deadline):
+                raise requests.Timeout(f"Sheets {kind}: rate limit wait exceeds the deadline")
+            try:
+                token = _request_timeout.set(request_timeout(deadline, timeout) if timeout else None)
+            except DeadlineExceeded:
+                raise requests.Timeout(f"Sheets {kind}: deadline passed") from None
+            try:
+                self._count(kind)
+                return fn(sheet)
+            except Exception as exc:
+                if attempt == 2 or not _is_auth_error(exc):
+                    raise
+                logger.warning("Sheets auth error (%s) — reauthorizing.", exc)
+                self.invalidate()
+            finally:
+                _request_timeout.reset(token)
+
+    def ensure_header(self, fields: list[str], timeout: Optional[float] = SHEETS_TIMEOUT) -> list[str]:
+        """
+        The sheet's header row, extended with any of `fields` it lacks. Columns
+        added to the record after the sheet was created (e.g. pending_steps)
+        are appended to the right of row 1, so existing rows stay in place.
+        """
+        with self._lock:
+            if self._header is not None and set(fields) <= set(self._header):
+                return self._header
+            self._header = None                     # another process may have added them
+            header  = self._header_row(timeout)
+            missing = [f for f in fields if f not in header]
+            if missing and not header:
+                self.call("values.append", lambda s: s.append_row(missing), timeout)
+            elif missing:
+                self.call("values.update", lambda s: _extend_header(s, header, missing), timeout)
+                logger.info("Added column(s) %s to the registrations sheet.", ", ".join(missing))
+            self._header = header + missing
+            return self._header
+
+    def append_row(self, record: dict, timeout: Optional[float] = SHEETS_TIMEOUT) -> None:
+        self.append_rows([record], timeout)
+
+    def column_values(self, name: str, timeout: Optional[float] = SHEETS_TIMEOUT) -> list:
+        header = self._header_row(timeout)
+        if name not in header:
+            return []
+        col = header.index(name) + 1
+        return self.call("values.get", lambda s: s.col_values(col), timeout)
+
+    def rows_after(self, row: int, timeout: Optional[float] = SHEETS_TIMEOUT) -> tuple[list[dict], int]:
+        """
+        Records in the sheet rows below `row`, read together with the header
+        in one batch_get, and the number of the last row read.
+        """
+        header, values = self.call(
+            "values.batchGet", lambda s: s.batch_get(["1:1", f"A{row + 1}:ZZ"]), timeout
+        )
+        header  = header[0] if header else []
+        records = [
+            dict(zip(header, cells + [""] * (len(header) - len(cells))))
+            for cells in values if any(cell != "" for cell in cells)
+        ]
+        return records, row + len(values)
+
+    def append_rows(self, records: list[dict], timeout: Optional[float] = SHEETS_TIMEOUT) -> None:
+        fields = list(dict.fromkeys(k for r in records for k in r))
+        header = self.ensure_header(fields, timeout)
+        rows   = [[r.get(name, "") for name in header] for r in records]
+        self.call("values.append", lambda s: s.append_rows(rows), timeout)
+
+    def update_rows(self, records: list[dict], timeout: Optional[float] = SHEETS_TIMEOUT) -> int:
+        """
+        Overwrite the cells of already-mirrored records, found by
+        generated_username, with one batch_update. Only the record's own
+        fields are written, so columns added by hand are left alone.
+        Returns how many records were found in the sheet.
+        """
+        from gspread.utils import rowcol_to_a1
+
+        fields = list(dict.fromkeys(k for r in records for k in r))
+        header = self.ensure_header(fields, timeout)
+        col    = header.index("generated_username") + 1
+        names  = self.call("values.get", lambda s: s.col_values(col), timeout)
+        rows   = {name: i for i, name in enumerate(names, start=1) if i > 1}
+        cells  = [
+            {"range": rowcol_to_a1(rows[r["generated_username"]], header.index(k) + 1),
+             "values": [[v]]}
+            for r in records if r.get("generated_username") in rows
+            for k, v in r.items() if k != "generated_username"
+        ]
+        if cells:
+            self.call("values.batchUpdate", lambda s: s.batch_update(cells), timeout)
+        return len({r.get("generated_username") for r in records} & rows.keys())
+
+
+class SheetsWriter:
+    """
+    Background mirror from the local registration store to Sheets.
+
+    Records are made durable in the store first; this task sends
+    everything after the store's mirror cursor with append_rows, in
+    batches of `batch_size` or whatever has accumulated after
+    `flush_interval` seconds. Quota and availability errors back off
+    exponentially; other errors (e.g. Sheets not configured) back off at
+    the maximum interval, and the records stay in the store until Sheets
+    takes them.
+
+    Before each send the batch's end offset is stored as in flight. If the
+    process dies mid-send, start-up looks for the batch's usernames in the
+    sheet and only resends it if they are not there.
+
+    Records changed later with `store.update` (e.g. by provision_backlog.py)
+    are sent after the new ones, by overwriting their cells in place. That
+    resend is idempotent, so it needs no in-flight marker.
+
+    `pull` goes the other way: rows the store does not have (after a
+    restart on a fresh disk, or added to the Sheet by hand) are copied in
+    below the last Sheet row pulled, and are not sent back.
+    """
+
+    def __init__(
+        self,
+        connection: SheetsConnection,
+        store: RegistrationStore,
+        batch_size: int = SHEETS_BATCH_SIZE,
+        flush_interval: float = SHEETS_FLUSH_INTERVAL,
+        max_backoff: float = SHEETS_MAX_BACKOFF,
+    ):
+        self.connection     = connection
+        self.store          = store
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff    = max_backoff
+        offset, _           = store.cursor()
+        # Unknown count of leftovers from a previous run: flush right away
+        self._unsent        = batch_size if store.tail() > offset else 0
+        self._oldest        = time.monotonic()
+        self._backoff       = 0.0
+        self._cond          = threading.Condition()
+        self._flush_lock    = threading.Lock()
+        self._stop          = threading.Event()
+        self._thread        = threading.Thread(
+            target=self._run, name="sheets-writer", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+        atexit.register(self.close)
+
+    def notify(self) -> None:
+        """Called after a record was added to the store."""
+        with self._cond:
+            if not self._unsent:
+                self._oldest = time.monotonic()
+            self._unsent += 1
+            if self._unsent >= self.batch_size:
+                self._cond.notify()
+
+    def _due(self) -> bool:
+        if not self._unsent:
+            return False
+        return (self._unsent >= self.batch_size
+                or time.monotonic() - self._oldest >= self.flush_interval)
+
+    def _run(self) -> None:
+        try:
+            self._recover_inflight()
+        except Exception as exc:
+            logger.warning("Could not verify in-flight Sheets batch (%s); resending.", exc)
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or self._due(),
+                    timeout=self.flush_interval,
+                )
+            if self._stop.is_set():
+                break
+            if self._backoff:
+                self._stop.wait(self._backoff)
+            self.flush()
+
+    def _recover_inflight(self) -> None:
+        offset, inflight = self.store.cursor()
+        if inflight is None:
+            return
+        batch, _ = self.store.read_from(offset, self.batch_size, end=inflight)
+        names    = {r.get("generated_username") for r in batch}
+        sent       = set(self.connection.column_values("generated_username"))
+        if names and names <= sent:
+            logger.info("In-flight batch of %d already in Sheets; skipping.", len(batch))
+            self.store.commit(inflight)
+        else:
+            self.store.commit(offset)
+
+    def _send_failed(self, exc: Exception, count: int) -> None:
+        if _is_transient(exc):
+            self._backoff = min(self.max_backoff, max(1.0, self._backoff * 2))
+            self._backoff *= random.uniform(0.8, 1.2)
+            logger.warning("Sheets write throttled (%s) — retrying in %.0fs.",
+                           exc, self._backoff)
+        else:
+            self._backoff = self.max_backoff
+            logger.warning("Google Sheets save failed (%s) — %d record(s) kept "
+                           "in the local store.", exc, count)
+
+    def flush(self) -> bool:
+        """
+        Send one batch of new records or, when there are none, of updated
+        ones; returns True if a mirror cursor moved.
+        """
+        with self._flush_lock:
+            offset, _  = self.store.cursor()
+            batch, end = self.store.read_from(offset, self.batch_size)
+            if not batch:
+                with self._cond:
+                    self._unsent = 0
+                return self._flush_updates()
+
+            self.store.begin(end)
+            try:
+                self.connection.append_rows(batch)
+            except Exception as exc:
+                self.store.commit(offset)
+                self._send_failed(exc, len(batch))
+                return False
+
+            self.store.commit(end)
+            self._backoff = 0.0
+            logger.info("%d registration(s) saved to Google Sheets.", len(batch))
+            with self._cond:
+                self._unsent = max(0, self._unsent - len(batch))
+                if self.store.tail() > end:
+                    self._unsent = max(self._unsent, 1)
+                self._oldest = time.monotonic()
+            return True
+
+    def _flush_updates(self) -> bool:
+        offset     = self.store.updates_cursor()
+        batch, end = self.store.read_updates(offset, self.batch_size)
+        if end == offset:
+            return False
+        if batch:
+            try:
+                found = self.connection.update_rows(batch)
+            except Exception as exc:
+                self._send_failed(exc, len(batch))
+                return False
+            logger.info("%d updated registration(s) rewritten in Google Sheets.", found)
+        self.store.commit_updates(end)
+        self._backoff = 0.0
+        return True
+
+    def pull(self) -> Optional[int]:
+        """
+        Copy Sheet rows below the last one pulled whose usernames the store
+        lacks; returns how many were added, or None if the store's own new
+        records could not be sent first.
+        """
+        while self.flush():
+            pass
+        with self._flush_lock:
+            start         = self.store.pulled_rows()
+            records, last = self.connection.rows_after(start)
+            known         = self.store.usernames()
+            new = []
+            for record in records:
+                name = record.get("generated_username")
+                if name and name not in known:
+                    known.add(name)
+                    new.append(record)
+            if not self.store.restore(new, last):
+                return None
+        if new:
+            logger.info("%d registration(s) pulled from Google Sheets.", len(new))
+        return len(new)
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._backoff == 0.0:
+            while self.flush():
+                pass
+
+
+_connection: Optional[SheetsConnection] = None
+_connection_lock = threading.Lock()
+
+
+def get_connection() -> SheetsConnection:
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = SheetsConnection()
+        return _connection
+
+
+_writer: Optional[SheetsWriter] = None
+
+
+def get_writer() -> SheetsWriter:
+    """The process-wide Sheets mirror, started on first use."""
+    global _writer
+    connection = get_connection()
+    with _connection_lock:
+        if _writer is None:
+            _writer = SheetsWriter(connection, get_store())
+            _writer.start()
+        return _writer
+
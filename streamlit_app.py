@@ -1,20 +1,52 @@
+import importlib
+
 import streamlit as st
 
-from views import credentials, demographics, instructions
+import metrics
+import profiling
+import usernames
+import warmup
+from config import ADMIN_PAGE, LANGUAGES, PRELOAD_SETUPS
+from setups import preload_setups
 from views.shared import CUSTOM_CSS, render_sidebar
 
+# Views are imported when first shown; see warmup.py for the ones that are
+# preloaded in the background
+PAGES = {
+    1:          "views.demographics",
+    2:          "views.instructions",
+    3:          "views.credentials",
+    ADMIN_PAGE: "views.admin",
+}
+
 
 def init_state() -> None:
     defaults: dict = {
-        "page":         1,
-        "demographics": {},
-        "demo_errors":  [],
-        "check_error":  None,
-        "credentials":  None,
-        "processed":    False,
+        "page":              1,
+        "demographics":      {},
+        "demo_errors":       [],
+        "check_error":       None,
+        "instructions_lang": None,
+        "credentials":       None,
+        "processed":         False,
     }
     for k, v in defaults.items():
         st.session_state.setdefault(k, v)
+    if "admin" in st.query_params:
+        st.session_state.page = ADMIN_PAGE
+    elif "reg" in st.query_params and not st.session_state.processed:
+        # Refreshed or reconnected after registering: show the same account
+        from views.credentials import restore_registration
+
+        restore_registration(st.query_params["reg"])
+
+
+def _language_label() -> str:
+    # The language being read on the instructions page, else the first one chosen
+    if st.session_state.page == 2 and st.session_state.instructions_lang:
+        return st.session_state.instructions_lang
+    chosen = st.session_state.demographics.get("languages") or []
+    return LANGUAGES[chosen[0]][0] if chosen else ""
 
 
 def main() -> None:
@@ -24,14 +56,25 @@ def main() -> None:
         layout="centered",
         initial_sidebar_state="expanded",
     )
-    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+    metrics.start_exporter()
+    warmup.start()
+    usernames.get_allocator()                    # start syncing the taken-username index
     init_state()
-    render_sidebar()
+    profiling.arm_from_query()
+    page = st.session_state.page
+    with profiling.profiled(f"page{page}"), \
+            metrics.context(page=page, language=_language_label()):
+        metrics.RERUNS.inc()
+        with metrics.timed("css"):
+            st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+        if PRELOAD_SETUPS:
+            preload_setups()
+        if page != ADMIN_PAGE:
+            render_sidebar()
 
-    match st.session_state.page:
-        case 1: demographics.render()
-        case 2: instructions.render()
-        case 3: credentials.render()
+        # "view" includes the header and sections phases timed inside it
+        with metrics.timed("view"):
+            importlib.import_module(PAGES[page]).render()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app is a flat set of modules next to streamlit_app.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
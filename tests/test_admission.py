@@ -0,0 +1,53 @@
+import threading
+import time
+
+from admission import TokenBucket, get_limiter
+from deadline import Deadline
+
+
+def test_burst_is_free_then_calls_are_spaced():
+    bucket = TokenBucket(rate=20, burst=3)
+    start  = time.monotonic()
+    for _ in range(3):
+        assert bucket.acquire()
+    assert time.monotonic() - start < 0.03
+
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.acquire() for _ in range(1000))
+    assert bucket._next == 0.0
+
+
+def test_refuses_a_slot_past_the_deadline_without_taking_it():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire()
+    reserved = bucket._next
+    start    = time.monotonic()
+    assert not bucket.acquire(Deadline.after(0.1))
+    assert time.monotonic() - start < 0.05               # gave up at once, no sleep
+    assert bucket._next == reserved                     # the refused caller reserved nothing
+
+
+def test_waiters_are_served_in_arrival_order():
+    bucket = TokenBucket(rate=20, burst=1)
+    bucket.acquire()
+    order, threads = [], []
+    for i in range(5):
+        reserved = bucket._next
+        t = threading.Thread(target=lambda i=i: (bucket.acquire(), order.append(i)))
+        t.start()
+        threads.append(t)
+        while bucket._next == reserved:                 # arrive one after another
+            time.sleep(0.001)
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_get_limiter_is_shared_and_unknown_services_are_unlimited():
+    assert get_limiter("inception") is get_limiter("inception")
+    assert get_limiter("no-such-service").rate == 0
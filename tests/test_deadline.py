@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, request_timeout
+
+
+def test_remaining_counts_down_and_never_goes_negative():
+    deadline = Deadline.after(10)
+    assert 9 < deadline.remaining() <= 10
+    assert not deadline.expired
+
+    past = Deadline(time.time() - 1)
+    assert past.remaining() == 0
+    assert past.expired
+
+
+def test_timeout_is_capped_by_what_is_left():
+    assert Deadline.after(60).timeout(5) == 5
+    assert Deadline.after(2).timeout(5) <= 2
+
+
+def test_timeout_raises_once_expired():
+    with pytest.raises(DeadlineExceeded):
+        Deadline(time.time() - 1).timeout(5)
+
+
+def test_request_timeout_without_deadline_is_the_cap():
+    assert request_timeout(None, 7) == 7
+    assert request_timeout(Deadline.after(1), 7) <= 1
+
+
+def test_survives_a_round_trip_through_json_payloads():
+    # Queue payloads carry the deadline as its epoch timestamp
+    deadline = Deadline.after(30)
+    assert Deadline(float(str(deadline.expires_at))).remaining() == pytest.approx(
+        deadline.remaining(), abs=0.1
+    )
@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from idempotency import RegistrationIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RegistrationIndex(tmp_path / "registrations.db", ttl=3600)
+
+
+def _creator():
+    calls = []
+
+    def create(previous):
+        calls.append(previous)
+        n = len(calls)
+        username = previous["username"] if previous else f"anno_{n}"
+        return {"username": username, "password": f"pw{n}", "job_id": n}
+
+    return create, calls
+
+
+def test_same_token_or_email_never_creates_twice(index):
+    create, calls = _creator()
+    entry, found = index.get_or_create("t1", "A@Example.org ", create)
+    assert found == "new" and entry["email"] == "a@example.org"
+
+    assert index.get_or_create("t1", "a@example.org", create)[1] == "token"
+    again, found = index.get_or_create("t2", "a@example.org", create)
+    assert found == "email" and again["username"] == "anno_1"
+    assert calls == [None]
+
+
+def test_registrations_without_email_are_told_apart_by_token(index):
+    create, calls = _creator()
+    index.get_or_create("t1", "", create)
+    index.get_or_create("t2", "  ", create)
+    assert len(calls) == 2
+    assert index.usernames() == {"anno_1", "anno_2"}
+
+
+def test_failed_entry_is_replaced_and_keeps_its_username(index):
+    create, calls = _creator()
+    index.get_or_create("t1", "a@example.org", create)
+
+    entry, found = index.get_or_create("t2", "a@example.org", create, failed=lambda e: e["job_id"] == 1)
+    assert found == "retry"
+    assert calls[1]["token"] == "t1"
+    assert (entry["username"], entry["job_id"]) == ("anno_1", 2)
+    assert index.find("t1") is None
+    assert index.find("t2")["job_id"] == 2
+
+
+def test_failed_token_entry_does_not_hide_a_live_email_entry(index):
+    create, _ = _creator()
+    index.get_or_create("t1", "a@example.org", create)
+    index.get_or_create("t2", "b@example.org", create)
+
+    entry, found = index.get_or_create("t1", "b@example.org", create, failed=lambda e: e["job_id"] == 1)
+    assert found == "email" and entry["token"] == "t2"
+
+
+def test_forget_password(index):
+    create, _ = _creator()
+    index.get_or_create("t1", "", create)
+    assert index.find("t1")["password"] == "pw1"
+    index.forget_password("anno_1")
+    assert index.find("t1")["password"] is None
+    assert index.find("t1")["username"] == "anno_1"
+
+
+def test_passwords_expire_after_the_ttl(tmp_path):
+    index = RegistrationIndex(tmp_path / "registrations.db", ttl=0.05)
+    create, _ = _creator()
+    index.get_or_create("t1", "", create)
+    time.sleep(0.1)
+    assert index.find("t1")["password"] is None
+
+
+def test_create_error_leaves_nothing_behind(index):
+    def broken(previous):
+        raise RuntimeError("queue down")
+
+    with pytest.raises(RuntimeError):
+        index.get_or_create("t1", "a@example.org", broken)
+    assert index.find("t1") is None
+    create, calls = _creator()
+    assert index.get_or_create("t1", "a@example.org", create)[1] == "new"
+
+
+def test_create_runs_outside_the_write_transaction(index):
+    create, _ = _creator()
+
+    def slow(previous):
+        # Another sign-up goes through while this one allocates and enqueues
+        assert index.get_or_create("t2", "b@example.org", create)[1] == "new"
+        return {"username": "anno_slow", "password": "pw", "job_id": 99}
+
+    assert index.get_or_create("t1", "a@example.org", slow)[0]["job_id"] == 99
+    assert index.usernames() == {"anno_1", "anno_slow"}
+
+
+def test_concurrent_call_waits_for_the_reservation(index):
+    create, calls = _creator()
+    started, release = threading.Event(), threading.Event()
+
+    def held(previous):
+        started.set()
+        release.wait(2)
+        return create(previous)
+
+    first = threading.Thread(target=index.get_or_create, args=("t1", "a@example.org", held))
+    first.start()
+    started.wait(2)
+    assert index.find("t1") is None                     # reserved, not yet created
+    threading.Timer(0.1, release.set).start()
+    entry, found = index.get_or_create("t2", "a@example.org", create)
+    first.join()
+    assert found == "email" and entry["username"] == "anno_1"
+    assert len(calls) == 1
+
+
+def test_job_is_cancelled_when_its_id_cannot_be_recorded(index, monkeypatch):
+    create, _ = _creator()
+    cancelled = []
+
+    def locked(entry, reserved):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(index, "_record", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        index.get_or_create("t1", "a@example.org", create, cancel=cancelled.append)
+    assert [e["job_id"] for e in cancelled] == [1]
+    assert index.usernames() == set()
+
+
+def test_expired_reservation_is_taken_over(tmp_path):
+    index = RegistrationIndex(tmp_path / "registrations.db", reservation_timeout=0.05)
+    create, _ = _creator()
+    cancelled = []
+
+    def stalled(previous):
+        time.sleep(0.1)                                 # long enough to lose the reservation
+        index.get_or_create("t1", "a@example.org", create)    # another process takes over
+        return {"username": "anno_stalled", "password": "pw", "job_id": 99}
+
+    entry, found = index.get_or_create("t1", "a@example.org", stalled, cancel=cancelled.append)
+    assert (entry["username"], found) == ("anno_1", "token")
+    assert [e["job_id"] for e in cancelled] == [99]
+
+
+def test_failed_retry_keeps_the_failed_entry(index):
+    create, _ = _creator()
+    index.get_or_create("t1", "a@example.org", create)
+
+    def broken(previous):
+        raise RuntimeError("queue down")
+
+    with pytest.raises(RuntimeError):
+        index.get_or_create("t2", "a@example.org", broken, failed=lambda e: True)
+    assert index.find("t1")["job_id"] == 1
+    assert index.find("t2") is None
@@ -0,0 +1,155 @@
+import threading
+import time
+
+from admission import TokenBucket
+from deadline import Deadline
+from inception_client import InceptionClient
+from inception_health import CircuitBreaker, HealthProber, ensure_prober, get_prober, stop_prober
+from inception_stub import StubServer
+
+
+def _wait_for(condition, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_opens_after_the_failure_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through_then_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()                  # the trial is still running
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_failure()                            # one failure is enough when half open
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_inconclusive_trial_frees_the_slot_without_counting():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_inconclusive()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()                      # the next caller gets the trial
+
+
+def test_deadline_cut_timeout_is_not_a_breaker_failure():
+    with StubServer(latency=0.3) as url:
+        client = InceptionClient(url, "admin", "admin")
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        assert client.get_projects(Deadline.after(0.05)) == []
+        assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast_without_taking_a_rate_slot():
+    client = InceptionClient("http://inception.test", "admin", "admin", limiter=TokenBucket(1))
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client.breaker.record_failure()
+    assert client.get_projects() == []
+    assert client.limiter._next == 0.0
+
+
+def test_trial_refused_by_the_rate_limit_is_passed_on():
+    client = InceptionClient("http://inception.test", "admin", "admin", limiter=TokenBucket(1))
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    client.breaker.record_failure()
+    client.limiter.acquire()                            # next slot is a second away
+    time.sleep(0.02)
+    assert client.get_projects(Deadline.after(0.1)) == []
+    assert client.breaker.allow_request()               # the trial is free again
+
+
+def test_prober_closes_an_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    healthy = threading.Event()
+    prober  = HealthProber(healthy.is_set, breaker, interval=0.01)
+    prober.start()
+    try:
+        assert _wait_for(lambda: prober.last_ok is False)
+        assert breaker.state == CircuitBreaker.OPEN
+        healthy.set()
+        assert _wait_for(lambda: breaker.state == CircuitBreaker.CLOSED)
+        assert prober.cached_health() is True
+    finally:
+        prober.stop()
+        prober._thread.join(1)
+
+
+def test_prober_counts_a_raising_probe_as_a_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+
+    def probe():
+        raise ConnectionError("refused")
+
+    prober = HealthProber(probe, breaker, interval=0.01)
+    prober.start()
+    try:
+        assert _wait_for(lambda: breaker.state == CircuitBreaker.OPEN)
+    finally:
+        prober.stop()
+        prober._thread.join(1)
+
+
+def test_cached_health_expires_after_two_intervals():
+    prober = HealthProber(lambda: True, CircuitBreaker(), interval=0.02)
+    prober.last_ok, prober.last_checked = True, time.monotonic()
+    assert prober.cached_health() is True
+    time.sleep(0.05)
+    assert prober.cached_health() is None
+
+
+def test_ensure_prober_replaces_a_prober_with_another_probe():
+    url    = "http://health.test"
+    first  = lambda: True
+    second = lambda: True
+    old = ensure_prober(url, first)
+    assert ensure_prober(url, first) is old
+    new = ensure_prober(url, second)
+    try:
+        assert new is not old
+        assert old._stop.is_set()
+        stop_prober(url, first)                         # not the running probe: no-op
+        assert get_prober(url) is new
+    finally:
+        stop_prober(url, second)
+    assert get_prober(url) is None
+    new._thread.join(1)
+    old._thread.join(1)
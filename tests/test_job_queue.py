@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import DEAD, DONE, QUEUED, JobQueue, RetryableError
+
+
+def _wait_for(queue: JobQueue, job_id: int, timeout: float = 5.0) -> dict:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = queue.status(job_id)
+        if job["status"] in (DONE, DEAD):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {queue.status(job_id)['status']}")
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(handler, **kwargs) -> JobQueue:
+        kwargs.setdefault("workers", 2)
+        kwargs.setdefault("backoff", 0.01)
+        queue = JobQueue(tmp_path / "queue.db", handler, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def test_runs_a_job_and_stores_its_result(make_queue):
+    queue = make_queue(lambda payload, final: {"echo": payload["n"]})
+    queue.start()
+    job = _wait_for(queue, queue.enqueue({"n": 3}))
+    assert job["status"] == DONE
+    assert job["result"] == {"echo": 3}
+    assert job["attempts"] == 1
+
+
+def test_retries_then_passes_attempt_and_final_flag(make_queue):
+    seen = []
+
+    def handler(payload, final):
+        seen.append((payload["attempt"], final))
+        if not final:
+            raise RetryableError("try again")
+        return {}
+
+    queue = make_queue(handler, max_attempts=3)
+    queue.start()
+    assert _wait_for(queue, queue.enqueue({}))["status"] == DONE
+    assert seen == [(1, False), (2, False), (3, True)]
+
+
+def test_dead_letters_after_max_attempts(make_queue):
+    dead = []
+
+    def handler(payload, final):
+        raise RuntimeError("boom")
+
+    queue = make_queue(handler, max_attempts=2, on_dead=lambda p, e: dead.append((p["user"], e)))
+    queue.start()
+    job = _wait_for(queue, queue.enqueue({"user": "anno_x"}))
+    assert job["status"] == DEAD
+    assert job["last_error"] == "RuntimeError: boom"
+    assert dead == [("anno_x", "RuntimeError: boom")]
+    assert [d["id"] for d in queue.dead_letters()] == [1]
+
+
+def test_scrub_keys_are_removed_once_the_job_ends(make_queue):
+    queue = make_queue(lambda payload, final: {}, scrub_keys=("password",))
+    queue.start()
+    job_id = queue.enqueue({"username": "anno_x", "password": "secret"})
+    _wait_for(queue, job_id)
+    with queue._connect() as db:
+        payload = db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert "secret" not in payload
+    assert "anno_x" in payload
+
+
+def test_started_at_is_kept_across_attempts(make_queue):
+    started = []
+
+    def handler(payload, final):
+        started.append(payload["started_at"])
+        if not final:
+            raise RetryableError
+        return {}
+
+    queue = make_queue(handler, max_attempts=2)
+    queue.start()
+    _wait_for(queue, queue.enqueue({}))
+    assert len(started) == 2 and started[0] == started[1]
+
+
+def test_running_jobs_are_requeued_on_restart(tmp_path):
+    release = threading.Event()
+
+    def stuck(payload, final):
+        release.wait(5)
+        return {}
+
+    first = JobQueue(tmp_path / "queue.db", stuck, workers=1)
+    first.start()
+    job_id = first.enqueue({})
+    while first.status(job_id)["status"] == QUEUED:
+        time.sleep(0.01)
+
+    # A new process opening the same file puts the crashed job back in line
+    second = JobQueue(tmp_path / "queue.db", lambda p, f: {"attempt": p["attempt"]}, workers=1)
+    assert second.status(job_id)["status"] == QUEUED
+    first.stop()
+    second.start()
+    job = _wait_for(second, job_id)
+    second.stop()
+    release.set()
+    assert job["result"] == {"attempt": 2}
+
+
+def test_wait_estimate_counts_jobs_ahead(make_queue):
+    queue = make_queue(lambda payload, final: {})     # not started: everything stays queued
+    ids = [queue.enqueue({}) for _ in range(3)]
+    assert queue.wait_estimate(ids[2]) == (2, None)
+    assert queue.wait_estimate(999) is None
+
+
+def test_cancel_withdraws_only_a_job_not_yet_started(make_queue):
+    release = threading.Event()
+    queue   = make_queue(lambda payload, final: release.wait(5) and {}, workers=1)
+    waiting = queue.enqueue({})
+    assert queue.cancel(waiting)
+    assert queue.status(waiting) is None
+
+    queue.start()
+    running = queue.enqueue({})
+    while queue.status(running)["status"] == QUEUED:
+        time.sleep(0.01)
+    assert not queue.cancel(running)
+    release.set()
+    assert _wait_for(queue, running)["status"] == DONE
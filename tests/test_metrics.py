@@ -0,0 +1,57 @@
+import metrics
+from metrics import Counter, Histogram
+
+
+def test_counter_exposition():
+    reruns = Counter("demo_reruns", "Script runs.", ("view",))
+    reruns.inc(view="a")
+    reruns.inc(2, view="a")
+    assert reruns.render() == [
+        "# HELP demo_reruns Script runs.",
+        "# TYPE demo_reruns counter",
+        'demo_reruns_total{view="a",page="",language=""} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    latency = Histogram("demo_seconds", "Latency.", buckets=(0.1, 0.5))
+    for seconds in (0.05, 0.1, 0.3, 2.0):
+        latency.observe(seconds)
+    lines = latency.render()
+    assert lines[:2] == ["# HELP demo_seconds Latency.", "# TYPE demo_seconds histogram"]
+    assert lines[2:] == [
+        'demo_seconds_bucket{page="",language="",le="0.1"} 2',
+        'demo_seconds_bucket{page="",language="",le="0.5"} 3',
+        'demo_seconds_bucket{page="",language="",le="+Inf"} 4',
+        'demo_seconds_sum{page="",language=""} 2.450000',
+        'demo_seconds_count{page="",language=""} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    errors = Counter("demo_errors", "Errors.", ("message",))
+    errors.inc(message='say "hi"\\now\nthen')
+    assert errors.render()[-1] == (
+        'demo_errors_total{message="say \\"hi\\"\\\\now\\nthen",page="",language=""} 1'
+    )
+
+
+def test_context_labels_are_attached():
+    reruns = Counter("demo_context", "Runs.")
+    with metrics.context(page=2, language="de"):
+        reruns.inc()
+    reruns.inc()
+    assert reruns.render()[2:] == [
+        'demo_context_total{page="",language=""} 1',
+        'demo_context_total{page="2",language="de"} 1',
+    ]
+
+
+def test_render_text_includes_registered_metrics():
+    registered = metrics.counter("demo_registered", "Registered once.")
+    assert metrics.counter("demo_registered", "Registered once.") is registered
+    registered.inc()
+    text = metrics.render_text()
+    assert text.endswith("\n")
+    assert "# TYPE demo_registered counter\n" in text
+    assert 'demo_registered_total{page="",language=""} 1\n' in text
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from inception_client import InceptionClient, ProjectCache
+
+PROJECTS = [{"name": "uk_ner", "id": 1}, {"name": "en_ner", "id": 2}]
+
+
+def test_concurrent_misses_share_one_download():
+    cache   = ProjectCache()
+    calls   = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return PROJECTS
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("en_ner", fetch))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)                                    # let every thread miss and queue up
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [2] * 10
+
+
+def test_hits_until_the_ttl_expires():
+    cache = ProjectCache(ttl=0.05)
+    calls = []
+    fetch = lambda: calls.append(1) or PROJECTS
+    assert cache.get("uk_ner", fetch) == 1
+    assert cache.get("uk_ner", fetch) == 1
+    assert len(calls) == 1
+
+    time.sleep(0.06)
+    assert cache.get("uk_ner", fetch) == 1
+    assert len(calls) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2}
+
+
+def test_absent_name_is_remembered_for_the_miss_ttl():
+    cache = ProjectCache(miss_ttl=0.05)
+    calls = []
+    fetch = lambda: calls.append(1) or PROJECTS
+    assert cache.get("de_ner", fetch) is None
+    assert cache.get("de_ner", fetch) is None
+    assert len(calls) == 1
+
+    time.sleep(0.06)
+    assert cache.get("de_ner", fetch) is None
+    assert len(calls) == 2
+
+
+def test_failed_download_is_not_cached():
+    cache = ProjectCache()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ConnectionError("INCEpTION down")
+
+    try:
+        cache.get("uk_ner", broken)
+    except ConnectionError:
+        pass
+    assert cache._refresh is None                       # waiters were released
+    assert cache.get("uk_ner", lambda: calls.append(1) or PROJECTS) == 1
+    assert len(calls) == 2
+
+
+def test_empty_download_does_not_mark_names_missing():
+    cache = ProjectCache()
+    assert cache.get("uk_ner", lambda: []) is None
+    assert cache.get("uk_ner", lambda: PROJECTS) == 1
+
+
+def test_invalidate_forces_a_new_download():
+    cache = ProjectCache()
+    calls = []
+    fetch = lambda: calls.append(1) or PROJECTS
+    cache.get("uk_ner", fetch)
+    cache.invalidate("uk_ner")
+    cache.get("uk_ner", fetch)
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+    cache.get("en_ner", fetch)
+    assert len(calls) == 3
+
+
+def test_failed_membership_post_invalidates_the_project(monkeypatch):
+    client = InceptionClient("http://inception.test", "admin", "secret")
+    client.projects = ProjectCache()
+    calls  = []
+    monkeypatch.setattr(client, "get_projects", lambda deadline=None: calls.append(1) or PROJECTS)
+    monkeypatch.setattr(client, "_post", lambda *args, **kwargs: None)
+
+    assert not client.add_user_to_project("ann_01", "uk_ner")
+    assert client.projects.stats()["size"] == 1         # en_ner is still cached
+    assert not client.add_user_to_project("ann_01", "uk_ner")
+    assert len(calls) == 2
@@ -0,0 +1,174 @@
+import threading
+
+import pytest
+
+from journal import RegistrationJournal
+from registration_store import SQLiteRegistrationStore, is_pending, status
+
+
+def _record(username: str, languages: str = "English", created: bool = True, **extra) -> dict:
+    return {
+        "generated_username": username,
+        "email":              f"{username}@example.org",
+        "languages":          languages,
+        "registered_at":      "2026-01-01T00:00:00",
+        "account_created":    created,
+        "pending_steps":      "" if created else "create_user",
+        **extra,
+    }
+
+
+@pytest.fixture(params=["sqlite", "journal"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteRegistrationStore(tmp_path / "registrations.db")
+        return
+    journal = RegistrationJournal(tmp_path / "registrations.jsonl", fsync_window=0)
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def filled(store):
+    store.append(_record("anno_a"))
+    store.append(_record("anno_b", "English, German", created=False))
+    store.append(_record("anno_c", "German", pending_steps="project:german"))
+    return store
+
+
+def test_status_helpers():
+    assert status(_record("x")) == "created"
+    assert status(_record("x", created=False)) == "pending"
+    assert is_pending(_record("x", pending_steps="project:english"))
+    assert is_pending({"account_created": "FALSE", "pending_steps": ""})
+
+
+def test_find_and_usernames(filled):
+    assert [r["generated_username"] for r in filled.find(email="anno_b@example.org")] == ["anno_b"]
+    assert filled.find(username="anno_c")[0]["languages"] == "German"
+    assert filled.find() == []
+    assert filled.usernames() == {"anno_a", "anno_b", "anno_c"}
+
+
+def test_pending_by_project(filled):
+    assert [r["generated_username"] for r in filled.pending()] == ["anno_b", "anno_c"]
+    assert [r["generated_username"] for r in filled.pending(project="english")] == ["anno_b"]
+    assert len(filled.pending(limit=1)) == 1
+
+
+def test_count_by(filled):
+    assert filled.count_by("status") == {"created": 1, "pending": 2}
+    assert filled.count_by("language") == {"English": 2, "German": 2}
+    assert filled.count_by("account_created") == {1: 2, 0: 1}
+
+
+def test_search_filters_pages_and_totals(filled):
+    rows, total = filled.search(limit=2)
+    assert total == 3
+    assert [r["generated_username"] for r in rows] == ["anno_c", "anno_b"]     # newest first
+
+    rows, total = filled.search(limit=2, offset=2)
+    assert [r["generated_username"] for r in rows] == ["anno_a"] and total == 3
+
+    assert filled.search(language="German", status="pending")[1] == 2
+    assert filled.search(status="created")[0][0]["generated_username"] == "anno_a"
+    assert filled.search(text="anno_b")[1] == 1
+
+
+def test_update_changes_queries(filled):
+    filled.update("anno_b", {"account_created": True, "pending_steps": "", "languages": "Czech"})
+    assert filled.find(username="anno_b")[0]["account_created"] is True
+    assert filled.count_by("status") == {"created": 2, "pending": 1}
+    assert filled.search(language="Czech")[1] == 1
+    assert filled.search(language="English")[1] == 1
+    filled.update("anno_missing", {"account_created": True})          # no such row: ignored
+    assert len(filled.usernames()) == 3
+
+
+def test_concurrent_updates_of_one_row_all_land(store):
+    store.append(_record("anno_a"))
+    threads = [
+        threading.Thread(target=store.update, args=("anno_a", {f"note_{i}": i}))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    record = store.find(username="anno_a")[-1]
+    assert all(record.get(f"note_{i}") == i for i in range(8))
+
+
+def test_restore_skips_the_mirror_and_refuses_over_unsent_records(store):
+    assert store.pulled_rows() == 1
+    assert store.restore([_record("anno_a"), _record("anno_b")], 3)
+    assert store.usernames() == {"anno_a", "anno_b"}
+    assert store.read_from(store.cursor()[0], 10)[0] == []              # already mirrored
+    assert store.pulled_rows() == 3
+
+    store.append(_record("anno_c"))
+    assert not store.restore([_record("anno_d")], 4)
+    assert "anno_d" not in store.usernames()
+    assert store.pulled_rows() == 3
+
+
+def test_mirror_feed_and_cursor(store):
+    store.append(_record("anno_a"))
+    store.append(_record("anno_b"))
+    assert store.cursor() == (0, None)
+
+    batch, end = store.read_from(0, 10)
+    assert [r["generated_username"] for r in batch] == ["anno_a", "anno_b"]
+    assert end == store.tail()
+
+    store.begin(end)
+    assert store.cursor() == (0, end)
+    store.commit(end)
+    assert store.cursor() == (end, None)
+    assert store.read_from(end, 10) == ([], end)
+
+
+def test_updates_are_fed_after_their_record(store):
+    store.append(_record("anno_a", created=False))
+    _, end = store.read_from(0, 10)
+    store.commit(end)
+
+    store.update("anno_a", {"account_created": True, "pending_steps": ""})
+    assert store.read_from(end, 10)[0] == []                           # updates are not new rows
+
+    records, upd = store.read_updates(store.updates_cursor(), 10)
+    assert [(r["generated_username"], r["account_created"]) for r in records] == [("anno_a", True)]
+    store.commit_updates(upd)
+    assert store.updates_cursor() == upd
+    assert store.read_updates(upd, 10)[0] == []
+    assert store.cursor() == (end, None)                               # append cursor untouched
+
+
+def test_journal_holds_updates_back_until_the_record_is_mirrored(tmp_path):
+    journal = RegistrationJournal(tmp_path / "registrations.jsonl", fsync_window=0)
+    journal.append(_record("anno_a", created=False))
+    journal.update("anno_a", {"account_created": True})
+    assert journal.read_updates(0, 10)[0] == []
+    journal.close()
+
+
+def test_sqlite_adds_columns_to_an_old_database(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "old.db"
+    db   = sqlite3.connect(path)
+    db.executescript(
+        "CREATE TABLE registrations (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT, "
+        "generated_username TEXT, account_created INTEGER NOT NULL DEFAULT 0, "
+        "pending_steps TEXT NOT NULL DEFAULT '', registered_at TEXT, record TEXT NOT NULL);"
+        "CREATE TABLE mirror_cursor (name TEXT PRIMARY KEY, offset INTEGER NOT NULL, inflight INTEGER);"
+        "INSERT INTO mirror_cursor VALUES ('sheets', 7, NULL);"
+    )
+    db.close()
+
+    store = SQLiteRegistrationStore(path)
+    assert store.cursor() == (7, None)
+    assert store.updates_cursor() == 0
+    store.append(_record("anno_a"))
+    store.update("anno_a", {"pending_steps": "project:english"})
+    assert store.read_updates(0, 10)[0][0]["pending_steps"] == "project:english"
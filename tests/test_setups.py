@@ -0,0 +1,93 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from config import LANGUAGE_JSON_FILES
+from setups import validate_setup
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _load(code: str) -> dict:
+    return json.loads((ROOT / LANGUAGE_JSON_FILES[code]).read_text(encoding="utf-8"))
+
+
+@pytest.fixture
+def setup() -> dict:
+    return copy.deepcopy(_load("en"))
+
+
+@pytest.mark.parametrize("code", sorted(LANGUAGE_JSON_FILES))
+def test_shipped_setups_are_valid(code):
+    assert validate_setup(_load(code)) == []
+
+
+def test_not_an_object():
+    assert validate_setup([]) == ["<root>: expected an object"]
+
+
+def test_missing_and_mistyped_keys_are_reported_with_their_path(setup):
+    del setup["instructions"]["title"]
+    setup["example_annotations"]["practice_questions"][0]["hint"] = 3
+    assert validate_setup(setup) == [
+        "instructions.title: missing",
+        "example_annotations.practice_questions[0].hint: expected str, got int",
+    ]
+
+
+def test_empty_sections(setup):
+    setup["instructions"]["sections"] = []
+    assert validate_setup(setup) == ["instructions.sections: empty"]
+
+
+def test_too_few_questions_for_the_pass_threshold(setup):
+    questions = setup["example_annotations"]["comprehension_check"]["questions"]
+    del questions[2:]
+    assert validate_setup(setup) == [
+        "example_annotations.comprehension_check.questions: 2 question(s), "
+        "PASS_THRESHOLD needs at least 3"
+    ]
+
+
+def test_duplicate_ids_and_unmatched_answers(setup):
+    questions = setup["example_annotations"]["comprehension_check"]["questions"]
+    questions[1]["id"] = questions[0]["id"]
+    questions[2]["correct_answer"] = "Z"
+    path = "example_annotations.comprehension_check.questions"
+    assert validate_setup(setup) == [
+        f"{path}[1].id: duplicate id {questions[0]['id']!r}",
+        f"{path}[2].correct_answer: 'Z' matches no option",
+    ]
+
+
+def _bundle_with_stale_file(tmp_path, monkeypatch, setup: dict, file_newer: bool):
+    import os
+
+    import setups
+
+    bundled = {**setup, "bundled": True}
+    bundle  = tmp_path / "setups.bundle.json"
+    source  = tmp_path / "en.json"
+    bundle.write_text(json.dumps({"setups": {"en": {"setup": bundled, "sections": ["bundled"]}}}))
+    source.write_text(json.dumps(setup))
+    os.utime(bundle, ns=(2_000_000_000_000_000_000,) * 2)
+    when = 3_000_000_000_000_000_000 if file_newer else 1_000_000_000_000_000_000
+    os.utime(source, ns=(when, when))
+    monkeypatch.setattr(setups, "SETUP_BUNDLE_PATH", str(bundle))
+    monkeypatch.setattr(setups, "LANGUAGE_JSON_FILES", {"en": str(source)})
+    return setups
+
+
+def test_bundle_is_used_while_current(tmp_path, monkeypatch, setup):
+    setups = _bundle_with_stale_file(tmp_path, monkeypatch, setup, file_newer=False)
+    assert setups.load_setup("en")["bundled"] is True
+    assert setups.load_sections("en") == ("bundled",)
+
+
+def test_file_edited_after_the_bundle_wins(tmp_path, monkeypatch, setup, caplog):
+    setups = _bundle_with_stale_file(tmp_path, monkeypatch, setup, file_newer=True)
+    assert "bundled" not in setups.load_setup("en")
+    assert setups.load_sections("en") != ("bundled",)
+    assert "newer than the setup bundle" in caplog.text
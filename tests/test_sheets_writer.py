@@ -0,0 +1,214 @@
+import pytest
+import requests
+
+from registration_store import SQLiteRegistrationStore
+from sheets import SheetsWriter
+
+
+class FakeConnection:
+    """Stands in for SheetsConnection: rows kept in a list, failures on demand."""
+
+    def __init__(self):
+        self.rows:    list[dict] = []
+        self.appends: list[int]  = []
+        self.updates: list[list[dict]] = []
+        self.fail_next = 0
+
+    def _maybe_fail(self) -> None:
+        if self.fail_next:
+            self.fail_next -= 1
+            raise requests.ConnectionError("Sheets unreachable")
+
+    def append_rows(self, records: list[dict], timeout=None) -> None:
+        self._maybe_fail()
+        self.appends.append(len(records))
+        self.rows.extend(dict(r) for r in records)
+
+    def column_values(self, name: str, timeout=None) -> list:
+        return [name] + [r.get(name, "") for r in self.rows]
+
+    def rows_after(self, row: int, timeout=None) -> tuple[list[dict], int]:
+        return [dict(r) for r in self.rows[row - 1:]], len(self.rows) + 1    # row 1 is the header
+
+    def update_rows(self, records: list[dict], timeout=None) -> int:
+        self._maybe_fail()
+        self.updates.append(records)
+        by_name = {r["generated_username"]: r for r in self.rows}
+        for record in records:
+            by_name[record["generated_username"]].update(record)
+        return len(records)
+
+
+def _record(username: str) -> dict:
+    return {"generated_username": username, "email": f"{username}@example.org",
+            "account_created": False, "pending_steps": "create_user"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteRegistrationStore(tmp_path / "registrations.db")
+
+
+@pytest.fixture
+def connection():
+    return FakeConnection()
+
+
+def _writer(connection, store, batch_size: int = 3) -> SheetsWriter:
+    return SheetsWriter(connection, store, batch_size=batch_size, flush_interval=60, max_backoff=8)
+
+
+def _usernames(connection) -> list[str]:
+    return [r["generated_username"] for r in connection.rows]
+
+
+def test_flush_sends_new_records_in_batches(store, connection):
+    writer = _writer(connection, store)
+    for i in range(7):
+        store.append(_record(f"anno_{i}"))
+    while writer.flush():
+        pass
+    assert connection.appends == [3, 3, 1]
+    assert _usernames(connection) == [f"anno_{i}" for i in range(7)]
+    assert store.cursor() == (store.tail(), None)
+
+
+def test_notify_makes_a_full_batch_due(store, connection):
+    writer = _writer(connection, store)
+    for i in range(2):
+        store.append(_record(f"anno_{i}"))
+        writer.notify()
+    assert writer._due() is False                       # two of three, interval not reached
+    store.append(_record("anno_2"))
+    writer.notify()
+    assert writer._due()
+    writer.flush()
+    assert not writer._due()
+
+
+def test_failed_append_keeps_the_batch_and_retries_it(store, connection):
+    writer = _writer(connection, store)
+    for i in range(2):
+        store.append(_record(f"anno_{i}"))
+    connection.fail_next = 1
+    assert not writer.flush()
+    assert connection.rows == []
+    assert store.cursor() == (0, None)                  # nothing in flight after the failure
+    assert writer._backoff > 0
+
+    assert writer.flush()
+    assert _usernames(connection) == ["anno_0", "anno_1"]
+    assert writer._backoff == 0.0
+
+
+def test_non_transient_error_backs_off_at_the_maximum(store, connection):
+    writer = _writer(connection, store)
+    store.append(_record("anno_0"))
+
+    def broken(records, timeout=None):
+        raise KeyError("gcp_service_account")
+
+    connection.append_rows = broken
+    assert not writer.flush()
+    assert writer._backoff == writer.max_backoff
+
+
+def test_updates_are_sent_after_new_records(store, connection):
+    writer = _writer(connection, store)
+    store.append(_record("anno_0"))
+    store.append(_record("anno_1"))
+    writer.flush()
+    store.update("anno_1", {"account_created": True, "pending_steps": ""})
+
+    assert writer.flush()                               # the update batch
+    assert [r["generated_username"] for r in connection.updates[0]] == ["anno_1"]
+    assert connection.rows[1]["account_created"] is True
+    assert not writer.flush()                           # nothing left
+    assert store.updates_cursor() > 0
+
+
+def test_failed_update_is_retried(store, connection):
+    writer = _writer(connection, store)
+    store.append(_record("anno_0"))
+    writer.flush()
+    store.update("anno_0", {"account_created": True, "pending_steps": ""})
+
+    connection.fail_next = 1
+    assert not writer.flush()
+    assert store.updates_cursor() == 0
+    assert writer.flush()
+    assert connection.rows[0]["account_created"] is True
+
+
+class _Crash(BaseException):
+    """Kills flush() the way a process exit would: nothing catches it."""
+
+
+def _crash_on_commit(store, monkeypatch):
+    def commit(end):
+        raise _Crash
+    monkeypatch.setattr(store, "commit", commit)
+
+
+def test_crash_after_append_does_not_duplicate_rows(tmp_path, connection, monkeypatch):
+    store = SQLiteRegistrationStore(tmp_path / "registrations.db")
+    for i in range(3):
+        store.append(_record(f"anno_{i}"))
+    _crash_on_commit(store, monkeypatch)
+    with pytest.raises(_Crash):
+        _writer(connection, store).flush()              # appended, cursor not committed
+    assert store.cursor()[1] is not None
+
+    restarted = SQLiteRegistrationStore(tmp_path / "registrations.db")
+    writer    = _writer(connection, restarted)
+    writer._recover_inflight()
+    while writer.flush():
+        pass
+    assert _usernames(connection) == ["anno_0", "anno_1", "anno_2"]
+    assert restarted.cursor() == (restarted.tail(), None)
+
+
+def test_crash_before_append_resends_the_batch(tmp_path, connection, monkeypatch):
+    store = SQLiteRegistrationStore(tmp_path / "registrations.db")
+    for i in range(3):
+        store.append(_record(f"anno_{i}"))
+
+    def crash(records, timeout=None):
+        raise _Crash
+    monkeypatch.setattr(connection, "append_rows", crash)
+    with pytest.raises(_Crash):
+        _writer(connection, store).flush()              # in flight, never reached Sheets
+    monkeypatch.undo()
+
+    restarted = SQLiteRegistrationStore(tmp_path / "registrations.db")
+    writer    = _writer(connection, restarted)
+    writer._recover_inflight()
+    while writer.flush():
+        pass
+    assert _usernames(connection) == ["anno_0", "anno_1", "anno_2"]
+
+
+def test_pull_restores_sheet_rows_into_a_fresh_store(tmp_path, connection):
+    connection.rows = [_record(f"anno_{i}") for i in range(3)]
+    store  = SQLiteRegistrationStore(tmp_path / "registrations.db")
+    writer = _writer(connection, store)
+    store.append(_record("anno_new"))                   # registered before the pull
+
+    assert writer.pull() == 3
+    assert store.usernames() == {"anno_0", "anno_1", "anno_2", "anno_new"}
+    assert _usernames(connection) == ["anno_0", "anno_1", "anno_2", "anno_new"]
+    assert not writer.flush()                           # pulled rows are not sent back
+
+    connection.rows.append(_record("anno_by_hand"))
+    assert writer.pull() == 1                           # only below the last row pulled
+    assert store.pulled_rows() == 6
+    assert writer.pull() == 0
+    assert len(connection.rows) == 5
+
+
+def test_pull_waits_for_unsent_records(store, connection):
+    writer = _writer(connection, store)
+    store.append(_record("anno_0"))
+    connection.fail_next = 1
+    assert writer.pull() is None
+    assert store.pulled_rows() == 1
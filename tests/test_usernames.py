@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from usernames import UsernameAllocator, UsernamesExhausted
+
+
+def test_names_have_the_prefix_and_are_unique_across_threads():
+    allocator = UsernameAllocator(lambda: set(), pool_size=10, prefix="t_", suffix_length=4)
+    allocator.refill()
+    with ThreadPoolExecutor(8) as pool:
+        names = list(pool.map(lambda _: allocator.allocate(), range(400)))
+    assert len(set(names)) == 400
+    assert all(n.startswith("t_") and len(n) == 6 for n in names)
+
+
+def test_sync_drops_pooled_names_that_turn_out_taken():
+    taken = set()
+    allocator = UsernameAllocator(lambda: taken, pool_size=20, prefix="t_", suffix_length=2)
+    allocator.refill()
+    taken.update(list(allocator._pool)[:5])
+    assert allocator.sync()
+    assert allocator.stats()["pool"] == 15
+    assert not {allocator.allocate() for _ in range(15)} & taken
+
+
+def test_failed_sync_keeps_the_old_index():
+    def fail():
+        raise RuntimeError("INCEpTION down")
+
+    allocator = UsernameAllocator(fail, pool_size=1)
+    assert not allocator.sync()
+    assert allocator.synced_at == 0.0
+
+
+def test_local_names_are_seeded_before_the_first_sync():
+    # 34 of the 36 one-character names are taken locally; INCEpTION never answers
+    local   = {f"t_{c}" for c in "abcdefghijklmnopqrstuvwxyz01234567"}
+    blocked = threading.Event()
+    allocator = UsernameAllocator(
+        lambda: (blocked.wait(), set())[1], lambda: local, pool_size=1, prefix="t_", suffix_length=1,
+    )
+    allocator.start()
+    try:
+        assert {allocator.allocate(), allocator.allocate()} == {"t_8", "t_9"}
+    finally:
+        blocked.set()
+        allocator.stop()
+        allocator._thread.join(1)
+    assert not allocator._thread.is_alive()
+
+
+def test_exhausted_name_space_raises_instead_of_spinning():
+    allocator = UsernameAllocator(lambda: set(), pool_size=5, prefix="t_", suffix_length=1)
+    allocator._taken = {f"t_{c}" for c in "abcdefghijklmnopqrstuvwxyz0123456"}
+    allocator.refill()                                  # three left: fills what it can
+    assert allocator.stats()["pool"] == 3
+    for _ in range(3):
+        allocator.allocate()
+    with pytest.raises(UsernamesExhausted):
+        allocator.allocate()
+
+
+def test_start_is_idempotent():
+    seeds = []
+    allocator = UsernameAllocator(lambda: set(), lambda: seeds.append(1) or set(), pool_size=1)
+    allocator.start()
+    allocator.start()
+    allocator.stop()
+    allocator._thread.join(1)
+    assert seeds == [1]
@@ -0,0 +1,201 @@
+"""
+Collision-free generated usernames.
+
+The allocator keeps an in-memory index of every username known to be
+taken and a pool of fresh names already checked against it. `allocate()`
+pops a name from the pool under a lock, so it is O(1) and two sessions
+can never get the same name. The local stores' usernames are loaded before
+the first name is handed out; a daemon thread tops the pool up when it runs
+low and re-syncs the full index every USERNAME_SYNC_INTERVAL seconds.
+
+The AERO API cannot list users, so a sync collects the members of every
+INCEpTION project plus the usernames in the registration store and the
+idempotency index. A user who belongs to no project is not seen. Such a
+name is only handed out if it is also missing from both local stores, and
+then create_user fails and the registration takes the manual-setup path,
+as it did before.
+"""
+
+import logging
+import secrets
+import string
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+from config import (
+    USERNAME_POOL_SIZE,
+    USERNAME_PREFIX,
+    USERNAME_SUFFIX_LENGTH,
+    USERNAME_SYNC_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+_ALPHABET = string.ascii_lowercase + string.digits
+_MAX_TRIES = 1000       # random draws before a nearly full name space counts as exhausted
+
+
+class UsernamesExhausted(RuntimeError):
+    """Raised when no free name is found; raise USERNAME_SUFFIX_LENGTH."""
+
+
+class UsernameAllocator:
+    """
+    Hands out `prefix` + random suffix names that are in neither the taken
+    index nor the pool. Issued and pooled names are added to the index at
+    once, and a sync only ever adds names, so nothing is handed out twice.
+    """
+
+    def __init__(
+        self,
+        fetch_taken: Callable[[], Iterable[str]],
+        fetch_local: Optional[Callable[[], Iterable[str]]] = None,
+        pool_size: int = USERNAME_POOL_SIZE,
+        sync_interval: float = USERNAME_SYNC_INTERVAL,
+        prefix: str = USERNAME_PREFIX,
+        suffix_length: int = USERNAME_SUFFIX_LENGTH,
+    ):
+        self.pool_size     = pool_size
+        self.sync_interval = sync_interval
+        self.prefix        = prefix
+        self.suffix_length = suffix_length
+        self.synced_at     = 0.0                 # monotonic time of the last successful sync
+        self._fetch_taken  = fetch_taken
+        self._fetch_local  = fetch_local
+        self._taken:       set[str]   = set()
+        self._pool:        deque[str] = deque()
+        self._lock         = threading.Lock()
+        self._wake         = threading.Event()
+        self._stop         = threading.Event()
+        self._thread:      Optional[threading.Thread] = None
+
+    def _candidate(self) -> str:
+        # Caller holds the lock
+        for _ in range(_MAX_TRIES):
+            suffix = "".join(secrets.choice(_ALPHABET) for _ in range(self.suffix_length))
+            name   = self.prefix + suffix
+            if name not in self._taken:
+                self._taken.add(name)
+                return name
+        raise UsernamesExhausted(
+            f"no free '{self.prefix}' name after {_MAX_TRIES} tries "
+            f"({len(self._taken)} taken of {len(_ALPHABET) ** self.suffix_length})"
+        )
+
+    def allocate(self) -> str:
+        """A name no other caller has been or will be given."""
+        with self._lock:
+            # Empty only before the first refill or under a burst; checked inline then
+            name = self._pool.popleft() if self._pool else self._candidate()
+            low  = len(self._pool) < self.pool_size // 2
+        if low:
+            self._wake.set()
+        return name
+
+    def sync(self) -> bool:
+        """Add every name from `fetch_taken` to the index and drop pooled names it contains."""
+        try:
+            taken = set(self._fetch_taken())
+        except Exception as exc:
+            logger.warning("Username index sync failed (%s); keeping the old index.", exc)
+            return False
+        with self._lock:
+            self._taken |= taken
+            clashes = [n for n in self._pool if n in taken]
+            if clashes:
+                self._pool = deque(n for n in self._pool if n not in taken)
+            self.synced_at = time.monotonic()
+        logger.info("Username index synced: %d taken, %d pooled name(s) dropped.",
+                    len(taken), len(clashes))
+        return True
+
+    def seed(self) -> None:
+        """Add `fetch_local` names at once; quick, unlike a sync, which asks INCEpTION."""
+        if self._fetch_local is None:
+            return
+        try:
+            local = set(self._fetch_local())
+        except Exception as exc:
+            logger.warning("Could not read local usernames (%s); waiting for the first sync.", exc)
+            return
+        with self._lock:
+            self._taken |= local
+            self._pool   = deque(n for n in self._pool if n not in local)
+
+    def refill(self) -> None:
+        try:
+            with self._lock:
+                while len(self._pool) < self.pool_size:
+                    self._pool.append(self._candidate())
+        except UsernamesExhausted as exc:
+            # allocate() raises once the pool is empty; the pooled names are still good
+            logger.error("Username pool not refilled: %s", exc)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"taken": len(self._taken), "pool": len(self._pool)}
+
+    def start(self) -> None:
+        """
+        Seed from the local stores, then start the sync/refill thread, once.
+        Until the first sync has run, names are checked against the seed.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="username-pool", daemon=True)
+        self.seed()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        next_sync = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() >= next_sync:
+                # A failed sync (e.g. INCEpTION restarting) is retried sooner
+                delay     = self.sync_interval if self.sync() else min(self.sync_interval, 30)
+                next_sync = time.monotonic() + delay
+            self.refill()
+            self._wake.wait(max(0.0, next_sync - time.monotonic()))
+            self._wake.clear()
+
+
+def _local_usernames() -> set[str]:
+    """Every username in the registration store and the idempotency index."""
+    from idempotency import get_index
+    from registration_store import get_store
+
+    return get_store().usernames() | get_index().usernames()
+
+
+def _existing_usernames() -> set[str]:
+    """Every username in INCEpTION project memberships and the local stores."""
+    from utils import get_inception_client
+
+    names  = _local_usernames()
+    client = get_inception_client()
+    for project in client.get_projects():
+        members = client.get_project_members(project["id"])
+        if members is None:
+            raise RuntimeError(f"could not list members of project '{project.get('name')}'")
+        names.update(members)
+    return names
+
+
+_allocator: Optional[UsernameAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator() -> UsernameAllocator:
+    """The process-wide allocator, with its background thread started."""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = UsernameAllocator(_existing_usernames, _local_usernames)
+            _allocator.start()
+        return _allocator
@@ -1,12 +1,13 @@
-import csv
 import logging
 import os
 from pathlib import Path
 
 import streamlit as st
 
+from metrics import SAVE_SECONDS, timed_call
+
 logger = logging.getLogger(__name__)
-CSV_FALLBACK = Path("registrations.csv")
+CSV_FALLBACK = Path("registrations.csv")       # legacy; read by provision_backlog.py
 
 
 def get_secret(key: str, fallback: str = "") -> str:
@@ -17,43 +18,51 @@ def get_secret(key: str, fallback: str = "") -> str:
         return os.getenv(key, fallback)
 
 
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _shared_inception_client(
+    base_url: str, username: str, password: str, pool_size: int, keep_alive: bool
+):
+    from inception_client import InceptionClient
+
+    client = InceptionClient(base_url, username, password, pool_size, keep_alive)
+    client.start_health_probe()                  # replaces the previous client's prober
+    return client
+
+
+def get_inception_client():
+    """
+    Process-wide InceptionClient shared by all sessions. The secrets are part
+    of the cache key, so changing them builds a new client (and, with
+    max_entries=1, drops the old one) on the next call. The old client is
+    not closed: job workers may still hold it mid-request, and its pooled
+    connections are released once the last of them lets go of it.
+    """
+    from config import INCEPTION_KEEP_ALIVE, INCEPTION_POOL_SIZE
+
+    return _shared_inception_client(
+        get_secret("INCEPTION_URL", "http://localhost:8080"),
+        get_secret("INCEPTION_ADMIN_USER", "admin"),
+        get_secret("INCEPTION_ADMIN_PASSWORD", "admin"),
+        INCEPTION_POOL_SIZE,
+        INCEPTION_KEEP_ALIVE,
+    )
+
+
+@timed_call(SAVE_SECONDS, ok=lambda _: True)
 def save_registration(data: dict) -> None:
     """
     Save a registration record.
-    Primary:  Google Sheets (persistent on Streamlit Cloud).
-    Fallback: local CSV (only reliable in local dev).
+
+    The record goes into the local registration store (SQLite by default,
+    see config.REGISTRATION_STORE) and this returns; when SHEETS_MIRROR is
+    on, the background SheetsWriter copies new rows to Google Sheets, the
+    persistent copy on Streamlit Cloud, whenever it is reachable.
     """
-    # ── Google Sheets ──────────────────────────────────────────────────────────
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-
-        creds = Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=[
-                "https://spreadsheets.google.com/feeds",
-                "https://www.googleapis.com/auth/drive",
-            ],
-        )
-        gc    = gspread.authorize(creds)
-        sheet = gc.open(get_secret("SHEETS_DOCUMENT_NAME")).sheet1
-
-        if not sheet.row_values(1):          # write header if empty
-            sheet.append_row(list(data.keys()))
-        sheet.append_row(list(data.values()))
-        logger.info("Registration saved to Google Sheets.")
-        return
-    except Exception as exc:
-        logger.warning("Google Sheets save failed (%s) — falling back to CSV.", exc)
-
-    # ── CSV fallback ───────────────────────────────────────────────────────────
-    try:
-        file_exists = CSV_FALLBACK.exists()
-        with CSV_FALLBACK.open("a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=data.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(data)
-        logger.info("Registration saved to CSV fallback.")
-    except Exception as exc:
-        logger.error("CSV fallback also failed: %s", exc)
+    from config import SHEETS_MIRROR
+    from registration_store import get_store
+
+    get_store().append(data)
+    if SHEETS_MIRROR:
+        from sheets import get_writer
+
+        get_writer().notify()
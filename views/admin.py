@@ -0,0 +1,125 @@
+import hmac
+
+import streamlit as st
+
+import profiling
+from config import ADMIN_PAGE_SIZE, LANGUAGES, PROFILE_RUNS, SHEETS_MIRROR
+from registration_store import STATUSES, get_store
+from utils import get_secret
+
+
+def _pull() -> None:
+    from sheets import get_writer
+
+    try:
+        added = get_writer().pull()
+    except Exception as exc:
+        st.error(f"Could not reach Google Sheets: {exc}")
+        return
+    if added is None:
+        st.warning("New registrations are still waiting to be sent to Google Sheets; try again shortly.")
+    else:
+        st.toast(f"{added} registration(s) pulled from Google Sheets.")
+
+
+def _login() -> bool:
+    if st.session_state.get("admin_ok"):
+        return True
+    expected = get_secret("ADMIN_PASSWORD")
+    if not expected:
+        st.error("Admin access is disabled — set ADMIN_PASSWORD in the app secrets.")
+        return False
+    password = st.text_input("Admin password", type="password")
+    if st.button("Sign in", type="primary"):
+        if hmac.compare_digest(password, expected):
+            st.session_state.admin_ok = True
+            st.rerun()
+        st.error("Incorrect password.")
+    return False
+
+
+def _profiling_panel() -> None:
+    st.markdown("#### Profiling")
+    st.caption(
+        "Create a one-time link and send it to a user who reports a slow page; "
+        "their next reruns are profiled and appear below."
+    )
+    col_runs, col_link = st.columns([1, 3])
+    runs = col_runs.number_input("Reruns", min_value=1, max_value=50, value=PROFILE_RUNS)
+    if col_link.button("Create profiling link"):
+        st.session_state.profile_code = profiling.create_code(int(runs))
+    if st.session_state.get("profile_code"):
+        st.code(f"?profile={st.session_state.profile_code}", language=None)
+
+    captures = profiling.list_profiles()
+    if not captures:
+        st.caption("No captures yet.")
+        return
+    for path in captures[:20]:
+        st.download_button(
+            f"{path.name} ({path.stat().st_size // 1024} KB)",
+            data=path.read_bytes(),
+            file_name=path.name,
+            key=f"profile_{path.name}",
+        )
+    if st.button("Delete all captures"):
+        st.toast(f"{profiling.clear_profiles()} capture(s) deleted.")
+        st.rerun()
+
+
+def render() -> None:
+    st.markdown("## Registrations — Admin")
+    if not _login():
+        return
+
+    # The store is the source of truth, including results written back by
+    # provision_backlog.py. On Streamlit Cloud its disk does not survive a
+    # restart, so rows only the Sheet still has are pulled back in: on the
+    # first view of a fresh store, then on demand.
+    store = get_store()
+    if SHEETS_MIRROR:
+        col_info, col_pull = st.columns([3, 1])
+        clicked = col_pull.button("Pull new rows", use_container_width=True)
+        seed    = store.pulled_rows() <= 1 and not st.session_state.get("admin_seeded")
+        if clicked or seed:
+            st.session_state.admin_seeded = True     # try the automatic pull once per session
+            _pull()
+        col_info.caption(
+            f"Live from the local registration store; Sheet rows up to {store.pulled_rows()} pulled."
+        )
+    else:
+        st.caption("Live from the local registration store.")
+
+    # ── Counts ─────────────────────────────────────────────────────────────────
+    by_status = store.count_by("status")
+    cols = st.columns(len(STATUSES) + 1)
+    cols[0].metric("Total", sum(by_status.values()))
+    for col, status in zip(cols[1:], STATUSES):
+        col.metric(status.title(), by_status.get(status, 0))
+
+    st.markdown("#### By language")
+    by_language = store.count_by("language")
+    st.bar_chart({lang: by_language.get(lang, 0) for lang in LANGUAGES})
+
+    # ── Filtered, paginated table ──────────────────────────────────────────────
+    st.markdown("#### Registrations")
+    f1, f2, f3 = st.columns(3)
+    language = f1.selectbox("Language", ["All"] + list(LANGUAGES))
+    status   = f2.selectbox("Status", ["All"] + list(STATUSES))
+    search   = f3.text_input("Email or username contains")
+
+    filters = {
+        "language": None if language == "All" else language,
+        "status":   None if status == "All" else status,
+        "text":     search.strip(),
+    }
+    _, total = store.search(**filters, limit=0)
+    pages    = max(1, -(-total // ADMIN_PAGE_SIZE))
+    page     = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+
+    rows, _ = store.search(**filters, limit=ADMIN_PAGE_SIZE, offset=(page - 1) * ADMIN_PAGE_SIZE)
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    st.caption(f"{total} matching registration(s) — page {page} of {pages}.")
+
+    st.divider()
+    _profiling_panel()
@@ -1,97 +1,164 @@
 import secrets
-import string
+import time
 
 import streamlit as st
 
-from config import LANGUAGES
-from inception_client import InceptionClient
-from utils import get_secret, save_registration
+from config import QUEUE_POLL_INTERVAL, REGISTRATION_BUDGET
+from job_queue import DEAD, DONE, QUEUED
+from idempotency import get_index
+from provisioning import get_provisioning_queue
+from usernames import get_allocator
+from utils import get_secret
 from views.shared import render_header
 
 
-def _get_client() -> InceptionClient:
-    return InceptionClient(
-        base_url=get_secret("INCEPTION_URL", "http://localhost:8080"),
-        username=get_secret("INCEPTION_ADMIN_USER", "admin"),
-        password=get_secret("INCEPTION_ADMIN_PASSWORD", "admin"),
-    )
-
-
-def _generate_username() -> str:
-    chars  = string.ascii_lowercase + string.digits
-    suffix = "".join(secrets.choice(chars) for _ in range(6))
-    return f"anno_{suffix}"
+def _session_credentials(entry: dict, duplicate: bool = False) -> dict:
+    return {
+        "username":      entry["username"],
+        "password":      entry["password"],       # None once the job has finished
+        "job_id":        entry["job_id"],
+        "duplicate":     duplicate,
+        "result":        None,
+        "inception_url": get_secret("INCEPTION_URL", "http://localhost:8080"),
+        "admin_email":   get_secret("ADMIN_EMAIL", "admin@example.com"),
+    }
 
 
 def _process_and_store() -> None:
-    demo     = st.session_state.demographics
-    username = _generate_username()
-    password = secrets.token_urlsafe(12)
-    client   = _get_client()
-
-    reachable       = False
-    user_ok         = False
-    project_results = []
-
-    with st.status("Setting up your account...", expanded=True) as status:
-        st.write("Connecting to annotation platform...")
-        reachable = client.ping()
-
-        if reachable:
-            st.write(f"Creating account '{username}'...")
-            user_ok = client.create_user(username, password, demo.get("email", ""))
-
-            if user_ok:
-                for lang_name in demo.get("languages", []):
-                    _, project_name = LANGUAGES[lang_name]
-                    st.write(f"Assigning to project: {project_name}...")
-                    ok = client.add_user_to_project(username, project_name)
-                    project_results.append((lang_name, project_name, ok))
-        else:
-            st.write("Platform unreachable — registration saved for manual setup.")
-
-        status.update(label="Complete", state="complete")
-
-    save_registration({
-        "languages":          ", ".join(demo.get("languages", [])),
-        "age":                demo.get("age"),
-        "nationality":        demo.get("nationality"),
-        "native_language":    demo.get("native_language"),
-        "education":          demo.get("education"),
-        "email":              demo.get("email"),
-        "registered_at":      demo.get("registered_at"),
-        "generated_username": username,
-        "api_reachable":      reachable,
-        "account_created":    user_ok,
-    })
-
-    st.session_state.credentials = {
-        "username":        username,
-        "password":        password,
-        "user_ok":         user_ok,
-        "reachable":       reachable,
-        "project_results": project_results,
-        "inception_url":   get_secret("INCEPTION_URL", "http://localhost:8080"),
-        "admin_email":     get_secret("ADMIN_EMAIL", "admin@example.com"),
-    }
-    st.session_state.processed = True
+    # The token lives in the URL, so a refresh or reconnect finds this
+    # registration again instead of provisioning a second account
+    token = st.query_params.get("reg") or secrets.token_urlsafe(16)
+    st.query_params["reg"] = token
+    demo  = st.session_state.demographics
+
+    queue = get_provisioning_queue()
+
+    def create(previous: dict | None) -> dict:
+        # A retry after a failed job keeps its username, so the row saved for
+        # the admin is completed rather than joined by a second one
+        username = previous["username"] if previous else get_allocator().allocate()
+        password = secrets.token_urlsafe(12)
+        job_id   = queue.enqueue({
+            "username":     username,
+            "password":     password,
+            "demographics": demo,
+            "retry_of":     previous["job_id"] if previous else None,
+        })
+        return {"username": username, "password": password, "job_id": job_id}
+
+    def failed(entry: dict) -> bool:
+        job = queue.status(entry["job_id"])
+        return job is not None and job["status"] == DEAD
+
+    def cancel(entry: dict) -> None:
+        queue.cancel(entry["job_id"])
+
+    entry, found = get_index().get_or_create(token, demo.get("email", ""), create, failed, cancel)
+    st.session_state.credentials = _session_credentials(entry, duplicate=found == "email")
+    st.session_state.processed   = True
     st.rerun()
 
 
-def _render_credentials(creds: dict) -> None:
-    admin_email   = creds["admin_email"]
-    inception_url = creds["inception_url"]
+def restore_registration(token: str) -> bool:
+    """Put a session opened with ?reg=<token> back on its credentials page."""
+    entry = get_index().find(token)
+    if entry is None:
+        return False
+    st.session_state.credentials = _session_credentials(entry)
+    st.session_state.processed   = True
+    st.session_state.page        = 3
+    return True
+
+
+@st.fragment(run_every=QUEUE_POLL_INTERVAL)
+def _poll_job(creds: dict) -> None:
+    queue = get_provisioning_queue()
+    job   = queue.status(creds["job_id"])
+    if job is None:
+        # The queue no longer has it (e.g. a restart lost the disk); waiting is pointless
+        creds["result"] = {"user_ok": False, "project_results": [], "missing": True}
+        st.rerun()
+    if job["status"] in (DONE, DEAD):
+        creds["result"] = job["result"] or {"user_ok": False, "project_results": []}
+        st.rerun()
+    if creds["result"] is not None:
+        # Timed out earlier; keep watching in case the worker still finishes
+        _render_setup_result(creds["result"], creds["admin_email"])
+        return
+    started = job["started_at"]
+    if started and time.time() > started + REGISTRATION_BUDGET + QUEUE_POLL_INTERVAL:
+        # Stop holding the page; the worker finishes or marks steps pending.
+        creds["result"] = {"user_ok": False, "project_results": [], "timed_out": True}
+        st.rerun()
+
+    line = queue.wait_estimate(creds["job_id"]) if job["status"] == QUEUED else None
+    if line and not started:
+        ahead, wait = line
+        eta = f" — about {max(1, round(wait))} s to go" if wait is not None else ""
+        st.info(
+            f"Waiting for a free slot — you are number {ahead + 1} in line{eta}. "
+            "Your place is kept; please leave this page open."
+        )
+    elif job["attempts"] > 1:
+        st.info("The annotation platform is slow to respond — still trying...")
+    else:
+        st.info("Setting up your account and project assignments...")
+
 
-    if creds["user_ok"]:
+def _render_setup_result(result: dict, admin_email: str) -> None:
+    if result.get("missing"):
+        st.error(
+            "We lost track of your account request, most likely because the server "
+            f"restarted. Please contact {admin_email} to have your account set up."
+        )
+    elif result.get("timed_out"):
+        st.warning(
+            "Your account could not be set up in time. Your registration has been saved; "
+            "the study administrator will create your account and email you new login "
+            f"details. Questions? Contact {admin_email}."
+        )
+    elif result["user_ok"]:
         st.success("Your account has been created successfully.")
     else:
         st.warning(
             "Your registration was saved, but the account could not be created automatically. "
-            f"Please contact {admin_email} — your credentials will be sent to you shortly."
+            "The study administrator will create it and email you new login details. "
+            f"Questions? Contact {admin_email}."
         )
 
+    if result["project_results"]:
+        st.markdown("### Assigned Projects")
+        for lang, project, ok in result["project_results"]:
+            status_text = "Assigned" if ok else "Pending — contact admin"
+            st.markdown(f"- **{lang}** — `{project}` ({status_text})")
+
+
+def _render_duplicate(creds: dict) -> None:
+    # Same email, different browser: don't hand out someone's credentials
+    st.warning(
+        "An account has already been requested with this email address, so no new "
+        "account was created. Use the login details you received for it, or contact "
+        f"{creds['admin_email']} if you no longer have them."
+    )
+
+
+def _render_credentials(creds: dict) -> None:
+    admin_email   = creds["admin_email"]
+    inception_url = creds["inception_url"]
+
+    if creds["duplicate"]:
+        _render_duplicate(creds)
+        return
+
+    # Accounts made later by provision_backlog.py get a new password
+    failed = creds["result"] is not None and not creds["result"]["user_ok"]
+
     st.markdown("### Login Credentials")
-    st.info("Please save your username and password now. They will not be shown again.")
+    if not failed and creds["password"]:
+        st.info(
+            "Please save your username and password now. The password is deleted from "
+            "our system once your account is ready, so it cannot be shown again."
+        )
 
     col1, col2 = st.columns(2)
     with col1:
@@ -99,15 +166,19 @@ def _render_credentials(creds: dict) -> None:
         st.code(creds["username"], language=None)
     with col2:
         st.markdown("**Password**")
-        st.code(creds["password"], language=None)
+        if failed:
+            st.caption("Will be emailed to you by the administrator.")
+        elif creds["password"]:
+            st.code(creds["password"], language=None)
+        else:
+            st.caption(f"No longer stored. If you did not save it, contact {admin_email}.")
 
     st.markdown(f"**Platform URL:** `{inception_url}`")
 
-    if creds["project_results"]:
-        st.markdown("### Assigned Projects")
-        for lang, project, ok in creds["project_results"]:
-            status_text = "Assigned" if ok else "Pending — contact admin"
-            st.markdown(f"- **{lang}** — `{project}` ({status_text})")
+    if creds["result"] is None or creds["result"].get("timed_out"):
+        _poll_job(creds)
+    else:
+        _render_setup_result(creds["result"], admin_email)
 
     st.divider()
 
@@ -1,24 +1,14 @@
-import json
-from pathlib import Path
+from typing import Mapping, Sequence
 
 import streamlit as st
 
-from config import LANGUAGE_JSON_FILES, LANGUAGES
+from config import LANGUAGES, PASS_THRESHOLD
+from setups import load_sections, load_setup
 from utils import get_secret
 from views.shared import render_header, render_sections
 
-PASS_THRESHOLD = 3
 
-
-def _load_setup(lang_code: str) -> dict | None:
-    path = Path(LANGUAGE_JSON_FILES.get(lang_code, ""))
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
-
-
-def _evaluate(answer_map: dict[str, tuple[str, str]], questions: list[dict]) -> None:
+def _evaluate(answer_map: dict[str, tuple[str, str]], questions: Sequence[Mapping]) -> None:
     q_by_id  = {q["id"]: q for q in questions}
     score    = 0
     wrong_qs = []
@@ -32,7 +22,7 @@ def _evaluate(answer_map: dict[str, tuple[str, str]], questions: list[dict]) ->
     if score < PASS_THRESHOLD:
         review = (" Questions to revisit: " + "; ".join(wrong_qs) + ".") if wrong_qs else ""
         st.session_state.check_error = (
-            f"You answered {score} out of 4 correctly — "
+            f"You answered {score} out of {len(questions)} correctly — "
             f"{PASS_THRESHOLD} are required to proceed. "
             f"Please review the instructions above and try again.{review}"
         )
@@ -42,16 +32,85 @@ def _evaluate(answer_map: dict[str, tuple[str, str]], questions: list[dict]) ->
         st.rerun()
 
 
+@st.fragment
+def _practice_questions(questions: Sequence[Mapping]) -> None:
+    # A hint or sample-answer toggle only reruns this block
+    for pq in questions:
+        with st.expander(f'Practice: "{pq["text"]}"'):
+            st.markdown(f"**Task:** {pq['task']}")
+            if st.toggle("Show hint", key=f"hint_{pq['id']}"):
+                st.info(pq["hint"])
+            if st.toggle("Show sample answer", key=f"ans_{pq['id']}"):
+                for k, v in pq["sample_answer"].items():
+                    st.success(f"**{k}**: {v}")
+
+
+@st.fragment
+def _comprehension_check(questions: Sequence[Mapping], lang_code: str) -> None:
+    """
+    Answer radios and buttons. Picking an answer or failing the check only
+    reruns this fragment; passing or going back reruns the whole app.
+    """
+    if st.session_state.check_error:
+        st.error(st.session_state.check_error)
+
+    answer_map: dict[str, tuple[str, str]] = {}
+    for q in questions:
+        key = f"check_{lang_code}_{q['id']}"
+        answer_map[q["id"]] = (key, q["correct_answer"])
+        st.markdown(f"**{q['question']}**")
+        st.radio(
+            q["question"],
+            options=q["options"],
+            key=key,
+            label_visibility="collapsed",
+        )
+
+    col_back, col_submit = st.columns(2)
+    with col_back:
+        if st.button("Back to Demographics", use_container_width=True):
+            st.session_state.page = 1
+            st.session_state.check_error = None
+            st.rerun()
+    with col_submit:
+        if st.button("Submit & Continue", type="primary", use_container_width=True):
+            _evaluate(answer_map, questions)
+            st.rerun(scope="fragment")         # show the new check_error
+
+
+def _active_language(setups: dict[str, tuple[str, Mapping]], default: str) -> str:
+    """
+    Language switcher for the instructions. Only the chosen language is
+    rendered, unlike st.tabs which sends every tab's content each rerun.
+    The choice is kept in `instructions_lang` so it survives leaving the page.
+    """
+    if len(setups) == 1:
+        return default
+    if st.session_state.get("instructions_lang_radio") not in setups:
+        remembered = st.session_state.get("instructions_lang")
+        st.session_state.instructions_lang_radio = remembered if remembered in setups else default
+    st.radio(
+        "Instructions language",
+        options=list(setups),
+        format_func=lambda code: setups[code][0],
+        key="instructions_lang_radio",
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    st.session_state.instructions_lang = st.session_state.instructions_lang_radio
+    return st.session_state.instructions_lang
+
+
 def render() -> None:
     render_header()
     st.markdown("## Task Instructions & Comprehension Check")
 
     # Resolve which language setups are available
     selected_langs = st.session_state.demographics.get("languages", [])
-    setups: dict[str, tuple[str, dict]] = {}
+    setups: dict[str, tuple[str, Mapping]] = {}
     for lang_name in selected_langs:
         code, _ = LANGUAGES[lang_name]
-        setup   = _load_setup(code)
+        setup   = load_setup(code)
         if setup:
             setups[code] = (lang_name, setup)
 
@@ -70,13 +129,7 @@ def render() -> None:
 
     # ── 1. Instructions ────────────────────────────────────────────────────────
     st.markdown("### 1. Annotation Instructions")
-    if len(setups) > 1:
-        tabs = st.tabs([name for name, _ in setups.values()])
-        for tab, (_, (_, setup)) in zip(tabs, setups.items()):
-            with tab:
-                render_sections(setup)
-    else:
-        render_sections(primary_setup)
+    render_sections(load_sections(_active_language(setups, primary_code)))
 
     # ── 2. Worked examples ─────────────────────────────────────────────────────
     st.markdown("### 2. Worked Examples")
@@ -98,14 +151,7 @@ def render() -> None:
     # ── 3. Practice questions ──────────────────────────────────────────────────
     st.markdown("### 3. Practice Questions")
     st.write("Work through these before checking the sample answers.")
-    for pq in ea["practice_questions"]:
-        with st.expander(f'Practice: "{pq["text"]}"'):
-            st.markdown(f"**Task:** {pq['task']}")
-            if st.toggle("Show hint", key=f"hint_{pq['id']}"):
-                st.info(pq["hint"])
-            if st.toggle("Show sample answer", key=f"ans_{pq['id']}"):
-                for k, v in pq["sample_answer"].items():
-                    st.success(f"**{k}**: {v}")
+    _practice_questions(ea["practice_questions"])
 
     st.divider()
 
@@ -114,30 +160,7 @@ def render() -> None:
     cc = primary_setup["example_annotations"]["comprehension_check"]
     st.warning(
         f"**{cc['title']}** — {cc['instructions']} "
-        f"You need at least **{PASS_THRESHOLD} out of 4** correct answers to proceed."
+        f"You need at least **{PASS_THRESHOLD} out of {len(cc['questions'])}** "
+        "correct answers to proceed."
     )
-
-    if st.session_state.check_error:
-        st.error(st.session_state.check_error)
-
-    answer_map: dict[str, tuple[str, str]] = {}
-    for q in cc["questions"]:
-        key = f"check_{primary_code}_{q['id']}"
-        answer_map[q["id"]] = (key, q["correct_answer"])
-        st.markdown(f"**{q['question']}**")
-        st.radio(
-            q["question"],
-            options=q["options"],
-            key=key,
-            label_visibility="collapsed",
-        )
-
-    col_back, col_submit = st.columns(2)
-    with col_back:
-        if st.button("Back to Demographics", use_container_width=True):
-            st.session_state.page = 1
-            st.session_state.check_error = None
-            st.rerun()
-    with col_submit:
-        if st.button("Submit & Continue", type="primary", use_container_width=True):
-            _evaluate(answer_map, cc["questions"])
+    _comprehension_check(cc["questions"], primary_code)
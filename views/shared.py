@@ -1,6 +1,10 @@
 import re
+from typing import Mapping, Sequence
+
 import streamlit as st
 
+from metrics import timed
+
 TU_BERLIN_LOGO = "https://upload.wikimedia.org/wikipedia/commons/thumb/3/30/TU-Berlin-Logo.svg/1280px-TU-Berlin-Logo.svg.png"
 
 # Instruction section headings to skip entirely (case-insensitive)
@@ -42,6 +46,7 @@ CUSTOM_CSS = """
 
 # ── Layout ─────────────────────────────────────────────────────────────────────
 
+@timed("header")
 def render_header() -> None:
     col_text, col_logo = st.columns([7, 3])
     with col_text:
@@ -57,6 +62,7 @@ def render_header() -> None:
     st.markdown('<hr class="red-divider">', unsafe_allow_html=True)
 
 
+@timed("sidebar")
 def render_sidebar() -> None:
     steps = [
         (1, "Your Information"),
@@ -131,44 +137,40 @@ def _parse_bold_sections(content: str) -> tuple[str, list[dict]]:
     return "\n".join(intro_lines).strip(), sections
 
 
-def _render_three_actor_tables(content: str) -> None:
+def _table_cell(text: str) -> str:
+    return text.replace("|", "\\|")
+
+
+def _compile_three_actor_tables(content: str) -> str:
     """
-    Renders three separate Role | Description tables, one per actor group
+    Three separate Role | Description tables, one per actor group
     (e.g. Protagonist, Antagonist, Innocent/Victim).
     """
     intro, sections = _parse_bold_sections(content)
-    if intro:
-        st.write(intro)
     if not sections:
-        st.markdown(content)
-        return
+        return content
 
+    blocks = [intro] if intro else []
     for section in sections:
         title = section["header"]
         if section["parenth"]:
             title += f" ({section['parenth']})"
-        st.markdown(f"**{title}**")
 
-        rows = ["| Role | Description |", "|---|---|"]
+        rows = [f"**{title}**", "", "| Role | Description |", "|---|---|"]
         for item in section["items"]:
-            key = item["key"].replace("|", "\\|")
-            val = item["value"].replace("|", "\\|")
-            rows.append(f"| {key} | {val} |")
-        st.markdown("\n".join(rows))
-        st.write("")   # visual gap between tables
+            rows.append(f"| {_table_cell(item['key'])} | {_table_cell(item['value'])} |")
+        blocks.append("\n".join(rows))
+    return "\n\n".join(blocks)
 
 
-def _render_action_table(content: str) -> None:
+def _compile_action_table(content: str) -> str:
     """
-    Renders action portrayal categories as a table: Category | Code | Description
+    Action portrayal categories as a table: Category | Code | Description
     Examples are not included per study configuration.
     """
     intro, sections = _parse_bold_sections(content)
-    if intro:
-        st.write(intro)
     if not sections:
-        st.markdown(content)
-        return
+        return content
 
     rows = ["| Category | Code | Description |", "|---|---|---|"]
     for s in sections:
@@ -176,17 +178,20 @@ def _render_action_table(content: str) -> None:
         code_match = re.search(r"\((\w+)\)", s["header"])
         code       = f"`{code_match.group(1)}`" if code_match else ""
         name       = re.sub(r"\s*\(\w+\)", "", s["header"]).strip()
-        desc       = s["rest"].replace("|", "\\|")
-        rows.append(f"| {name} | {code} | {desc} |")
+        rows.append(f"| {name} | {code} | {_table_cell(s['rest'])} |")
 
-    st.markdown("\n".join(rows))
+    table = "\n".join(rows)
+    return f"{intro}\n\n{table}" if intro else table
 
 
-def render_sections(setup: dict) -> None:
+def compile_sections(setup: Mapping) -> tuple[str, ...]:
     """
-    Iterates over instruction sections and dispatches each to the correct renderer.
-    Sections in SKIP_SECTIONS are silently dropped.
+    Turns the instruction sections of a setup into one markdown string per
+    section (heading included), dispatching each to the matching compiler.
+    Sections in SKIP_SECTIONS are silently dropped. Pure and deterministic,
+    so the result is cached per setup file (see setups.load_sections).
     """
+    compiled = []
     for section in setup["instructions"]["sections"]:
         heading = section["heading"]
         content = section["content"]
@@ -194,11 +199,18 @@ def render_sections(setup: dict) -> None:
         if heading.lower() in SKIP_SECTIONS:
             continue
 
-        st.markdown(f"#### {heading}")
-
         if "akteurs" in heading.lower() or "actor" in heading.lower():
-            _render_three_actor_tables(content)
+            body = _compile_three_actor_tables(content)
         elif "handlungs" in heading.lower() or "action" in heading.lower():
-            _render_action_table(content)
+            body = _compile_action_table(content)
         else:
-            st.markdown(content)
+            body = content
+        compiled.append(f"#### {heading}\n\n{body}")
+    return tuple(compiled)
+
+
+@timed("sections")
+def render_sections(sections: Sequence[str]) -> None:
+    """One st.markdown element per precompiled section."""
+    for markdown in sections:
+        st.markdown(markdown)
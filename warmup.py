@@ -0,0 +1,54 @@
+"""
+Import the registration path's heavy dependencies in the background.
+
+Nothing on the demographics page needs requests, gspread or google-auth,
+so streamlit_app does not import them. A user spends a minute or more
+on the first two pages, though, and the first registration of the
+process should not wait for those imports either. `start()` imports
+config.WARM_IMPORTS in a daemon thread on the first script run. Python's
+per-module import locks make a foreground import of the same module wait
+for the background one instead of racing it.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from config import WARM_IMPORTS
+from metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+IMPORT_SECONDS = histogram(
+    "app_import_seconds", "Background warm-up import time, by module.", ("module",),
+)
+
+_thread: Optional[threading.Thread] = None
+_lock   = threading.Lock()
+
+
+def _warm(modules: Iterable[str]) -> None:
+    started = time.perf_counter()
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as exc:                 # optional backend, or broken install
+            logger.warning("Warm-up import of %s failed (%s).", name, exc)
+            continue
+        IMPORT_SECONDS.observe(time.perf_counter() - t0, module=name)
+    logger.info("Warm-up imports done in %.2fs.", time.perf_counter() - started)
+
+
+def start(modules: Iterable[str] = WARM_IMPORTS) -> threading.Thread:
+    """Start the warm-up thread once per process; returns it (e.g. to join in benchmarks)."""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=_warm, args=(tuple(modules),), name="import-warmup", daemon=True
+            )
+            _thread.start()
+        return _thread